@@ -0,0 +1,304 @@
+'''
+Offline benchmarks of calculateEphemerides.
+
+Synthetic catalogs in the exoplanets.org CSV format are generated with
+realistic distributions of orbital period, transit depth and duration, host
+star brightness and sky position, so that the full pipeline can be timed
+without a network connection. Each case (catalog size x window length) runs
+in a fresh process, end to end and then stage by stage, and reports the wall
+time, the peak memory of the process and the number of events per second.
+
+Usage:
+    $ python benchmark.py
+    $ python benchmark.py --planets 1000 10000 100000 --nights 1 30 365 1095 --json bench.json
+'''
+import ephem	 ## PyEphem module
+import numpy as np
+import argparse
+import csv
+import datetime
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import calculateEphemerides as ephemerides
+from catalog import compileCatalog, loadCatalog
+from twilight import twilightTable
+from eventStream import eventArray, arrayStream
+from reportSinks import ReportFields, CSVSink, HTMLSink, writeReports
+
+csvColumns = ['NAME','RA_STRING','DEC_STRING','PER','TT','T14','DEPTH','MASS','SEP','R',
+              'B','V','I','J','H','KS','TRANSIT','SIMBADURL','TRANSITURL','ORBREF']
+
+stageNames = ['catalog','selection','prefilter','candidates','twilight','visibility','reports']
+
+def syntheticCatalog(path, nPlanets, seed=0):
+    '''
+    Write a synthetic exoplanets.org-format CSV database.
+
+    Parameters
+    ----------
+    path : str
+        Path of the CSV file to write
+    nPlanets : int
+        Number of planets
+    seed : int
+        Seed of the random number generator, so catalogs are reproducible
+    Returns
+    -------
+    path : str
+        Path of the CSV file
+
+    Host stars are spread uniformly over the sky, with V magnitudes drawn from
+    number counts rising as 10^(0.3 V) between V=6 and V=16. Periods are
+    log-normal around 4 days (hot Jupiters) with a long tail to a few hundred
+    days; radii, depths, semimajor axes and durations follow from the period,
+    the stellar mass and radius and a random impact parameter. A few percent
+    of the entries have empty fields, as in the real database.
+    '''
+    rng = np.random.RandomState(seed)
+    ra = rng.uniform(0.0, 2*np.pi, nPlanets)
+    dec = np.arcsin(rng.uniform(-1.0, 1.0, nPlanets))
+
+    '''Inverse CDF of dN/dV ~ 10^(0.3 V) on [6, 16]'''
+    u = rng.uniform(0.0, 1.0, nPlanets)
+    V = np.log10(10**(0.3*6.0) + u*(10**(0.3*16.0) - 10**(0.3*6.0)))/0.3
+
+    period = np.clip(10**rng.normal(np.log10(4.0), 0.45, nPlanets), 0.3, 500.0)
+    stellarMass = np.clip(rng.normal(1.0, 0.2, nPlanets), 0.3, 2.0)         ## Solar masses
+    stellarRadius = np.clip(rng.normal(1.0, 0.25, nPlanets), 0.3, 3.0)     ## Solar radii
+    radius = np.clip(10**rng.normal(0.0, 0.2, nPlanets), 0.2, 2.2)          ## Jupiter radii
+    mass = np.clip(10**rng.normal(0.0, 0.5, nPlanets), 0.01, 20.0)          ## Jupiter masses
+    semimajorAxis = (stellarMass*(period/365.25)**2)**(1.0/3)               ## AU
+    impactParameter = rng.uniform(0.0, 0.9, nPlanets)
+    aOverRstar = semimajorAxis*215.032/stellarRadius
+    duration = period/np.pi*np.arcsin(np.sqrt(1.0 - impactParameter**2)/aOverRstar)
+    depth = (radius*0.10045/stellarRadius)**2
+    Tc = rng.uniform(2454000.0, 2457000.0, nPlanets)
+
+    def field(values, fmt, missingFraction=0.0):
+        missing = rng.uniform(0.0, 1.0, nPlanets) < missingFraction
+        return [('' if gap else fmt % value) for value, gap in zip(values, missing)]
+
+    columns = {'NAME': ['SYN-%d b' % i for i in range(nPlanets)],
+               'RA_STRING': [str(ephem.hours(value)) for value in ra],
+               'DEC_STRING': [str(ephem.degrees(value)) for value in dec],
+               'PER': field(period, '%.8f'), 'TT': field(Tc, '%.6f', 0.02),
+               'T14': field(duration, '%.5f', 0.02), 'DEPTH': field(depth, '%.6f', 0.02),
+               'MASS': field(mass, '%.4f', 0.1), 'SEP': field(semimajorAxis, '%.5f'),
+               'R': field(radius, '%.4f', 0.1),
+               'B': field(V + 0.65 + rng.normal(0.0, 0.1, nPlanets), '%.3f', 0.1),
+               'V': field(V, '%.3f', 0.02),
+               'I': field(V - 0.75 + rng.normal(0.0, 0.1, nPlanets), '%.3f', 0.2),
+               'J': field(V - 1.2 + rng.normal(0.0, 0.1, nPlanets), '%.3f', 0.05),
+               'H': field(V - 1.5 + rng.normal(0.0, 0.1, nPlanets), '%.3f', 0.05),
+               'KS': field(V - 1.6 + rng.normal(0.0, 0.1, nPlanets), '%.3f', 0.05),
+               'TRANSIT': ['1' if value > 0.1 else '0' for value in rng.uniform(0.0, 1.0, nPlanets)],
+               'SIMBADURL': ['http://simbad.harvard.edu/simbad/sim-id?Ident=SYN-%d' % i if value > 0.2 else ''
+                             for i, value in enumerate(rng.uniform(0.0, 1.0, nPlanets))],
+               'TRANSITURL': ['http://exoplanets.org/detail/SYN-%d_b' % i for i in range(nPlanets)],
+               'ORBREF': ['Author %d' % year for year in rng.randint(1999, 2015, nPlanets)]}
+
+    output = open(path, 'wb')
+    writer = csv.writer(output)
+    writer.writerow(csvColumns)
+    for i in range(nPlanets):
+        writer.writerow([columns[label][i] for label in csvColumns])
+    output.close()
+    return path
+
+def writeParFile(path, nights, start=(2015,7,10,0,0,0), calcEclipses=False, workers=1):
+    '''
+    Write a .par file for a window of `nights` nights beginning at `start`,
+    with the site and limits of mro.par
+    '''
+    end = datetime.datetime(*start) + datetime.timedelta(days=nights)
+    lines = ['name: Benchmark (MRO)',
+             'latitude: 46:57:03.9',
+             'longitude: -120:43:28.4',
+             'elevation: 1198.0',
+             'temperature: 10.0',
+             'min_horizon: 30:00:00',
+             'start_date: (%i,%i,%i,%i,%i,%i)' % start,
+             'end_date: (%i,%i,%i,%i,%i,%i)' % end.timetuple()[:6],
+             'mag_limit: 12.1',
+             'depth_limit: 0.001',
+             'calc_transits: True',
+             'calc_eclipses: %s' % calcEclipses,
+             'html_out: True',
+             'text_out: True',
+             'twilight: -6',
+             'show_lt: 0',
+             'band: V',
+             'workers: %i' % workers]
+    output = open(path, 'w')
+    output.write('\n'.join(lines)+'\n')
+    output.close()
+    return path
+
+def peakMemory():
+    '''Peak resident set size of this process so far, in MB'''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin': return peak/2.0**20     ## bytes on Mac OS X, kB elsewhere
+    else: return peak/2.0**10
+
+def benchmarkCase(args):
+    '''
+    Time one catalog and window, end to end and stage by stage. Run in a fresh
+    process, so that the caches of earlier cases are cold and the peak memory
+    belongs to this case alone.
+
+    Parameters
+    ----------
+    args : tuple
+        (path to the synthetic CSV, number of nights, calculate eclipses, workers)
+    Returns
+    -------
+    result : dict
+        Wall times (s), peak memory (MB), event counts and rates
+    '''
+    csvPath, nights, calcEclipses, workers = args
+    workDir = tempfile.mkdtemp(prefix='transitephem_bench_')
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        ephemerides.rootdir = ephemerides.exodbPath = workDir
+        parFile = writeParFile(os.path.join(workDir, 'bench.par'), nights, calcEclipses=calcEclipses, workers=workers)
+        result = {'nights': nights, 'workers': workers}
+
+        '''End to end: compile and load the catalog, then calculate and write the reports'''
+        startTime = time.time()
+        exoplanetDB = loadCatalog(csvPath, os.path.join(workDir, 'exoplanetDB.npy'))
+        ephemerides.calculateEphemerides(parFile, exoplanetDB)
+        result['total'] = time.time() - startTime
+
+        '''Stage by stage, with the same inputs'''
+        stages = dict((name, 0.0) for name in stageNames)
+        def stage(name, startTime):
+            stages[name] += time.time() - startTime
+            return time.time()
+
+        parameters = ephemerides.readParFile(parFile)
+        startSem, endSem = parameters['start_date'], parameters['end_date']
+        site = (parameters['latitude'], parameters['longitude'], parameters['elevation'],
+                parameters['temperature'], parameters['min_horizon'])
+        startTime = time.time()
+        exoplanetDB = compileCatalog(csvPath, os.path.join(workDir, 'stageDB.npy'))
+        startTime = stage('catalog', startTime)
+        selected = ephemerides.selectTargets(exoplanetDB, parameters['band'], parameters['mag_limit'], parameters['depth_limit'])
+        startTime = stage('selection', startTime)
+        selected[selected] = ephemerides.risesAboveHorizon(exoplanetDB['DEC_RAD'][selected], site, startSem, endSem)
+        selectedRows = np.flatnonzero(selected)
+        startTime = stage('prefilter', startTime)
+        planetIndices, midEvents, eventTypes = ephemerides.candidateEvents(exoplanetDB['TT'][selectedRows], exoplanetDB['PER'][selectedRows],
+                                                                           startSem, endSem, parameters['calc_transits'], parameters['calc_eclipses'])
+        eventRows = selectedRows[planetIndices]
+        startTime = stage('candidates', startTime)
+        dusk, dawn = twilightTable(ephemerides.makeObserver(*site), startSem, endSem, float(parameters['twilight']))
+        startTime = stage('twilight', startTime)
+        columns = (midEvents, np.nan_to_num(exoplanetDB['T14'][eventRows])/2, exoplanetDB['RA_RAD'][eventRows], exoplanetDB['DEC_RAD'][eventRows])
+        possible = ephemerides.prefilterEvents(*(columns+(site, dusk, dawn)))
+        startTime = stage('prefilter', startTime)
+        visible = np.zeros(len(midEvents), dtype=bool)
+        altitudes = np.zeros((len(midEvents), 2))
+        azimuths = np.zeros((len(midEvents), 2))
+        visible[possible], altitudes[possible], azimuths[possible] = \
+            ephemerides.visibleEvents(*(tuple(column[possible] for column in columns)+(site, dusk, dawn, parameters['altaz_backend'])))[:3]
+        startTime = stage('visibility', startTime)
+        eventRows, midEvents, eventTypes = eventRows[visible], midEvents[visible], eventTypes[visible]
+        stream = arrayStream(eventArray(exoplanetDB['NAME'], eventRows, midEvents, eventTypes, np.nan_to_num(exoplanetDB['T14'][eventRows])/2,
+                                        altitudes[visible], azimuths[visible]))
+        fields = ReportFields(exoplanetDB, ephemerides.bandColumnName(parameters['band']))
+        writeReports(stream, [CSVSink(os.path.join(workDir, 'stage.csv'), fields),
+                              HTMLSink(os.path.join(workDir, 'stage.html'), fields, parameters['name'], parameters['band'], startSem, endSem)])
+        startTime = stage('reports', startTime)
+
+        result['stages'] = stages
+        result['planets'] = len(exoplanetDB)
+        result['selected'] = len(selectedRows)
+        result['candidates'] = len(visible)
+        result['evaluated'] = int(possible.sum())
+        result['events'] = int(visible.sum())
+        result['eventsPerSecond'] = result['events']/result['total']
+        result['candidatesPerSecond'] = result['candidates']/max(result['stages']['prefilter']+result['stages']['visibility'], 1e-9)
+        result['peakMemory'] = peakMemory()
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        shutil.rmtree(workDir)
+    return result
+
+def queueCase(queue, args):
+    '''Run `benchmarkCase` in a child process (not a daemonic pool worker, so that
+    the "workers" parameter can start its own pool) and send back the result'''
+    queue.put(benchmarkCase(args))
+
+def runBenchmarks(planetCounts, nightCounts, calcEclipses=False, workers=1, seed=0):
+    '''
+    Run every combination of catalog size and window length.
+
+    Parameters
+    ----------
+    planetCounts : list of int
+        Sizes of the synthetic catalogs
+    nightCounts : list of int
+        Lengths of the observing windows, in nights
+    calcEclipses : bool
+        Include secondary eclipses as well as transits
+    workers : int
+        Value of the "workers" parameter
+    seed : int
+        Seed of the synthetic catalogs
+    Returns
+    -------
+    results : list of dict
+        One result from `benchmarkCase` per combination
+    '''
+    catalogDir = tempfile.mkdtemp(prefix='transitephem_catalogs_')
+    results = []
+    try:
+        for nPlanets in planetCounts:
+            csvPath = syntheticCatalog(os.path.join(catalogDir, 'exoplanets_%i.csv' % nPlanets), nPlanets, seed)
+            for nights in nightCounts:
+                queue = multiprocessing.Queue()
+                process = multiprocessing.Process(target=queueCase, args=(queue, (csvPath, nights, calcEclipses, workers)))
+                process.start()
+                result = queue.get()
+                process.join()
+                printResult(result)
+                results.append(result)
+    finally:
+        shutil.rmtree(catalogDir)
+    return results
+
+def printResult(result):
+    '''Print one row of the results table'''
+    if not hasattr(printResult, 'header'):
+        printResult.header = True
+        print ' '.join(['%8s' % 'planets', '%6s' % 'nights', '%9s' % 'events', '%8s' % 'total(s)']+
+                       ['%10s' % name for name in stageNames]+['%9s' % 'events/s', '%8s' % 'peak(MB)'])
+    print ' '.join(['%8i' % result['planets'], '%6i' % result['nights'], '%9i' % result['events'], '%8.2f' % result['total']]+
+                   ['%10.3f' % result['stages'][name] for name in stageNames]+
+                   ['%9.0f' % result['eventsPerSecond'], '%8.1f' % result['peakMemory']])
+    sys.stdout.flush()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline benchmarks of calculateEphemerides on synthetic catalogs')
+    parser.add_argument('--planets', type=int, nargs='+', default=[1000, 10000], help='catalog sizes')
+    parser.add_argument('--nights', type=int, nargs='+', default=[1, 30, 365], help='observing window lengths')
+    parser.add_argument('--eclipses', action='store_true', help='include secondary eclipses')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes for the visibility tests')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic catalogs')
+    parser.add_argument('--json', help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = runBenchmarks(args.planets, args.nights, args.eclipses, args.workers, args.seed)
+    if args.json is not None:
+        output = open(args.json, 'w')
+        json.dump(results, output, indent=2, sort_keys=True)
+        output.close()
@@ -14,10 +14,24 @@ from glob import glob
 import time
 from astropy.time import Time
 import os.path
-import cPickle
 import sys
-from urllib import urlopen
 import re
+import multiprocessing
+from vectorEphem import observerAltAz, tieredAltAz, maxAltitude, hourAngleLimit, hourAngle, prefilterMargin
+from twilight import cachedTwilightTable, duringNight
+from transitSampling import sampleEvents
+from lunar import eventMoonConstraint
+from catalog import loadCatalog
+from targetIndex import targetIndex
+from catalogRefresh import defaultURL, isStale, refreshCatalog, backgroundRefresh
+from resultCache import ResultCache, siteKey, planetKeys
+from eventStream import eventArray, arrayStream
+from reportSinks import ReportFields, CSVSink, HTMLSink, PagedHTMLSink, ColumnSink, IndexSink, writeReports
+from timeConversion import datestrings
+from schedule import eventWeights, observingSchedule
+from profiling import Profiler, profilerSettings, profiling, stage, count
+from eventIndex import indexSettings
+from parameterSweep import sweepRequested, sweepGrid, loosestLimits, SweepTable, writeSummary
 
 rootdir = './outputs/'
 exodbPath = './outputs/'#rootdir+'exodb'
@@ -53,595 +67,792 @@ def jd2gd(jd):
     return tuple(map(int,re.findall(r"[\w']+",string)[:-1]))
 
 
-def downloadAndPickle():
-    pklDatabaseName = os.path.join(exodbPath,'exoplanetDB.pkl')	 ## Name of exoplanet database C-pickle
-    pklDatabasePaths = glob(pklDatabaseName)   ## list of files with the name pklDatabaseName in cwd
+def midEventsInWindow(Tc, P, start, end, phase=0.0):
+    '''
+    Enumerate the mid-transit (phase=0) or mid-eclipse (phase=0.5) times of
+    many planets between Julian Dates start and end. The first and last epoch
+    numbers in the window are found arithmetically, so there is no limit on
+    the period, the age of the reference epoch or the length of the window.
+
+    Parameters
+    ----------
+    Tc : array
+        Reference mid-transit times, in julian date
+    P : array
+        Orbital periods in days
+    start, end : float
+        Julian dates bounding the window (exclusive)
+    phase : float
+        Orbital phase of the event relative to mid-transit
+    Returns
+    -------
+    planetIndices : array
+        Index into `Tc` and `P` of the planet of each event
+    midEvents : array
+        Julian date of the middle of each event
+    '''
+    Tc = np.asarray(Tc, dtype=np.float64)
+    P = np.asarray(P, dtype=np.float64)
+    firstEpochs = np.floor((start - Tc)/P - phase) + 1
+    lastEpochs = np.ceil((end - Tc)/P - phase) - 1
+    counts = np.maximum(lastEpochs - firstEpochs + 1, 0).astype(int)
+    planetIndices = np.repeat(np.arange(len(Tc)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    midEvents = Tc[planetIndices] + P[planetIndices]*(firstEpochs[planetIndices] + offsets + phase)
+    inWindow = (midEvents > start)*(midEvents < end)   ## Guard against round-off at the window edges
+    return planetIndices[inWindow], midEvents[inWindow]
+
+def nightIndex(times, start):
+    '''
+    Parameters
+    ----------
+    times : array
+        Julian dates of events
+    start : float
+        Julian date of the first day of the window
+    Returns
+    -------
+    nights : array
+        Number of days after `start` of the day each event is assigned to;
+        day `start+k` collects the events in (start+k-0.5, start+k+0.5]
+    '''
+    return np.ceil(np.asarray(times, dtype=np.float64) - start - 0.5)
+
+def makeObserver(latitude, longitude, elevation, temperature, minHorizon):
+    '''
+    Parameters
+    ----------
+    latitude, longitude : str
+        Observatory latitude and longitude; format = deg:min:sec
+    elevation : float
+        Observatory elevation in meters
+    temperature : float
+        Air temperature in degrees C
+    minHorizon : str
+        Pointing limit of the telescope; format = deg:min:sec
+    Returns
+    -------
+    observatory : ephem.Observer
+    '''
+    observatory = ephem.Observer()
+    observatory.lat = latitude	## Input format-  deg:min:sec  (type=str)
+    observatory.long = longitude ## Input format-  deg:min:sec  (type=str)
+    observatory.elevation = elevation   # m
+    observatory.temp = temperature	  ## Celsius 
+    observatory.horizon = minHorizon	## Input format-  deg:min:sec  (type=str)
+    return observatory
+
+def candidateEvents(Tcs, periods, start, end, calcTransits=True, calcEclipses=False):
+    '''
+    Parameters
+    ----------
+    Tcs, periods : array
+        Reference mid-transit times (JD) and periods (days) of the planets
+    start, end : float
+        Julian dates bounding the window
+    calcTransits, calcEclipses : bool
+        Which kinds of events to enumerate
+    Returns
+    -------
+    planetIndices : array
+        Index into `Tcs` and `periods` of the planet of each event
+    midEvents : array
+        Julian date of the middle of each event
+    eventTypes : array
+        'transit' or 'eclipse'
+
+    The events are sorted by planet and then by time.
+    '''
+    candidatePlanets, candidateMidEvents, candidateTypes = [], [], []
+    for calcEvent, phase, eventType in [(calcTransits,0.0,'transit'),(calcEclipses,0.5,'eclipse')]:
+        if calcEvent:
+            planetIndices, midEvents = midEventsInWindow(Tcs,periods,start,end,phase)
+            candidatePlanets.append(planetIndices)
+            candidateMidEvents.append(midEvents)
+            candidateTypes.append(np.repeat(eventType,len(midEvents)))
+    candidatePlanets = np.concatenate(candidatePlanets+[np.zeros(0,dtype=int)])
+    candidateMidEvents = np.concatenate(candidateMidEvents+[np.zeros(0)])
+    candidateTypes = np.concatenate(candidateTypes+[np.zeros(0,dtype='S7')])
+    order = np.lexsort((candidateMidEvents,candidatePlanets))
+    return candidatePlanets[order], candidateMidEvents[order], candidateTypes[order]
+
+def risesAboveHorizon(decs, site, start, end):
+    '''
+    Parameters
+    ----------
+    decs : array
+        J2000 declinations of the host stars in radians
+    site : tuple
+        Arguments to `makeObserver`
+    start, end : float
+        Julian dates bounding the window
+    Returns
+    -------
+    rises : array of bool
+        False for the stars that never reach the telescope's horizon limit 
+        from the site, whose events need not be enumerated at all
+    '''
+    observatory = makeObserver(*site)
+    margin = max(prefilterMargin(start),prefilterMargin(end))
+    return maxAltitude(decs,float(observatory.lat)) > float(observatory.horizon) - margin
+
+def prefilterEvents(midEvents, halfDurations, ras, decs, site, dusk, dawn):
+    '''
+    Analytic test that rejects the candidate events that cannot pass 
+    `visibleEvents`, so that they are never evaluated in full: those with 
+    ingress or egress in daylight, and those with ingress or egress outside 
+    the range of hour angles over which the host star is above the horizon 
+    limit. The hour angle range is computed once per star from its J2000 
+    declination and the site latitude, with the margin of 
+    `vectorEphem.prefilterMargin`, so no observable event is rejected.
+
+    Parameters
+    ----------
+    midEvents, halfDurations, ras, decs, site, dusk, dawn : 
+        See `visibleEvents`
+    Returns
+    -------
+    possible : array of bool
+        False for the events that are certainly not observable
+    '''
+    if len(midEvents) == 0:
+        return np.zeros(0,dtype=bool)
+    observatory = makeObserver(*site)
+    margin = max(prefilterMargin(midEvents.min()),prefilterMargin(midEvents.max()))
+    ingressEgress = np.column_stack([midEvents-halfDurations,midEvents+halfDurations])
+    halfWidths = hourAngleLimit(decs,float(observatory.lat),float(observatory.horizon) - margin)
+    hourAngles = hourAngle(ras[:,np.newaxis],ingressEgress,float(observatory.long))
+    withinLimits = np.all(np.abs(hourAngles) <= halfWidths[:,np.newaxis],axis=1)
+    return withinLimits*np.all(duringNight(dusk,dawn,ingressEgress),axis=1)
+
+def visibleEvents(midEvents, halfDurations, ras, decs, site, dusk, dawn, altazBackend='numpy', tierMargin=0.05):
+    '''
+    Test which candidate events happen with the host star above the 
+    telescope's horizon limit and the Sun below the twilight altitude at 
+    both ingress and egress.
+
+    Parameters
+    ----------
+    midEvents, halfDurations : array
+        Julian date of the middle of each event and half of its duration (days)
+    ras, decs : array
+        J2000 coordinates of the host star of each event in radians
+    site : tuple
+        Arguments to `makeObserver`
+    dusk, dawn : array
+        Night table for the site, from `twilight.twilightTable`
+    altazBackend : str
+        'numpy' or 'ephem', see `vectorEphem.observerAltAz`, or 'tiered' for 
+        the NumPy engine refined with PyEphem near the thresholds, see 
+        `vectorEphem.tieredAltAz`
+    tierMargin : float
+        Safety margin in degrees of the 'tiered' backend
+    Returns
+    -------
+    visible : array of bool
+        True for the events that can be observed
+    altitudes : array
+        Host star altitudes in degrees at ingress and egress, shape (N, 2)
+    azimuths : array
+        Host star azimuths in degrees (east of north) at ingress and egress, 
+        shape (N, 2)
+    refined : array of bool
+        True for the events recomputed with PyEphem by the 'tiered' backend
+    '''
+    observatory = makeObserver(*site)
+    ingressEgress = np.column_stack([midEvents-halfDurations,midEvents+halfDurations])
+    if altazBackend == 'tiered':
+        altitudes, azimuths, refined = tieredAltAz(ras[:,np.newaxis],decs[:,np.newaxis],ingressEgress,observatory,tierMargin)
+        refined = np.any(refined,axis=1)
+    else:
+        altitudes, azimuths = observerAltAz(ras[:,np.newaxis],decs[:,np.newaxis],ingressEgress,observatory,altazBackend)
+        refined = np.zeros(len(midEvents),dtype=bool)
+    altitudes = np.degrees(altitudes).reshape(-1,2)
+    azimuths = np.degrees(azimuths).reshape(-1,2)
+    aboveHorizon = np.all(altitudes > np.degrees(float(observatory.horizon)),axis=1)
+
+    '''Look up whether ingress and egress fall between dusk and dawn in the night table'''
+    afterTwilight = np.all(duringNight(dusk,dawn,ingressEgress),axis=1)
+    return aboveHorizon*afterTwilight, altitudes, azimuths, refined
+
+def sampledVisibleEvents(midEvents, halfDurations, ras, decs, site, dusk, dawn, altazBackend='numpy', 
+                         baseline=0.0, step=5.0/1440, minFraction=1.0):
+    '''
+    Dense counterpart to `visibleEvents`: sample each event from `baseline` 
+    days before ingress to `baseline` days after egress, at most `step` days 
+    apart, and accept the events that are observable for at least 
+    `minFraction` of the samples. See `transitSampling.sampleEvents`.
+
+    Returns
+    -------
+    visible, altitudes, azimuths, refined : array
+        As returned by `visibleEvents`; no events are refined
+    samples : array
+        Observable fraction, minimum altitude (degrees) and maximum airmass 
+        while observable of each event, shape (N, 3)
+    '''
+    observatory = makeObserver(*site)
+    fractions, minAltitudes, maxAirmasses, altitudes, azimuths = sampleEvents(midEvents,halfDurations,ras,decs,observatory,
+                                                                                dusk,dawn,baseline,step,altazBackend)
+    '''Allow for round-off in the fraction of a whole number of samples'''
+    return fractions >= minFraction - 1e-9, altitudes, azimuths, np.zeros(len(midEvents),dtype=bool), \
+           np.column_stack([fractions,minAltitudes,maxAirmasses])
+
+def visibleEventsChunk(args):
+    '''Unpack the arguments of `visibleEvents` for multiprocessing.Pool.map'''
+    return visibleEvents(*args)
+
+def sampledVisibleEventsChunk(args):
+    '''Unpack the arguments of `sampledVisibleEvents` for multiprocessing.Pool.map'''
+    return sampledVisibleEvents(*args)
+
+def returnBool(value):
+    '''Return booleans from strings'''
+    if value.upper().strip() == 'TRUE': return True
+    elif value.upper().strip() == 'FALSE': return False
+
+altazBackends = ['numpy','ephem','tiered']   ## Options of altaz_backend, see `visibleEvents`
+
+'''Values of the optional .par file parameters'''
+defaultParameters = {'show_lt': 0.0, 'timezone': None, 'altaz_backend': 'numpy', 'workers': 1,
+                     'result_cache': False, 'cache_nights': 366, 'profile': None, 'catalog_url': defaultURL,
+                     'catalog_max_age': 14.0, 'schedule_weight': 'depth', 'sampling': False, 'sample_minutes': 5.0,
+                     'baseline_minutes': 0.0, 'min_fraction': 1.0, 'chunk_days': 0.0, 'html_format': 'table',
+                     'html_split': 'none', 'html_gzip': False, 'moon_min_separation': 0.0, 'moon_max_illumination': 1.0,
+                     'moon_max_altitude': 0.0, 'tier_margin': 0.05, 'binary_out': False, 'sweep_reports': False,
+                     'event_index': False}
+
+def readParFile(parFile):
+    '''
+    Parameters
+    ----------
+    parFile : str
+        Path to the parameter file, relative to this module
+    Returns
+    -------
+    parameters : dict
+        Parsed values of the parameters in the file, keyed by the names used
+        in the .par file, with defaults for the optional ones
+    '''
+    parFileText = open(os.path.join(os.path.dirname(__file__),parFile),'r').read().splitlines()
+    parameters = dict(defaultParameters)
+    converters = {'elevation': float, 'temperature': float, 'start_date': lambda value: gd2jd(eval(value)),
+                  'end_date': lambda value: gd2jd(eval(value)), 'mag_limit': float, 'depth_limit': float,
+                  'calc_transits': returnBool, 'calc_eclipses': returnBool, 'html_out': returnBool,
+                  'text_out': returnBool, 'show_lt': float, 'workers': int, 'result_cache': returnBool,
+                  'cache_nights': int, 'catalog_max_age': float, 'sampling': returnBool, 'sample_minutes': float,
+                  'baseline_minutes': float, 'min_fraction': float, 'chunk_days': float, 'html_gzip': returnBool,
+                  'moon_min_separation': float, 'moon_max_illumination': float, 'moon_max_altitude': float,
+                  'tier_margin': float, 'binary_out': returnBool, 'sweep_reports': returnBool,
+                  'event_index': returnBool}
+    for line in parFileText:
+        parameter = line.split(':')[0]
+        if len(line.split(':')) > 1:
+            value = line.split(':')[1].strip()
+            if parameter in ['latitude','longitude','min_horizon','sweep_min_horizon','catalog_url']:
+                value = line.split(':',1)[1].strip()  ## Keep the whole deg:min:sec string(s) or URL
+            parameters[parameter] = converters.get(parameter,str)(value)
+    if hasattr(sys, 'real_prefix'):
+        parameters['show_lt'] = float(0)
+    return parameters
+
+def downloadAndCompile(url=defaultURL, maxAge=14.0):
+    '''
+    Return the compiled exoplanets.org catalog, downloading the CSV database 
+    from `url` if there is no local copy. If the local copy is more than 
+    `maxAge` days old, it is used as is while a fresh copy is requested in 
+    the background (see catalogRefresh.py), for the next run.
+    '''
+    catalogName = os.path.join(exodbPath,'exoplanetDB.npy')	 ## Name of the compiled, memory-mapped exoplanet catalog
     csvDatabaseName = os.path.join(exodbPath,'exoplanets.csv')  ## Path to the text file saved from exoplanets.org
     csvDatabasePaths = glob(csvDatabaseName)
 
-    '''First, check if there is an internet connection.'''
-
-    '''If there's a previously archived database pickle in this current working 
-        directory then use it, if not, grab the data from exoplanets.org in one big CSV file and make one.
-        If the old archive is >14 days old, grab a fresh version of the database from exoplanets.org.
+    '''If there's a local copy of the CSV database then use it, if not, grab the data from 
+        exoplanets.org in one big CSV file. If the old copy is stale, refresh it in the 
+        background. The compiled catalog is rebuilt whenever the CSV changes.
         '''
-    if csvDatabasePaths == []:
-        print 'No local copy of exoplanets.org database. Downloading one...'
-        rawCSV = urlopen('http://www.exoplanets.org/csv-files/exoplanets.csv').read()
-        saveCSV = open(csvDatabaseName,'w')
-        saveCSV.write(rawCSV)
-        saveCSV.close()
-    else: 
-        '''If the local copy of the exoplanets.org database is >14 days old, download a new one'''
-        secondsSinceLastModification = time.time() - os.path.getmtime(csvDatabaseName) ## in seconds
-        daysSinceLastModification = secondsSinceLastModification/(60*60*24*30)
-        if daysSinceLastModification > 7:
-            print 'Your local copy of the exoplanets.org database is >14 days old. Downloading a fresh one...'
-            rawCSV = urlopen('http://www.exoplanets.org/csv-files/exoplanets.csv').read()
-            saveCSV = open(csvDatabaseName,'w')
-            saveCSV.write(rawCSV)
-            saveCSV.close()
-        else: print "Your local copy of the exoplanets.org database is <14 days old. That'll do."
-
-    if len(pklDatabasePaths) == 0:
-        print 'Parsing '+os.path.split(csvDatabaseName)[1]+', the CSV database from exoplanets.org...'
-        rawTable = open(csvDatabaseName).read().splitlines()
-        labels = rawTable[0].split(',')
-        #labelUnits = rawTable[1].split(',')
-        #rawTableArray = np.zeros([len(rawTable),len(labels)])
-        exoplanetDB = {}
-        planetNameColumn = np.arange(len(labels))[np.array(labels,dtype=str)=='NAME'][0]
-        for row in range(1,len(rawTable)): 
-            splitRow = rawTable[row].split(',')
-            exoplanetDB[splitRow[planetNameColumn]] = {}	## Create dictionary for this row's planet
-            for col in range(0,len(splitRow)):
-                exoplanetDB[splitRow[planetNameColumn]][labels[col]] = splitRow[col]
-        
-        output = open(pklDatabaseName,'wb')
-        cPickle.dump(exoplanetDB,output)
-        output.close()
-    else: 
-        print 'Using previously parsed database from exoplanets.org...'
-        inputFile = open(pklDatabaseName,'rb')
-        exoplanetDB = cPickle.load(inputFile)
-        inputFile.close()
-    
-    return exoplanetDB
+    with stage('download'):
+        if csvDatabasePaths == []:
+            print 'No local copy of exoplanets.org database. Downloading one...'
+            refreshCatalog(url,csvDatabaseName)
+        elif isStale(csvDatabaseName,maxAge):
+            print 'Your local copy of the exoplanets.org database is >%g days old. Checking for a fresh one in the background...' % maxAge
+            backgroundRefresh(url,csvDatabaseName)
+        else: print "Your local copy of the exoplanets.org database is <%g days old. That'll do." % maxAge
+
+    with stage('catalog'):
+        return loadCatalog(csvDatabaseName,catalogName)
+
+def bandColumnName(band):
+    '''Catalog column holding the magnitudes in `band`'''
+    return {'K':'KS'}.get(band.upper(),band.upper())
+
+def selectTargets(exoplanetDB, band, mag_limit, depth_limit):
+    '''
+    Parameters
+    ----------
+    exoplanetDB : structured array
+        Compiled catalog from `downloadAndCompile`
+    band : str
+        Observing band of `mag_limit`: any photometric band in the catalog, 
+        i.e. B, V, I, J, H or K (KS)
+    mag_limit : float
+        Magnitude of the faintest host star to include
+    depth_limit : float
+        Shallowest transit depth to include
+    Returns
+    -------
+    selected : array of bool
+        True for the transiting planets within the limits that have a known
+        ephemeris and host star position, found with binary searches in the 
+        catalog's sorted `targetIndex.TargetIndex`
+    '''
+    return targetIndex(exoplanetDB).select(bandColumnName(band),mag_limit,depth_limit)
+
+def localNoonOffset(longitude):
+    '''Local mean time minus UT, in days, at `longitude` (deg:min:sec, east positive)'''
+    return float(ephem.degrees(longitude))/(2*np.pi)
+
+def windowChunks(parameters):
+    '''
+    Split the observing window into chunks of `chunk_days` days, so that long 
+    windows can be computed one chunk at a time in bounded memory. The chunk 
+    boundaries fall at local mean noon at the site, between nights, so no night 
+    is split and the overlaps and schedule of every night are those of the 
+    whole window.
 
-def calculateEphemerides(parFile):
+    Parameters
+    ----------
+    parameters : dict
+        Parameters of a .par file, as returned by `readParFile`
+    Returns
+    -------
+    chunks : list of dict
+        Copies of `parameters` with the start_date and end_date of each 
+        chunk, in order; just `parameters` if chunk_days is 0
+    '''
+    start, end, chunkDays = parameters['start_date'], parameters['end_date'], parameters['chunk_days']
+    if not chunkDays > 0:
+        return [parameters]
+    noonOffset = localNoonOffset(parameters['longitude'])
+    boundaries = np.round(np.arange(start + chunkDays, end, chunkDays) + noonOffset) - noonOffset
+    boundaries = np.unique(boundaries[(boundaries > start)*(boundaries < end)])
+    bounds = np.r_[start, boundaries, end]
+    chunks = []
+    for chunkStart, chunkEnd in zip(bounds[:-1], bounds[1:]):
+        chunk = dict(parameters)
+        chunk['start_date'], chunk['end_date'] = chunkStart, chunkEnd
+        chunks.append(chunk)
+    return chunks
+
+def calculateEphemerides(parFile, exoplanetDB=None, candidates=None, reportName='eventReport'):
     '''
         :INPUTS:
         parFile	 --	  path to the parameter file
+        exoplanetDB  --   compiled catalog from `downloadAndCompile`, loaded if not given
+        candidates   --   (catalog rows, mid-event times, event types) of candidate events 
+                          covering at least this site's targets and dates, as returned by 
+                          `candidateEvents`; computed if not given
+        reportName   --   file name, without extension, of the reports written to rootdir
+        
+        If profiling is enabled (see profiling.py), the timers and counters of each 
+        stage are written to rootdir/<reportName>_profile.json. If the .par file 
+        lists limits to sweep (sweep_mag_limit etc.), the sweep is run instead, 
+        see `sweepEphemerides`.
         '''
 
-
     '''Parse the observatory .par file'''
-    parFileText = open(os.path.join(os.path.dirname(__file__),parFile),'r').read().splitlines()
+    parameters = readParFile(parFile)
+    profiler = Profiler(*profilerSettings(parameters['profile']))
+    with profiling(profiler):
+        if sweepRequested(parameters):
+            sweepEphemerides(parameters,exoplanetDB,reportName)
+        else:
+            writeEphemerides(parameters,exoplanetDB,candidates,reportName)
+    if profiler.enabled:
+        profilePath = os.path.join(os.path.abspath(rootdir),reportName+'_profile.json')
+        profiler.save(profilePath)
+        print 'Profile written to '+profilePath
 
-    def returnBool(value):
-        '''Return booleans from strings'''
-        if value.upper().strip() == 'TRUE': return True
-        elif value.upper().strip() == 'FALSE': return False
-    if hasattr(sys, 'real_prefix'):
-        show_lt = float(0)
-    for line in parFileText:
-        parameter = line.split(':')[0]
-        if len(line.split(':')) > 1:
-            value = line.split(':')[1].strip()
-            if parameter == 'name': observatory_name = value
-            elif parameter == 'latitude': observatory_latitude = value
-            elif parameter == 'longitude': observatory_longitude = value
-            elif parameter == 'elevation': observatory_elevation = float(value)
-            elif parameter == 'temperature': observatory_temperature = float(value)
-            elif parameter == 'min_horizon': observatory_minHorizon = value
-            elif parameter == 'start_date': startSem = gd2jd(eval(value))
-            elif parameter == 'end_date': endSem = gd2jd(eval(value))
-            elif parameter == 'mag_limit': mag_limit = float(value)
-            elif parameter == 'band': band = value
-            elif parameter == 'depth_limit': depth_limit = float(value)
-            elif parameter == 'calc_transits': calcTransits = returnBool(value)
-            elif parameter == 'calc_eclipses': calcEclipses = returnBool(value)
-            elif parameter == 'html_out': htmlOut = returnBool(value)
-            elif parameter == 'text_out': textOut = returnBool(value)
-            elif parameter == 'twilight': twilightType = value
-            elif parameter == 'show_lt': show_lt = float(value)
-    #from oscaar.extras.knownSystemParameters import getLatestParams
-    exoplanetDB = downloadAndPickle()
+def observableEvents(parameters, exoplanetDB, candidates=None, nightTable=None, selection=None, diagnostics=None):
+    '''
+    Parameters
+    ----------
+    parameters : dict
+        Parameters of a .par file, as returned by `readParFile`
+    exoplanetDB : structured array
+        Compiled catalog from `downloadAndCompile`
+    candidates : tuple
+        Candidate events shared by several sites, see `calculateEphemerides`
+    nightTable : tuple
+        (dusk, dawn) table of the site from `twilight.twilightTable`, covering 
+        at least the observing window; computed if not given
+    selection : array of bool
+        Planets to search, in place of those within the band, mag_limit and 
+        depth_limit of `parameters` (see `selectTargets`)
+    diagnostics : dict
+        If given, the numbers of candidate events decided by each tier of the 
+        'tiered' backend are added to its 'events decided by the coarse screen' 
+        and 'events refined with PyEphem', for the report metadata
+    Returns
+    -------
+    eventRows, midEvents, eventTypes : array
+        Catalog row, mid-event julian date and type of each observable event
+    altitudes, azimuths : array
+        Altitude and azimuth (degrees) of the host star at ingress and egress 
+        of each event, shape (N, 2)
+    samples : array or None
+        With `sampling` on, the observable fraction, minimum altitude (degrees) 
+        and maximum airmass while observable of each event, shape (N, 3), 
+        see `sampledVisibleEvents`; None otherwise
+    '''
+    observatory_latitude = parameters['latitude']
+    observatory_longitude = parameters['longitude']
+    observatory_elevation = parameters['elevation']
+    observatory_temperature = parameters['temperature']
+    observatory_minHorizon = parameters['min_horizon']
+    startSem, endSem = parameters['start_date'], parameters['end_date']
+    mag_limit, band, depth_limit = parameters['mag_limit'], parameters['band'], parameters['depth_limit']
+    calcTransits, calcEclipses = parameters['calc_transits'], parameters['calc_eclipses']
+    twilightType = parameters['twilight']
+    altazBackend, workers = parameters['altaz_backend'], parameters['workers']
+    resultCache, cacheNights = parameters['result_cache'], parameters['cache_nights']
+    sampling, minFraction = parameters['sampling'], parameters['min_fraction']
+    baseline, sampleStep = parameters['baseline_minutes']/1440.0, parameters['sample_minutes']/1440.0
+    if sampling and not sampleStep > 0:
+        raise ValueError('sample_minutes must be positive')
+    if altazBackend not in altazBackends:
+        raise ValueError("Unknown altaz_backend '%s', expected one of: %s" % (altazBackend,', '.join(altazBackends)))
+    if sampling and altazBackend == 'tiered':
+        raise ValueError('altaz_backend: tiered refines the ingress/egress test, and cannot be used with sampling')
+    moonLimits = parameters['moon_min_separation'] > 0 or parameters['moon_max_illumination'] < 1
+    if sampling and resultCache:
+        print 'The result cache only holds the results of the ingress/egress test, and is not used with sampling.'
+        resultCache = False
 
     ''' Set up observatory parameters '''
-    observatory = ephem.Observer()
-    observatory.lat =  observatory_latitude#'38:58:50.16'	## Input format-  deg:min:sec  (type=str)
-    observatory.long = observatory_longitude#'-76:56:13.92' ## Input format-  deg:min:sec  (type=str)
-    observatory.elevation = observatory_elevation   # m
-    observatory.temp = observatory_temperature	  ## Celsius 
-    observatory.horizon = observatory_minHorizon	## Input format-  deg:min:sec  (type=str)
-
-    def trunc(f, n):
-        '''Truncates a float f to n decimal places without rounding'''
-        slen = len('%.*f' % (n, f))
-        return str(f)[:slen]
-
-    def RA(planet):
-        '''Type: str, Units:  hours:min:sec'''
-        return exoplanetDB[planet]['RA_STRING']
-    def dec(planet):
-        '''Type: str, Units:  deg:min:sec'''
-        return exoplanetDB[planet]['DEC_STRING']
-    def period(planet):
-        '''Units:  days'''
-        return np.float64(exoplanetDB[planet]['PER'])
-    def epoch(planet):
-        '''Tc at mid-transit. Units:  days'''
-        if exoplanetDB[planet]['TT'] == '': return 0.0
-        else: return np.float64(exoplanetDB[planet]['TT'])
-    def duration(planet):
-        '''Transit/eclipse duration. Units:  days'''
-        if exoplanetDB[planet]['T14'] == '': return 0.0
-        else: return float(exoplanetDB[planet]['T14'])
-    def V(planet):
-        '''V mag'''
-        if exoplanetDB[planet]['V'] == '': return 0.0
-        else: return float(exoplanetDB[planet]['V'])
-    def KS(planet):
-        '''KS mag'''
-        if exoplanetDB[planet]['KS'] == '': return 0.0
-        else: return float(exoplanetDB[planet]['KS'])
-    
-    def bandMagnitude(planet):
-        if band.upper() == 'V':
-            return V(planet)
-        elif band.upper() == 'K':
-            return KS(planet)
-    def depth(planet):
-        '''Transit depth'''
-        if exoplanetDB[planet]['DEPTH'] == '': return 0.0
-        else: return float(exoplanetDB[planet]['DEPTH'])
-
-    def transitBool(planet):
-        '''True if exoplanet is transiting, False if detected by other means'''
-        if exoplanetDB[planet]['TRANSIT'] == '0': return 0
-        elif exoplanetDB[planet]['TRANSIT'] == '1': return 1
-    ########################################################################################
-    ########################################################################################
-
-    def datestr2list(datestr):
-        ''' Take strings of the form: "2013/1/18 20:08:18" and return them as a
-            tuple of the same parameters'''
-        year,month,others = datestr.split('/')
-        day, time = others.split(' ')
-        hour,minute,sec = time.split(':')
-        return (int(year),int(month),int(day),int(hour),int(minute),int(sec))
-
-    def list2datestr(inList):
-        '''Converse function to datestr2list'''
-        inList = map(str,inList)
-        return inList[0]+'/'+inList[1]+'/'+inList[2]+' '+inList[3].zfill(2)+':'+inList[4].zfill(2)+':'+inList[5].zfill(2)
-
-    def list2datestrCSV(inList):
-        '''Converse function to datestr2list'''
-        inList = map(str,inList)
-        #print inList
-        return inList[0]+'/'+inList[1]+'/'+inList[2]+','+inList[3].zfill(2)+':'+inList[4].zfill(2)+':'+inList[5].zfill(2)
-
-
-    def list2datestrHTML(inList,alt,direction):
-        '''Converse function to datestr2list'''
-        inList = map(str,inList)
-        #return inList[1].zfill(2)+'/'+inList[2].zfill(2)+'<br />'+inList[3].zfill(2)+':'+inList[4].zfill(2)
-        return inList[1].zfill(2)+'/<strong>'+inList[2].zfill(2)+'</strong>, '+inList[3].zfill(2)+':'+inList[4].split('.')[0].zfill(2)+'<br /> '+alt+'&deg; '+direction
-
-    def list2datestrHTML_UTnoaltdir(inList,alt,direction):
-        '''Converse function to datestr2list'''
-        inList = map(str,inList)
-        #return inList[1].zfill(2)+'/'+inList[2].zfill(2)+'<br />'+inList[3].zfill(2)+':'+inList[4].zfill(2)
-        return inList[1].zfill(2)+'/<strong>'+inList[2].zfill(2)+'</strong>, '+inList[3].zfill(2)+':'+inList[4].split('.')[0].zfill(2)
-
-    def list2datestrHTML_LT(inList,alt,direction):
-        '''Converse function to datestr2list for daylight savings time'''
-        #print "original",inList
-        tempDate = ephem.Date(inList)
-        inList = ephem.Date(ephem.localtime(tempDate)).tuple()
-        #print "converted",lt_inList,'\n'
-        inList = map(str,inList)
-        #return inList[1].zfill(2)+'/'+inList[2].zfill(2)+'<br />'+inList[3].zfill(2)+':'+inList[4].zfill(2)
-        return inList[1].zfill(2)+'/<strong>'+inList[2].zfill(2)+'</strong>, '+inList[3].zfill(2)+':'+inList[4].split('.')[0].zfill(2)+'<br /> '+alt+'&deg; '+direction
-
-    def simbadURL(planet):
-        if exoplanetDB[planet]['SIMBADURL'] == '': return 'http://simbad.harvard.edu/simbad/'
-        else: return exoplanetDB[planet]['SIMBADURL']
-
-    def RADecHTML(planet):
-        return '<a href="'+simbadURL(planet)+'">'+RA(planet).split('.')[0]+'<br />'+dec(planet).split('.')[0]+'</a>'
-
-    def constellation(planet):
-        return exoplanetDB[planet]['Constellation']
-
-    def orbitReference(planet):
-        return exoplanetDB[planet]['TRANSITURL']
-
-    def orbitReferenceYear(planet):
-        '''ORBREF returns the citation in the format "<first author> <year>", so parse and return just the year'''
-        return exoplanetDB[planet]['ORBREF'].split()[1]
-
-    def nameWithLink(planet):
-        return '<a href="'+orbitReference(planet)+'">'+planet+'</a>'
-
-    def mass(planet):
-        if exoplanetDB[planet]['MASS'] == '': return '---'
-        else: return trunc(float(exoplanetDB[planet]['MASS']),2)
-
-    def semimajorAxis(planet):
-        #return trunc(0.004649*float(exoplanetDB[planet]['AR'])*float(exoplanetDB[planet]['RSTAR']),3)   ## Convert from solar radii to AU
-        return trunc(float(exoplanetDB[planet]['SEP']),3)
-
-    def radius(planet):
-        if exoplanetDB[planet]['R'] == '': return '---'
-        else: return trunc(float(exoplanetDB[planet]['R']),2) ## Convert from solar radii to Jupiter radii
-
-    def midTransit(Tc, P, start, end):
-        '''Calculate mid-transits between Julian Dates start and end, using a 2500 
-            orbital phase kernel since T_c (for 2 day period, 2500 phases is 14 years)
-            '''
-        Nepochs = np.arange(0,2500,dtype=np.float64)
-        transitTimes = Tc + P*Nepochs
-        transitTimesInSem = transitTimes[(transitTimes < end)*(transitTimes > start)]
-        return transitTimesInSem
-
-    def midEclipse(Tc, P, start, end):
-        '''Calculate mid-eclipses between Julian Dates start and end, using a 2500 
-            orbital phase kernel since T_c (for 2 day period, 2500 phases is 14 years)
-            '''
-        Nepochs = np.arange(0,2500,dtype=np.float64)
-        transitTimes = Tc + P*(0.5 + Nepochs)
-        transitTimesInSem = transitTimes[(transitTimes < end)*(transitTimes > start)]
-        return transitTimesInSem
-
-    '''Choose which planets from the database to include in the search, 
-        assemble a list of them.'''
-    planets = []
-    for planet in exoplanetDB:
-        if bandMagnitude(planet) != 0.0 and depth(planet) != 0.0 and float(bandMagnitude(planet)) <= mag_limit and \
-           float(depth(planet)) >= depth_limit and transitBool(planet):
-            planets.append(planet)
-
-    if calcTransits: transits = {}
-    if calcEclipses: eclipses = {}
-    for day in np.arange(startSem,endSem+1):
-        if calcTransits: transits[str(day)] = []
-        if calcEclipses: eclipses[str(day)] = []
-    planetsNeverUp = []
-
-
-    def azToDirection(az):
-        az = float(az)
-        if (az >= 0 and az < 22.5) or (az >= 337.5 and az < 360): return 'N'
-        elif az >= 22.5 and az < 67.5:  return 'NE'
-        elif az >= 67.5 and az < 112.5:  return 'E'
-        elif az >= 112.5 and az < 157.5:  return 'SE'
-        elif az >= 157.5 and az < 202.5:  return 'S'
-        elif az >= 202.5 and az < 247.5:  return 'SW'
-        elif az >= 247.5 and az < 292.5:  return 'W'	
-        elif az >= 292.5 and az < 337.5:  return 'NW'
-
-    def ingressEgressAltAz(planet,observatory,ingress,egress):
-        altitudes = []
-        directions = []
-        for time in [ingress,egress]:
-            observatory.date = list2datestr(jd2gd(time))
-            star = ephem.FixedBody()
-            star._ra = ephem.hours(RA(planet))
-            star._dec = ephem.degrees(dec(planet))
-            star.compute(observatory)
-            altitudes.append(str(ephem.degrees(star.alt)).split(":")[0])
-            directions.append(azToDirection(str(ephem.degrees(star.az)).split(":")[0]))
-        ingressAlt,egressAlt = altitudes
-        ingressDir,egressDir = directions
-        return ingressAlt,ingressDir,egressAlt,egressDir
-
-    def aboveHorizonForEvent(planet,observatory,ingress,egress):
-        altitudes = []
-        for time in [ingress,egress]:
-            observatory.date = list2datestr(jd2gd(time))
-            star = ephem.FixedBody()
-            star._ra = ephem.hours(RA(planet))
-            star._dec = ephem.degrees(dec(planet))
-            star.compute(observatory)
-            #altitudes.append(str(ephem.degrees(star.alt)).split(":")[0])
-            altitudes.append(float(repr(star.alt))/(2*np.pi) * 360)	## Convert altitudes to degrees
-        #if altitudes[0] > 0 and altitudes[1] > 0: return True
-        if altitudes[0] > float(ephem.degrees(observatory_minHorizon))*(180/np.pi) and altitudes[1] > float(ephem.degrees(observatory_minHorizon))*(180/np.pi): return True
-        else: return False
-
-    def eventAfterTwilight(planet,observatory,ingress,egress,twilightType):
-        altitudes = []
-        for time in [ingress,egress]:
-            observatory.date = list2datestr(jd2gd(time))
-            sun = ephem.Sun()
-            sun.compute(observatory)
-            altitudes.append(float(repr(sun.alt))/(2*np.pi) * 360)	## Convert altitudes to degrees
-        if altitudes[0] < float(twilightType) and altitudes[1] < float(twilightType): return True
-        else: return False
-
-    for planet in planets:		
-        '''Compute all of the coming transits and eclipses for a long time out'''
-        allTransitEpochs = midTransit(epoch(planet),period(planet),startSem,endSem)
-        allEclipseEpochs = midEclipse(epoch(planet),period(planet),startSem,endSem)
-        for day in np.arange(startSem,endSem+1,1.0):
-            try:
-                '''For each day, gather the transits and eclipses that happen'''
-                transitEpochs = allTransitEpochs[(allTransitEpochs <= day+0.5)*(allTransitEpochs > day-0.5)]
-                eclipseEpochs = allEclipseEpochs[(allEclipseEpochs <= day+0.5)*(allEclipseEpochs > day-0.5)]
-                if calcTransits and len(transitEpochs) != 0:
-                    transitEpoch = transitEpochs[0]
-                    ingress = transitEpoch-duration(planet)/2
-                    egress = transitEpoch+duration(planet)/2
-                    
-                    ''' Calculate positions of host stars'''
-                    star = ephem.FixedBody()
-                    star._ra = ephem.hours(RA(planet))
-                    star._dec = ephem.degrees(dec(planet))
-                    star.compute(observatory)
-                    exoplanetDB[planet]['Constellation'] = ephem.constellation(star)[0]
-                    
-                    '''If star is above horizon and sun is below horizon during transit/eclipse:'''		
-                    if aboveHorizonForEvent(planet,observatory,ingress,egress) and eventAfterTwilight(planet,observatory,ingress,egress,twilightType):
-                        ingressAlt,ingressDir,egressAlt,egressDir = ingressEgressAltAz(planet,observatory,ingress,egress)
-                        transitInfo = [planet,transitEpoch,duration(planet)/2,'transit',ingressAlt,ingressDir,egressAlt,egressDir]
-                        transits[str(day)].append(transitInfo)		
-                if calcEclipses and len(eclipseEpochs) != 0:
-                    eclipseEpoch = eclipseEpochs[0]
-                    ingress = eclipseEpoch-duration(planet)/2
-                    egress = eclipseEpoch+duration(planet)/2
-                    
-                    ''' Calculate positions of host stars'''
-                    star = ephem.FixedBody()
-                    star._ra = ephem.hours(RA(planet))
-                    star._dec = ephem.degrees(dec(planet))
-                    star.compute(observatory)
-                    exoplanetDB[planet]['Constellation'] = ephem.constellation(star)[0]
-                    
-                    if aboveHorizonForEvent(planet,observatory,ingress,egress) and eventAfterTwilight(planet,observatory,ingress,egress,twilightType):
-                        ingressAlt,ingressDir,egressAlt,egressDir = ingressEgressAltAz(planet,observatory,ingress,egress)
-                        eclipseInfo = [planet,eclipseEpoch,duration(planet)/2,'eclipse',ingressAlt,ingressDir,egressAlt,egressDir]
-                        eclipses[str(day)].append(eclipseInfo)	
-            
-            except ephem.NeverUpError:
-                if str(planet) not in planetsNeverUp:
-                    print 'Note: planet %s is never above the horizon at this observing location.' % (planet)
-                    planetsNeverUp.append(str(planet))
-
-    def removeEmptySets(dictionary):
-        '''Remove days where there were no transits/eclipses from the transit/eclipse list dictionary. 
-            Can't iterate through the transits dictionary with a for loop because it would change length 
-            as keys get deleted, so loop through with while loop until all entries are not empty sets'''
-        dayCounter = startSem
-        while any(dictionary[day] == [] for day in dictionary):	
-            if dictionary[str(dayCounter)] == []:
-                del dictionary[str(dayCounter)]
-            dayCounter += 1
-
-    if calcTransits: removeEmptySets(transits)
-    if calcEclipses: removeEmptySets(eclipses)
-
-    events = {}
-    def mergeDictionaries(dict):
-        for key in dict:
-            if any(key == eventKey for eventKey in events) == False:	## If key does not exist in events,
-                if np.shape(dict[key])[0] == 1:	## If new event is the only one on that night, add only it
-                    events[key] = [dict[key][0]]
-                else:			## If there were multiple events that night, add them each
-                    events[key] = []
-                    for event in dict[key]:
-                        events[key].append(event)
-            else:
-                if np.shape(dict[key])[0] > 1: ## If there are multiple entries to append,
-                    for event in dict[key]:
-                        events[key].append(event)
-                else:							## If there is only one to add,
-                    events[key].append(dict[key][0])
-    if calcTransits: mergeDictionaries(transits)
-    if calcEclipses: mergeDictionaries(eclipses)
-
-    if textOut: 
-        allKeys = events.keys()
-        allKeys = np.array(allKeys)[np.argsort(allKeys)]
-        #report = open(os.path.join(os.path.dirname(oscaar.__file__),'extras','eph','ephOutputs','eventReport.csv'),'w')
-        report = open(os.path.join(os.path.abspath(rootdir),'eventReport.csv'),'w')
-        firstLine = 'Planet,Event,Ingress Date, Ingress Time (UT) ,Altitude at Ingress,Azimuth at Ingress,Egress Date, Egress Time (UT) ,Altitude at Egress,Azimuth at Egress,V mag,Depth,Duration,RA,Dec,Const.,Mass,Semimajor Axis (AU),Radius (R_J)\n'
-        report.write(firstLine)
-        
-        for key in allKeys:
-            def writeCSVtransit():
-                middle = ','.join([planet[0],str(planet[3]),list2datestrCSV(jd2gd(float(planet[1]-planet[2]))),planet[4],planet[5],\
-                                   list2datestrCSV(jd2gd(float(planet[1]+planet[2]))),planet[6],planet[7],trunc(bandMagnitude(str(planet[0])),2),\
-                                   trunc(depth(planet[0]),4),trunc(24.0*duration(planet[0]),2),RA(planet[0]),dec(planet[0]),constellation(planet[0]),\
-                                   mass(planet[0]),semimajorAxis(planet[0]),radius(planet[0])])
-                line = middle+'\n'
-                report.write(line)
-            
-            def writeCSVeclipse():
-                middle = ','.join([planet[0],str(planet[3]),list2datestrCSV(jd2gd(float(planet[1]-planet[2]))),planet[4],planet[5],\
-                                   list2datestrCSV(jd2gd(float(planet[1]+planet[2]))),planet[6],planet[7],trunc(bandMagnitude(str(planet[0])),2),\
-                                   trunc(depth(planet[0]),4),trunc(24.0*duration(planet[0]),2),RA(planet[0]),dec(planet[0]),constellation(planet[0]),\
-                                   mass(planet[0]),semimajorAxis(planet[0]),radius(planet[0])])
-                line = middle+'\n'
-                report.write(line)
-            
-            if np.shape(events[key])[0] > 1:
-                elapsedTime = []
-                
-                for i in range(1,len(events[key])):
-                    nextPlanet = events[key][1]
-                    planet = events[key][0]
-                    double = False
-                    '''If the other planet's ingress is before this one's egress, then'''
-                    if ephem.Date(list2datestr(jd2gd(float(nextPlanet[1]-nextPlanet[2])))) -\
-                        ephem.Date(list2datestr(jd2gd(float(planet[1]+planet[2])))) > 0.0:
-                            double = True
-                            elapsedTime.append(ephem.Date(list2datestr(jd2gd(float(nextPlanet[1]-nextPlanet[2])))) - \
-                                               ephem.Date(list2datestr(jd2gd(float(planet[1]+planet[2])))))
-                    
-                    if ephem.Date(list2datestr(jd2gd(float(planet[1]-planet[2])))) - \
-                        ephem.Date(list2datestr(jd2gd(float(nextPlanet[1]+nextPlanet[2])))) > 0.0:
-                            '''If the other planet's egress is before this one's ingress, then'''
-                            double = True
-                            elapsedTime.append(ephem.Date(list2datestr(jd2gd(float(planet[1]-planet[2])))) - \
-                                               ephem.Date(list2datestr(jd2gd(float(nextPlanet[1]+nextPlanet[2])))))
-                
-                for planet in events[key]:
-                    if calcTransits and planet[3] == 'transit':
-                        writeCSVtransit()
-                    if calcEclipses and planet[3] == 'eclipse':
-                        writeCSVeclipse()		  
-            
-            elif np.shape(events[key])[0] == 1:
-                planet = events[key][0]
-                if calcTransits and planet[3] == 'transit':
-                    writeCSVtransit()
-                if calcEclipses and planet[3] == 'eclipse':
-                    writeCSVeclipse()
-        # report.write('\n')
-        
-        report.close()
-    #print exoplanetDB['HD 209458 b']
+    site = (observatory_latitude,observatory_longitude,observatory_elevation,observatory_temperature,observatory_minHorizon)
+    observatory = makeObserver(*site)
+
+    '''Choose which planets from the database to include in the search with 
+        a single boolean mask over the catalog columns.'''
+    with stage('selection'):
+        if selection is None:
+            selected = selectTargets(exoplanetDB,band,mag_limit,depth_limit)
+        else:
+            selected = np.array(selection,dtype=bool)
+    count('planets considered',len(selected))
+    count('planets kept',selected.sum())
+
+    '''Drop the stars that never clear the horizon limit at this site'''
+    with stage('prefilter'):
+        selected[selected] = risesAboveHorizon(exoplanetDB['DEC_RAD'][selected],site,startSem,endSem)
+    count('planets above horizon limit',selected.sum())
+
+    '''Enumerate the candidate transits and eclipses of all selected planets, or pick 
+        this site's targets and dates out of the candidates shared by several sites'''
+    selectedRows = np.flatnonzero(selected)
+    with stage('candidates'):
+        if candidates is None:
+            planetIndices, midEvents, eventTypes = candidateEvents(exoplanetDB['TT'][selectedRows],exoplanetDB['PER'][selectedRows],
+                                                                   startSem,endSem,calcTransits,calcEclipses)
+            eventRows = selectedRows[planetIndices]
+        else:
+            eventRows, midEvents, eventTypes = candidates
+            wanted = selected[eventRows]*(midEvents > startSem)*(midEvents < endSem)*\
+                     (((eventTypes == 'transit')*calcTransits) + ((eventTypes == 'eclipse')*calcEclipses))
+            eventRows, midEvents, eventTypes = eventRows[wanted], midEvents[wanted], eventTypes[wanted]
+    count('events generated',len(midEvents))
+
+    with stage('twilight'):
+        if nightTable is None: nightTable = cachedTwilightTable(observatory,startSem,endSem,float(twilightType),exodbPath)
+        dusk, dawn = nightTable
+
+    '''Skip the events that happen in daylight or while the star is below the horizon limit. 
+        With sampling, an event that must be observable throughout its baseline is tested 
+        at the ends of the baseline; one that may be partly observable is not prefiltered.'''
+    with stage('prefilter'):
+        if sampling and minFraction < 1:
+            possible = np.ones(len(midEvents),dtype=bool)
+        else:
+            possible = prefilterEvents(midEvents,np.nan_to_num(exoplanetDB['T14'][eventRows])/2 + sampling*baseline,
+                                       exoplanetDB['RA_RAD'][eventRows],exoplanetDB['DEC_RAD'][eventRows],site,dusk,dawn)
+    count('events prefiltered out',len(possible)-possible.sum())
+
+    '''Reuse the results of candidates evaluated by earlier runs, if the result cache is on'''
+    visible = np.zeros(len(midEvents),dtype=bool)
+    altitudes = np.zeros((len(midEvents),2))
+    azimuths = np.zeros((len(midEvents),2))
+    samples = np.zeros((len(midEvents),3)) if sampling else None
+    toCompute = possible
+    if resultCache:
+        with stage('result cache'):
+            cache = ResultCache(os.path.join(exodbPath,'cache'),siteKey(site,twilightType,altazBackend,parameters['tier_margin']),cacheNights)
+            keys = planetKeys(exoplanetDB,selectedRows)[np.searchsorted(selectedRows,eventRows)]
+            found = np.zeros(len(midEvents),dtype=bool)
+            found[possible], visible[possible], altitudes[possible], azimuths[possible] = \
+                cache.lookup(keys[possible],eventTypes[possible],midEvents[possible])
+            toCompute = possible*~found
+        count('results reused',found.sum())
+
+    '''Keep the events that are observable from this site, splitting the candidates 
+        into chunks evaluated in a pool of worker processes if requested'''
+    with stage('visibility',hot=True):
+        computeRows = eventRows[toCompute]
+        columns = [midEvents[toCompute],np.nan_to_num(exoplanetDB['T14'][computeRows])/2,exoplanetDB['RA_RAD'][computeRows],exoplanetDB['DEC_RAD'][computeRows]]
+        settings = (site,dusk,dawn,altazBackend)
+        if sampling:
+            settings += (baseline,sampleStep,minFraction)
+        else:
+            settings += (parameters['tier_margin'],)
+        test, testChunk = (sampledVisibleEvents,sampledVisibleEventsChunk) if sampling else (visibleEvents,visibleEventsChunk)
+        if workers > 1 and len(computeRows) > 1:
+            bounds = np.linspace(0,len(computeRows),min(4*workers,len(computeRows))+1).astype(int)
+            chunks = [tuple(column[first:last] for column in columns)+settings for first, last in zip(bounds[:-1],bounds[1:])]
+            pool = multiprocessing.Pool(workers)
+            results = pool.map(testChunk,chunks)
+            pool.close()
+            pool.join()
+            '''Merge the chunks in order, so the result is identical to the serial run'''
+            results = [np.concatenate(arrays) for arrays in zip(*results)]
+        else:
+            results = test(*(tuple(columns)+settings))
+        visible[toCompute], altitudes[toCompute], azimuths[toCompute], refined = results[:4]
+        if sampling:
+            samples[toCompute] = results[4]
+    count('visibility checks',len(computeRows))
+    if altazBackend == 'ephem' and not sampling:
+        count('ephem compute calls',2*len(computeRows))   ## One FixedBody.compute at ingress and one at egress
+    if altazBackend == 'tiered':
+        count('events decided by the coarse screen',len(refined)-refined.sum())
+        count('events refined with PyEphem',refined.sum())
+        if diagnostics is not None:
+            for name, number in [('events decided by the coarse screen',len(refined)-refined.sum()),
+                                 ('events refined with PyEphem',refined.sum())]:
+                diagnostics[name] = diagnostics.get(name,0) + int(number)
+        print 'Two-tier visibility: %i of %i candidate events decided by the coarse screen, %i refined with PyEphem' % \
+              (len(refined)-refined.sum(),len(refined),refined.sum())
+    if resultCache:
+        with stage('result cache'):
+            cache.store(keys[toCompute],eventTypes[toCompute],midEvents[toCompute],*results[:3])
+            cache.save()
+        print 'Result cache: reused %i of %i candidate events' % (found.sum(),possible.sum())
+
+    '''Drop the observable events spoiled by the Moon, testing each event at five times from 
+        the start to the end of its window against an hourly table of the Moon'''
+    if moonLimits:
+        with stage('moon'):
+            moonRows = np.flatnonzero(visible)
+            halfWindows = np.nan_to_num(exoplanetDB['T14'][eventRows[moonRows]])/2 + sampling*baseline
+            allowed = eventMoonConstraint(observatory,exoplanetDB['RA_RAD'][eventRows[moonRows]],exoplanetDB['DEC_RAD'][eventRows[moonRows]],
+                                          midEvents[moonRows],halfWindows,parameters['moon_min_separation'],
+                                          parameters['moon_max_illumination'],parameters['moon_max_altitude'])
+            visible[moonRows] = allowed
+        count('events spoiled by the Moon',len(allowed)-allowed.sum())
+    eventRows, midEvents, eventTypes = eventRows[visible], midEvents[visible], eventTypes[visible]
+    altitudes, azimuths = altitudes[visible], azimuths[visible]
+    if sampling:
+        samples = samples[visible]
+    count('events visible',len(midEvents))
+    return eventRows, midEvents, eventTypes, altitudes, azimuths, samples
+
+def eventTable(parameters, exoplanetDB, candidates=None, nightTable=None, diagnostics=None):
+    '''
+    The observable events for the parameters of a .par file with their 
+    overlaps and the best schedule of each night. The catalog is only read.
+
+    Parameters
+    ----------
+    parameters, exoplanetDB, candidates, nightTable, diagnostics :
+        As for `observableEvents`
+    Returns
+    -------
+    events : structured array
+        The events in order of ingress time, with the fields of 
+        `eventStream.Event`, see `eventStream.eventArray`
+    '''
+    return scheduledEvents(parameters,exoplanetDB,*observableEvents(parameters,exoplanetDB,candidates,nightTable,
+                                                                          diagnostics=diagnostics))
+
+def scheduledEvents(parameters, exoplanetDB, eventRows, midEvents, eventTypes, altitudes, azimuths, samples):
+    '''
+    The events returned by `observableEvents` with their overlaps and the best 
+    schedule of each night, as a structured array, see `eventTable`
+    '''
+
+    '''Find the events that overlap each other, and the best schedule of each night'''
+    halfDurations = np.nan_to_num(exoplanetDB['T14'][eventRows])/2
+    with stage('schedule'):
+        weights = eventWeights(exoplanetDB,eventRows,eventTypes,bandColumnName(parameters['band']),parameters['schedule_weight'])
+        conflicts, scheduled = observingSchedule(midEvents-halfDurations,midEvents+halfDurations,weights)
+    count('events scheduled',scheduled.sum())
+    return eventArray(exoplanetDB['NAME'],eventRows,midEvents,eventTypes,halfDurations,altitudes,azimuths,conflicts,scheduled,samples)
+
+def openSinks(parameters, exoplanetDB, reportName='eventReport'):
+    '''
+    The report writers (see reportSinks.py) requested by the parameters of a 
+    .par file, writing to rootdir/<reportName>.csv, .html, _columns and _index
+    '''
+    bandColumn = bandColumnName(parameters['band'])
+    if parameters['html_format'] not in ['table','paged']:
+        raise ValueError("Unknown html_format '%s', expected table or paged" % parameters['html_format'])
+    with stage('reports'):
+        fields = ReportFields(exoplanetDB,bandColumn)
+        sinks = []
+        if parameters['text_out']:
+            #report = open(os.path.join(os.path.dirname(oscaar.__file__),'extras','eph','ephOutputs','eventReport.csv'),'w')
+            sinks.append(CSVSink(os.path.join(os.path.abspath(rootdir),reportName+'.csv'),fields,parameters['sampling']))
+        if parameters['html_out'] and parameters['html_format'] == 'paged':
+            sinks.append(PagedHTMLSink(os.path.join(os.path.abspath(rootdir),reportName+'.html'),fields,parameters['name'],parameters['band'],
+                                       parameters['start_date'],parameters['end_date'],parameters['show_lt'],parameters['timezone'],
+                                       parameters['sampling'],parameters['html_split'],localNoonOffset(parameters['longitude']),
+                                       parameters['html_gzip']))
+        elif parameters['html_out']:
+            sinks.append(HTMLSink(os.path.join(os.path.abspath(rootdir),reportName+'.html'),fields,parameters['name'],parameters['band'],
+                                  parameters['start_date'],parameters['end_date'],parameters['show_lt'],parameters['timezone'],
+                                  parameters['sampling']))
+        if parameters['binary_out']:
+            sinks.append(ColumnSink(os.path.join(os.path.abspath(rootdir),reportName+'_columns'),fields,parameters['name'],parameters['band'],
+                                    parameters['start_date'],parameters['end_date'],parameters['sampling']))
+        if parameters['event_index']:
+            sinks.append(IndexSink(os.path.join(os.path.abspath(rootdir),reportName+'_index'),parameters['start_date'],
+                                   parameters['end_date'],indexSettings(parameters)))
+    return sinks
+
+def writeEphemerides(parameters, exoplanetDB=None, candidates=None, reportName='eventReport'):
+    '''
+    Calculate the observable events for the parameters of a .par file, as 
+    returned by `readParFile`, and write the reports. See `calculateEphemerides`.
+    '''
+    #from oscaar.extras.knownSystemParameters import getLatestParams
+    if exoplanetDB is None: exoplanetDB = downloadAndCompile(parameters['catalog_url'],parameters['catalog_max_age'])
+    sinks = openSinks(parameters,exoplanetDB,reportName)
+
+    '''Compute the window in chunks if chunk_days is set, appending the events of each 
+        chunk to the reports before the next is computed, so only one chunk is in memory'''
+    chunks = windowChunks(parameters)
+    diagnostics = {}    ## Summed over the chunks, and noted in the reports
+    for chunkNumber, chunkParameters in enumerate(chunks):
+        if len(chunks) > 1:
+            print 'Chunk %i of %i: %s - %s' % (chunkNumber+1,len(chunks),datestrings([chunkParameters['start_date']])[0],
+                                               datestrings([chunkParameters['end_date']])[0])
+        events = eventTable(chunkParameters,exoplanetDB,candidates,diagnostics=diagnostics)
+
+        '''Stream the observable events in order of ingress time to the report writers, 
+            which convert and write them in batches'''
+        with stage('reports',hot=True):
+            writeReports(arrayStream(events),sinks,close=False)
+    with stage('reports'):
+        for sink in sinks:
+            sink.summarize(diagnostics)
+            sink.close()
     print 'calculateEphemerides.py: Done'
 
+def sweepEphemerides(parameters, exoplanetDB=None, reportName='eventReport'):
+    '''
+    Find the observable events of every point of a grid of selection and 
+    visibility limits with one computation, see parameterSweep.py. The events 
+    are computed once at the loosest limits of the grid, and the events of 
+    each point are masked out of them. The number of events at each point is 
+    printed and saved to rootdir/<reportName>_sweep.csv; with sweep_reports, 
+    each point also gets its reports, rootdir/<reportName>_sweep<N>.csv/.html.
 
-    if htmlOut: 
-        '''Write out a text report with the transits/eclipses. Write out the time of 
-            ingress, egress, whether event is transit/eclipse, elapsed in time between
-            ingress/egress of the temporally isolated events'''
-        report = open(os.path.join(os.path.abspath(rootdir),'eventReport.html'),'w')
-        allKeys = events.keys()
-        ## http://www.kryogenix.org/code/browser/sorttable/
-        htmlheader = '\n'.join([
-                                '<!doctype html>',\
-                                '<html>',\
-                                '	<head>',\
-                                '		<meta http-equiv="content-type" content="text/html; charset=UTF-8" />',\
-                                '		<title>Ephemeris</title>',\
-                                '		<link rel="stylesheet" href="stylesheetEphem.css" type="text/css" />',\
-                                '		 <script type="text/javascript">',\
-                                '		  function changeCSS(cssFile, cssLinkIndex) {',\
-                                '			var oldlink = document.getElementsByTagName("link").item(cssLinkIndex);',\
-                                '			var newlink = document.createElement("link")',\
-                                '			newlink.setAttribute("rel", "stylesheet");',\
-                                '			newlink.setAttribute("type", "text/css");',\
-                                '			newlink.setAttribute("href", cssFile);',\
-                                
-                                '			document.getElementsByTagName("head").item(0).replaceChild(newlink, oldlink);',\
-                                '		  }',\
-                                '		</script>',\
-                                '	   <script src="./sorttable.js"></script>',\
-                                '	</head>',\
-                                '	<body>',\
-                                '		<div id="textDiv">',\
-                                '		<h1>Ephemerides for: '+observatory_name+'</h1>',\
-                                '		<h2>Observing dates (UT): '+list2datestr(jd2gd(startSem)).split(' ')[0]+' - '+list2datestr(jd2gd(endSem)).split(' ')[0]+'</h2>'
-                                '	   Click the column headers to sort. ',\
-                                '		<table class="daynight" id="eph">',\
-                                '		<tr><th colspan=2>Toggle Color Scheme</th></tr>',\
-                                '		<tr><td><a href="#" onclick="changeCSS(\'stylesheetEphem.css\', 0);">Day</a></td><td><a href="#" onclick="changeCSS(\'stylesheetEphemDark.css\', 0);">Night</a></td></tr>',\
-                                '		</table>'])
-        
-        if show_lt == 0:
-            tableheader = '\n'.join([
-                                     '\n		<table class="sortable" id="eph">',\
-                                     '		<tr> <th>Planet<br /><span class="small">[Link: Orbit ref.]</span></th>	  <th>Event<br /><span class="small">[Transit/<br />Eclipse]</span></th>	<th>Ingress <br /><span class="small">(MM/DD<br />HH:MM, UT)</span></th> <th>Egress <br /><span class="small">(MM/DD<br />HH:MM, (UT), Alt., Dir.)</span></th>'+\
-                                     '<th>'+band.upper()+'</th> <th>Depth<br />(mag)</th> <th>Duration<br />(hrs)</th> <th>RA/Dec<br /><span class="small">[Link: Simbad ref.]</span></th> <th>Const.</th> <th>Mass<br />(M<sub>J</sub>)</th>'+\
-                                     '<th>Radius<br />(R<sub>J</sub>)</th> <th>Ref. Year</th></tr>'])
-        else:
-            tableheader = '\n'.join([
-                                     '\n        <table class="sortable" id="eph">',\
-                                     '        <tr> <th>Planet<br /><span class="small">[Link: Orbit ref.]</span></th>      <th>Event<br /><span class="small">[Transit/<br />Eclipse]</span></th> <th>Ingress <br /><span class="small">(MM/DD<br />HH:MM (LT), Alt., Dir.)</span></th> <th>Egress <br /><span class="small">(MM/DD<br />HH:MM (LT), Alt., Dir.)</span></th>   '+\
-                                     '<th>'+band.upper()+'</th> <th>Depth<br />(mag)</th> <th>Duration<br />(hrs)</th> <th>RA/Dec<br /><span class="small">[Link: Simbad ref.]</span></th> <th>Const.</th> <th>Mass<br />(M<sub>J</sub>)</th>'+\
-                                     ' <th>Radius<br />(R<sub>J</sub>)</th> <th>Ref. Year</th> <th>Ingress <br /><span class="small">(MM/DD<br />HH:MM (UT))</span></th> <th>Egress <br /><span class="small">(MM/DD<br />HH:MM, (UT))</span></th></tr>'])
-    
-        
-        tablefooter = '\n'.join([
-                                 '\n		</table>',\
-                                 '		<br /><br />',])
-        htmlfooter = '\n'.join([
-                                '\n		<p class="headinfo">',\
-                                '		Developed by Brett Morris with great gratitude for the help of <a href="http://rhodesmill.org/pyephem/">PyEphem</a>,<br/>',\
-                                '		and for up-to-date exoplanet parameters from <a href="http://www.exoplanets.org/">exoplanets.org</a> (<a href="http://adsabs.harvard.edu/abs/2011PASP..123..412W">Wright et al. 2011</a>).<br />',\
-                                '		</p>',\
-                                '		</div>',\
-                                '	</body>',\
-                                '</html>'])
-        report.write(htmlheader)
-        report.write(tableheader)
-        
-        allKeys = np.array(allKeys)[np.argsort(allKeys)]
-        for key in allKeys:
-            def writeHTMLtransit():
-                indentation = '		'
-                if show_lt != 0: 
-                    middle = '</td><td>'.join([nameWithLink(planet[0]),str(planet[3]),list2datestrHTML_LT(jd2gd(float(planet[1]-planet[2])),planet[4],planet[5]),\
-                                               list2datestrHTML_LT(jd2gd(float(planet[1]+planet[2])),planet[6],planet[7]),trunc(bandMagnitude(str(planet[0])),2),\
-                                               trunc(depth(planet[0]),4),trunc(24.0*duration(planet[0]),2),RADecHTML(planet[0]),constellation(planet[0]),\
-                                               mass(planet[0]),radius(planet[0]),orbitReferenceYear(planet[0]),list2datestrHTML_UTnoaltdir(jd2gd(float(planet[1]-planet[2])),planet[4],planet[5]),\
-                                               list2datestrHTML_UTnoaltdir(jd2gd(float(planet[1]+planet[2])),planet[6],planet[7])])
-                else:
-                    middle = '</td><td>'.join([nameWithLink(planet[0]),str(planet[3]),list2datestrHTML(jd2gd(float(planet[1]-planet[2])),planet[4],planet[5]),\
-                                               list2datestrHTML(jd2gd(float(planet[1]+planet[2])),planet[6],planet[7]),trunc(bandMagnitude(str(planet[0])),2),\
-                                               trunc(depth(planet[0]),4),trunc(24.0*duration(planet[0]),2),RADecHTML(planet[0]),constellation(planet[0]),\
-                                               mass(planet[0]),radius(planet[0]),orbitReferenceYear(planet[0])])
-                line = indentation+'<tr><td>'+middle+'</td></tr>\n'
-                report.write(line)
-            
-            def writeHTMLeclipse():
-                indentation = '		'
-                if show_lt != 0:
-                    middle = '</td><td>'.join([nameWithLink(planet[0]),str(planet[3]),list2datestrHTML_LT(jd2gd(float(planet[1]-planet[2])),planet[4],planet[5]),\
-                                               list2datestrHTML_LT(jd2gd(float(planet[1]+planet[2])),planet[6],planet[7]),trunc(bandMagnitude(str(planet[0])),2),\
-                                               '---',trunc(24.0*duration(planet[0]),2),RADecHTML(planet[0]),constellation(planet[0]),\
-                                               mass(planet[0]),radius(planet[0]),orbitReferenceYear(planet[0]),list2datestrHTML_UTnoaltdir(jd2gd(float(planet[1]-planet[2])),planet[4],planet[5]),\
-                                               list2datestrHTML_UTnoaltdir(jd2gd(float(planet[1]+planet[2])),planet[6],planet[7])])
-                else: 
-                    middle = '</td><td>'.join([nameWithLink(planet[0]),str(planet[3]),list2datestrHTML(jd2gd(float(planet[1]-planet[2])),planet[4],planet[5]),\
-                                               list2datestrHTML(jd2gd(float(planet[1]+planet[2])),planet[6],planet[7]),trunc(bandMagnitude(str(planet[0])),2),\
-                                               '---',trunc(24.0*duration(planet[0]),2),RADecHTML(planet[0]),constellation(planet[0]),\
-                                               mass(planet[0]),radius(planet[0]),orbitReferenceYear(planet[0])])
-
-                line = indentation+'<tr><td>'+middle+'</td></tr>\n'
-                report.write(line)
-            
-            
-            if np.shape(events[key])[0] > 1:
-                elapsedTime = []
-                
-                for i in range(1,len(events[key])):
-                    nextPlanet = events[key][1]
-                    planet = events[key][0]
-                    double = False
-                    '''If the other planet's ingress is before this one's egress, then'''
-                    if ephem.Date(list2datestr(jd2gd(float(nextPlanet[1]-nextPlanet[2])))) -\
-                        ephem.Date(list2datestr(jd2gd(float(planet[1]+planet[2])))) > 0.0:
-                            double = True
-                            elapsedTime.append(ephem.Date(list2datestr(jd2gd(float(nextPlanet[1]-nextPlanet[2])))) - \
-                                               ephem.Date(list2datestr(jd2gd(float(planet[1]+planet[2])))))
-                    
-                    if ephem.Date(list2datestr(jd2gd(float(planet[1]-planet[2])))) - \
-                        ephem.Date(list2datestr(jd2gd(float(nextPlanet[1]+nextPlanet[2])))) > 0.0:
-                            '''If the other planet's egress is before this one's ingress, then'''
-                            double = True
-                            elapsedTime.append(ephem.Date(list2datestr(jd2gd(float(planet[1]-planet[2])))) - \
-                                               ephem.Date(list2datestr(jd2gd(float(nextPlanet[1]+nextPlanet[2])))))
-                
-                for planet in events[key]:
-                    if calcTransits and planet[3] == 'transit':
-                        writeHTMLtransit()
-                    if calcEclipses and planet[3] == 'eclipse':
-                        writeHTMLeclipse()		  
-            elif np.shape(events[key])[0] == 1:
-                planet = events[key][0]
-                if calcTransits and planet[3] == 'transit':
-                    writeHTMLtransit()
-                if calcEclipses and planet[3] == 'eclipse':
-                    writeHTMLeclipse()
-        report.write(tablefooter)
-        report.write(htmlfooter)
-        report.close()
-    #print exoplanetDB['HD 209458 b']
+        :INPUTS:
+        parameters   --   parameters of a .par file, as returned by `readParFile`, 
+                          with comma-separated lists of values in any of sweep_band, 
+                          sweep_mag_limit, sweep_depth_limit, sweep_min_horizon 
+                          and sweep_twilight
+        exoplanetDB  --   compiled catalog from `downloadAndCompile`, loaded if not given
+        reportName   --   file name, without extension, of the files written to rootdir
+        '''
+    if parameters['sampling'] or parameters['altaz_backend'] == 'tiered':
+        raise ValueError('Parameter sweeps test the ingress and egress altitudes of each event, and cannot be used '
+                         'with sampling or altaz_backend: tiered')
+    if exoplanetDB is None: exoplanetDB = downloadAndCompile(parameters['catalog_url'],parameters['catalog_max_age'])
+    grid = sweepGrid(parameters)
+    loosest = dict(parameters)
+    loosest.update(loosestLimits(grid))
+    loosest['chunk_days'] = 0.0
+    print 'Parameter sweep: %i configurations, evaluated at mag_limit %g, depth_limit %g, min_horizon %s, twilight %s' % \
+          (len(grid),loosest['mag_limit'],loosest['depth_limit'],loosest['min_horizon'],loosest['twilight'])
+
+    '''Evaluate the union of the targets of every band once, at the loosest limits'''
+    with stage('selection'):
+        selection = np.zeros(len(exoplanetDB),dtype=bool)
+        for band in sorted(set(point['band'] for point in grid)):
+            selection += selectTargets(exoplanetDB,band,loosest['mag_limit'],loosest['depth_limit'])
+    eventRows, midEvents, eventTypes, altitudes, azimuths, samples = observableEvents(loosest,exoplanetDB,selection=selection)
+
+    '''Test the ingress and egress of each event against the night table of each twilight 
+        altitude of the grid'''
+    with stage('twilight'):
+        observatory = makeObserver(parameters['latitude'],parameters['longitude'],parameters['elevation'],
+                                   parameters['temperature'],loosest['min_horizon'])
+        halfDurations = np.nan_to_num(exoplanetDB['T14'][eventRows])/2
+        ingressEgress = np.column_stack([midEvents-halfDurations,midEvents+halfDurations])
+        darkness = {}
+        for twilight in set(float(point['twilight']) for point in grid):
+            dusk, dawn = cachedTwilightTable(observatory,parameters['start_date'],parameters['end_date'],twilight,exodbPath)
+            darkness[twilight] = np.all(duringNight(dusk,dawn,ingressEgress),axis=1)
+
+    '''Mask out the events of each point of the grid'''
+    table = SweepTable(exoplanetDB,eventRows,altitudes,darkness)
+    counts = []
+    for number, point in enumerate(grid):
+        with stage('sweep'):
+            mask = table.mask(bandColumnName(point['band']),point['mag_limit'],point['depth_limit'],point['min_horizon'],point['twilight'])
+            counts.append((mask.sum(),(mask*(eventTypes == 'transit')).sum(),(mask*(eventTypes == 'eclipse')).sum(),
+                           len(np.unique(eventRows[mask]))))
+        if parameters['sweep_reports']:
+            pointParameters = dict(parameters)
+            pointParameters.update(point)
+            events = scheduledEvents(pointParameters,exoplanetDB,eventRows[mask],midEvents[mask],eventTypes[mask],
+                                     altitudes[mask],azimuths[mask],None)
+            sinks = openSinks(pointParameters,exoplanetDB,'%s_sweep%i' % (reportName,number+1))
+            with stage('reports',hot=True):
+                writeReports(arrayStream(events),sinks)
+    count('sweep configurations',len(grid))
+
+    summaryPath = os.path.join(os.path.abspath(rootdir),reportName+'_sweep.csv')
+    writeSummary(summaryPath,grid,counts)
+    print '%5s %5s %9s %11s %11s %8s %8s %8s %8s %8s' % ('Sweep','Band','Mag limit','Depth limit','Min horizon','Twilight',
+                                                         'Events','Transits','Eclipses','Planets')
+    for number, (point, pointCounts) in enumerate(zip(grid,counts)):
+        print '%5i %5s %9g %11g %11s %8s %8i %8i %8i %8i' % ((number+1,point['band'],point['mag_limit'],point['depth_limit'],
+                                                              point['min_horizon'],point['twilight'])+pointCounts)
+    print 'Sweep summary written to '+summaryPath
+    print 'calculateEphemerides.py: Done'
 
+def batchEphemerides(parFiles):
+    '''
+    Calculate the ephemerides of several observatories, loading the catalog and 
+    enumerating the transits and eclipses of every target once for the union of 
+    all of the sites' targets and dates. Only the horizon and twilight tests are 
+    repeated for each site, and each site gets its own reports, named 
+    eventReport_<par file name>.csv/.html.
+
+        :INPUTS:
+        parFiles  --   paths to the parameter files of the observatories
+        '''
+    allParameters = [readParFile(parFile) for parFile in parFiles]
+    exoplanetDB = downloadAndCompile(allParameters[0]['catalog_url'],allParameters[0]['catalog_max_age'])
+
+    '''Share the candidate events of the whole window, unless a site is computed in chunks 
+        to bound the memory, in which case each chunk enumerates its own'''
+    candidates = None
+    if not any(parameters['chunk_days'] > 0 for parameters in allParameters):
+        unionSelected = np.zeros(len(exoplanetDB),dtype=bool)
+        for parameters in allParameters:
+            unionSelected += selectTargets(exoplanetDB,parameters['band'],parameters['mag_limit'],parameters['depth_limit'])
+        unionRows = np.flatnonzero(unionSelected)
+        planetIndices, midEvents, eventTypes = candidateEvents(exoplanetDB['TT'][unionRows],exoplanetDB['PER'][unionRows],
+                                                               min(parameters['start_date'] for parameters in allParameters),
+                                                               max(parameters['end_date'] for parameters in allParameters),
+                                                               any(parameters['calc_transits'] for parameters in allParameters),
+                                                               any(parameters['calc_eclipses'] for parameters in allParameters))
+        candidates = (unionRows[planetIndices],midEvents,eventTypes)
+
+    for parFile in parFiles:
+        print 'Calculating ephemerides for '+parFile+'...'
+        reportName = 'eventReport_'+os.path.splitext(os.path.basename(parFile))[0]
+        calculateEphemerides(parFile,exoplanetDB,candidates,reportName)
@@ -0,0 +1,135 @@
+'''
+Compiled, typed catalog of the exoplanets.org database.
+
+The CSV from exoplanets.org is parsed once into a NumPy structured array with
+one typed column per field, where empty numeric fields become NaN, host star
+coordinates are pre-parsed into radians and the constellation of each host is
+precomputed. The array is saved as a .npy file that is memory-mapped on
+load, so opening the catalog is near-instant and zero-copy. A small JSON file
+next to it records the size, modification time and SHA-1 hash of the CSV it
+was compiled from, so it is rebuilt only when the CSV content changes.
+'''
+import ephem	 ## PyEphem module
+import numpy as np
+import csv
+import hashlib
+import json
+import os
+
+stringColumns = ['NAME','RA_STRING','DEC_STRING','SIMBADURL','TRANSITURL','ORBREF']
+floatColumns = ['PER','TT','T14','DEPTH','MASS','SEP','R']
+magnitudeColumns = ['B','V','I','J','H','KS']
+
+def fileHash(path, blockSize=2**20):
+    '''SHA-1 hex digest of the file at `path`, read in blocks'''
+    sha = hashlib.sha1()
+    inputFile = open(path, 'rb')
+    block = inputFile.read(blockSize)
+    while block:
+        sha.update(block)
+        block = inputFile.read(blockSize)
+    inputFile.close()
+    return sha.hexdigest()
+
+def parseFloat(value):
+    '''Return a float from a catalog field, or NaN if the field is empty'''
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+def compileCatalog(csvPath, catalogPath):
+    '''
+    Parameters
+    ----------
+    csvPath : str
+        Path to the CSV database saved from exoplanets.org
+    catalogPath : str
+        Path of the .npy file to write the compiled catalog to
+    Returns
+    -------
+    catalog : structured array
+        One row per planet, with columns `stringColumns`, `floatColumns`, the
+        `magnitudeColumns` present in the CSV, TRANSIT (1, 0 or -1 if unknown),
+        RA_RAD and DEC_RAD (J2000, radians) and CONSTELLATION
+    '''
+    reader = csv.reader(open(csvPath, 'rb'))
+    labels = reader.next()
+    columnIndex = dict((label, i) for i, label in enumerate(labels))
+    bands = [band for band in magnitudeColumns if band in columnIndex]
+
+    '''Keep the last row for each planet name, as the old dictionary database did'''
+    rowsByName = {}
+    for row in reader:
+        if len(row) == len(labels):
+            rowsByName[row[columnIndex['NAME']]] = row
+    rows = [rowsByName[name] for name in sorted(rowsByName)]
+
+    def column(label):
+        if label in columnIndex: return [row[columnIndex[label]] for row in rows]
+        else: return ['']*len(rows)
+
+    strings = dict((label, column(label)) for label in stringColumns)
+    dtype = [(label, 'S%d' % max([1]+map(len, strings[label]))) for label in stringColumns]
+    dtype += [(label, np.float64) for label in floatColumns+bands]
+    dtype += [('TRANSIT', np.int8), ('RA_RAD', np.float64), ('DEC_RAD', np.float64), ('CONSTELLATION', 'S3')]
+    catalog = np.zeros(len(rows), dtype=dtype)
+
+    for label in stringColumns:
+        catalog[label] = strings[label]
+    for label in floatColumns+bands:
+        catalog[label] = map(parseFloat, column(label))
+    catalog['TRANSIT'] = [{'1': 1, '0': 0}.get(value, -1) for value in column('TRANSIT')]
+    for i in range(len(rows)):
+        try:
+            catalog['RA_RAD'][i] = float(ephem.hours(catalog['RA_STRING'][i]))
+            catalog['DEC_RAD'][i] = float(ephem.degrees(catalog['DEC_STRING'][i]))
+            catalog['CONSTELLATION'][i] = ephem.constellation((catalog['RA_RAD'][i], catalog['DEC_RAD'][i]))[0]
+        except ValueError:
+            catalog['RA_RAD'][i] = catalog['DEC_RAD'][i] = np.nan
+    unreadable = np.isnan(catalog['RA_RAD']).sum()
+    if unreadable:
+        print 'Warning: %i of %i planets have no readable RA/Dec in %s and are left out of the ephemerides' % \
+              (unreadable, len(rows), os.path.split(csvPath)[1])
+
+    '''Write to a temporary file and rename it into place, so processes that have the 
+        old catalog memory-mapped keep reading it intact'''
+    temporaryPath = '%s.%i.tmp' % (catalogPath, os.getpid())
+    output = open(temporaryPath, 'wb')
+    np.save(output, catalog)
+    output.close()
+    os.rename(temporaryPath, catalogPath)
+    return catalog
+
+def writeMeta(metaPath, meta):
+    '''Write the JSON file recording the CSV a catalog was compiled from, atomically'''
+    temporaryPath = '%s.%i.tmp' % (metaPath, os.getpid())
+    metaFile = open(temporaryPath, 'w')
+    json.dump(meta, metaFile)
+    metaFile.close()
+    os.rename(temporaryPath, metaPath)
+
+def loadCatalog(csvPath, catalogPath):
+    '''
+    Return the compiled catalog for the CSV at `csvPath`, memory-mapped from
+    `catalogPath`. The catalog is (re)compiled if it does not exist or if the
+    CSV's content hash differs from the one it was compiled from; a changed
+    modification time alone only triggers a re-hash.
+    '''
+    metaPath = os.path.splitext(catalogPath)[0]+'.json'
+    stat = os.stat(csvPath)
+    meta = None
+    if os.path.exists(catalogPath) and os.path.exists(metaPath):
+        metaFile = open(metaPath)
+        meta = json.load(metaFile)
+        metaFile.close()
+
+    if meta is not None and meta['size'] == stat.st_size and meta['mtime'] == stat.st_mtime:
+        return np.load(catalogPath, mmap_mode='r')
+
+    csvHash = fileHash(csvPath)
+    if meta is None or meta['sha1'] != csvHash:
+        print 'Compiling '+os.path.split(csvPath)[1]+', the CSV database from exoplanets.org...'
+        compileCatalog(csvPath, catalogPath)
+    writeMeta(metaPath, {'sha1': csvHash, 'size': stat.st_size, 'mtime': stat.st_mtime})
+    return np.load(catalogPath, mmap_mode='r')
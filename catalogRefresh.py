@@ -0,0 +1,164 @@
+'''
+Conditional, streamed and atomic refreshes of the exoplanets.org CSV database.
+
+A run never waits for a stale database: it uses the catalog compiled from the
+current CSV while a background thread asks the server for a newer copy. The
+request is conditional (If-None-Match/If-Modified-Since, from the ETag and
+Last-Modified headers of the previous download), so an unchanged database
+costs a "304 Not Modified". A new copy is streamed to a temporary file in
+blocks and renamed over the old CSV in one atomic step, and only if its
+content differs. The compiled catalog (see catalog.loadCatalog) is therefore
+rebuilt only when the content actually changed.
+
+The URL is configurable, so the refresh can be exercised against a local
+HTTP server.
+'''
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib2
+
+from catalog import fileHash
+
+defaultURL = 'http://www.exoplanets.org/csv-files/exoplanets.csv'
+
+_refreshThreads = {}
+_refreshLock = threading.Lock()
+
+def metadataPath(csvPath):
+    '''Path of the file recording the HTTP validators and time of the last check of `csvPath`'''
+    return os.path.splitext(csvPath)[0]+'_download.json'
+
+def readMetadata(csvPath):
+    '''HTTP validators and time of the last check of `csvPath`, or {} if unknown'''
+    path = metadataPath(csvPath)
+    if not os.path.exists(path):
+        return {}
+    metaFile = open(path)
+    try:
+        return json.load(metaFile)
+    except ValueError:
+        return {}
+    finally:
+        metaFile.close()
+
+def writeMetadata(csvPath, metadata):
+    '''Atomically replace the metadata of `csvPath`'''
+    path = metadataPath(csvPath)
+    metaFile = open(path+'.tmp', 'w')
+    json.dump(metadata, metaFile)
+    metaFile.close()
+    os.rename(path+'.tmp', path)
+
+def isStale(csvPath, maxAge=14.0):
+    '''
+    Parameters
+    ----------
+    csvPath : str
+        Path to the local CSV database
+    maxAge : float
+        Maximum age in days
+    Returns
+    -------
+    stale : bool
+        True if the database was last downloaded or confirmed up to date by
+        the server more than `maxAge` days ago
+    '''
+    lastChecked = readMetadata(csvPath).get('checked', os.path.getmtime(csvPath))
+    return (time.time() - lastChecked)/(60*60*24) > maxAge
+
+def refreshCatalog(url, csvPath, blockSize=2**16, timeout=60):
+    '''
+    Download the CSV database at `url` to `csvPath` if it changed since the
+    last download.
+
+    Parameters
+    ----------
+    url : str
+        URL of the CSV database
+    csvPath : str
+        Path to the local CSV database
+    blockSize : int
+        Number of bytes read from the server at a time
+    timeout : float
+        Timeout in seconds of the connection
+    Returns
+    -------
+    changed : bool
+        True if `csvPath` was replaced by a copy with different content
+    '''
+    metadata = readMetadata(csvPath) if os.path.exists(csvPath) else {}
+    request = urllib2.Request(url)
+    if metadata.get('etag'):
+        request.add_header('If-None-Match', metadata['etag'])
+    if metadata.get('last_modified'):
+        request.add_header('If-Modified-Since', metadata['last_modified'])
+
+    try:
+        response = urllib2.urlopen(request, timeout=timeout)
+    except urllib2.HTTPError, error:
+        if error.code != 304:
+            raise
+        '''Not modified: the local copy is up to date'''
+        metadata['checked'] = time.time()
+        writeMetadata(csvPath, metadata)
+        return False
+
+    '''Stream the new copy to a temporary file next to the database, hashing it on the way'''
+    partPath = csvPath+'.part'
+    sha = hashlib.sha1()
+    output = open(partPath, 'wb')
+    try:
+        block = response.read(blockSize)
+        while block:
+            sha.update(block)
+            output.write(block)
+            block = response.read(blockSize)
+        output.flush()
+        os.fsync(output.fileno())
+    except:
+        output.close()
+        os.remove(partPath)
+        raise
+    output.close()
+    headers = response.info()
+    response.close()
+
+    changed = not os.path.exists(csvPath) or fileHash(csvPath) != sha.hexdigest()
+    if changed:
+        os.rename(partPath, csvPath)
+    else:
+        os.remove(partPath)
+    metadata = {'etag': headers.getheader('ETag'), 'last_modified': headers.getheader('Last-Modified'),
+                'checked': time.time(), 'url': url}
+    writeMetadata(csvPath, metadata)
+    return changed
+
+def backgroundRefresh(url, csvPath, blockSize=2**16, timeout=60):
+    '''
+    Start `refreshCatalog` in a background thread, unless a refresh of
+    `csvPath` is already running in this process. The thread is not a daemon,
+    so a refresh that is still running when the calculation finishes is
+    completed before the interpreter exits.
+
+    Returns
+    -------
+    thread : threading.Thread
+        The thread running the refresh
+    '''
+    def refresh():
+        try:
+            if refreshCatalog(url, csvPath, blockSize, timeout):
+                print 'A fresh copy of the exoplanets.org database was downloaded; it will be used from the next run.'
+        except Exception, error:
+            print 'Could not refresh the exoplanets.org database (%s); keeping the local copy.' % error
+
+    with _refreshLock:
+        thread = _refreshThreads.get(csvPath)
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(target=refresh, name='catalogRefresh')
+            thread.start()
+            _refreshThreads[csvPath] = thread
+    return thread
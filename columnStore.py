@@ -0,0 +1,102 @@
+'''
+Columnar binary event tables.
+
+A column store is a directory with one .npy file per column and a JSON file,
+columns.json, listing the columns with their types and units and describing
+the table. Every column is a flat typed array at full precision, so later
+stages read the columns they need memory-mapped, without parsing text and
+without touching the others. The columns are written as the events arrive:
+each file starts with a fixed-size .npy header that is rewritten with the
+final number of rows when the table is closed, so a table of any length is
+written in one pass.
+'''
+import numpy as np
+import json
+import os
+import struct
+
+headerSize = 128    ## Bytes in the .npy header of every column, a multiple of 64 so the data stay aligned
+
+def npyHeader(dtype, length):
+    '''Version 1.0 .npy header of a one-dimensional array of `length` elements of `dtype`, padded to `headerSize`'''
+    header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (np.lib.format.dtype_to_descr(np.dtype(dtype)), length)
+    return np.lib.format.magic(1, 0) + struct.pack('<H', headerSize - 10) + header.ljust(headerSize - 11) + '\n'
+
+class ColumnWriter(object):
+    '''
+    Parameters
+    ----------
+    directory : str
+        Directory of the column store, created if needed. Column files left
+        in it by an earlier table are removed.
+    columns : list
+        (name, dtype, unit) of each column
+    metadata : dict
+        Description of the table, saved in columns.json
+    '''
+    def __init__(self, directory, columns, metadata=None):
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        for fileName in os.listdir(directory):
+            if fileName.endswith('.npy'):
+                os.remove(os.path.join(directory, fileName))
+        self.directory = directory
+        self.columns = [(name, np.dtype(dtype), unit) for name, dtype, unit in columns]
+        self.metadata = metadata or {}
+        self.length = 0
+        self.files = {}
+        for name, dtype, unit in self.columns:
+            self.files[name] = open(os.path.join(directory, name+'.npy'), 'wb')
+            self.files[name].write(npyHeader(dtype, 0))
+
+    def append(self, values):
+        '''Append rows, given as a dict of equal-length arrays with one entry per column'''
+        length = None
+        for name, dtype, unit in self.columns:
+            column = np.ascontiguousarray(values[name], dtype=dtype)
+            if length is None: length = len(column)
+            elif len(column) != length: raise ValueError("Column '%s' has %i rows, expected %i" % (name, len(column), length))
+            self.files[name].write(column.tostring())
+        self.length += length or 0
+
+    def close(self):
+        '''Write the final headers and columns.json'''
+        for name, dtype, unit in self.columns:
+            columnFile = self.files[name]
+            columnFile.seek(0)
+            columnFile.write(npyHeader(dtype, self.length))
+            columnFile.close()
+        description = dict(self.metadata)
+        description['rows'] = self.length
+        description['columns'] = [{'name': name, 'dtype': np.lib.format.dtype_to_descr(dtype), 'unit': unit}
+                                  for name, dtype, unit in self.columns]
+        descriptionFile = open(os.path.join(self.directory, 'columns.json'), 'w')
+        json.dump(description, descriptionFile, indent=1, sort_keys=True)
+        descriptionFile.close()
+
+def loadColumns(directory, names=None):
+    '''
+    Parameters
+    ----------
+    directory : str
+        Directory of a column store
+    names : list of str
+        Columns to open; all of them if not given
+    Returns
+    -------
+    columns : dict
+        Read-only memory-mapped array of each column, keyed by name
+    description : dict
+        Contents of columns.json
+    '''
+    descriptionFile = open(os.path.join(directory, 'columns.json'))
+    description = json.load(descriptionFile)
+    descriptionFile.close()
+    if names is None:
+        names = [column['name'] for column in description['columns']]
+    columns = {}
+    for name in names:
+        '''np.load cannot memory-map an empty file region, so empty columns are read'''
+        mode = 'r' if description['rows'] > 0 else None
+        columns[name] = np.load(os.path.join(directory, name+'.npy'), mmap_mode=mode)
+    return columns, description
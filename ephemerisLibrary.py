@@ -0,0 +1,129 @@
+'''
+Library interface to the ephemeris calculation, for programs that want the
+observable events themselves rather than report files.
+
+`findEvents` takes the site and the target selection as `Site` and
+`Selection` records and returns the events as a NumPy structured array
+(see eventStream.eventArray). It reads no .par file, writes no file, and
+only reads the catalog, so any number of threads can call it at once with
+one shared catalog: every call builds its own ephem.Observer and night table,
+and the result cache and the process pool of calculateEphemerides are off.
+
+    >>> import calculateEphemerides, ephemerisLibrary
+    >>> exoplanetDB = calculateEphemerides.downloadAndCompile()
+    >>> site = ephemerisLibrary.Site('46:57:03.9', '-120:43:28.4', 1198.0, 10.0, '30:00:00')
+    >>> selection = ephemerisLibrary.Selection(magLimit=12.1, depthLimit=0.001)
+    >>> events = ephemerisLibrary.findEvents(exoplanetDB, site, selection, 2457213.5, 2457254.5)
+    >>> events['planet'], events['midEvent'], events['scheduled']
+'''
+from collections import namedtuple
+
+import calculateEphemerides as ephemerides
+from twilight import twilightTable
+
+class Site(namedtuple('Site', ['latitude','longitude','elevation','temperature','minHorizon','twilight','name'])):
+    '''
+    Observatory: latitude and longitude (deg:min:sec strings, east positive),
+    elevation in meters, air temperature in degrees C, the pointing limit of
+    the telescope (deg:min:sec) and the altitude of the Sun in degrees that
+    defines twilight, as in the .par files
+    '''
+    __slots__ = ()
+
+    def __new__(cls, latitude, longitude, elevation=0.0, temperature=15.0, minHorizon='0', twilight=-6.0, name=''):
+        return super(Site, cls).__new__(cls, latitude, longitude, elevation, temperature, minHorizon, twilight, name)
+
+    @classmethod
+    def fromParameters(cls, parameters):
+        '''The site of the parameters of a .par file, as returned by `calculateEphemerides.readParFile`'''
+        return cls(parameters['latitude'], parameters['longitude'], parameters['elevation'], parameters['temperature'],
+                   parameters['min_horizon'], float(parameters['twilight']), parameters['name'])
+
+class Selection(namedtuple('Selection', ['magLimit','band','depthLimit','calcTransits','calcEclipses'])):
+    '''
+    Targets and events to search: the magnitude of the faintest host star in
+    the observing band, the shallowest transit depth, and whether to include
+    transits and secondary eclipses
+    '''
+    __slots__ = ()
+
+    def __new__(cls, magLimit, band='V', depthLimit=0.0, calcTransits=True, calcEclipses=False):
+        return super(Selection, cls).__new__(cls, magLimit, band, depthLimit, calcTransits, calcEclipses)
+
+    @classmethod
+    def fromParameters(cls, parameters):
+        '''The selection of the parameters of a .par file, as returned by `calculateEphemerides.readParFile`'''
+        return cls(parameters['mag_limit'], parameters['band'], parameters['depth_limit'],
+                   parameters['calc_transits'], parameters['calc_eclipses'])
+
+'''Parameters that only concern the report files, or that read or write files'''
+fileParameters = ['show_lt', 'timezone', 'profile', 'catalog_url', 'catalog_max_age', 'chunk_days', 'html_format',
+                  'html_split', 'html_gzip', 'result_cache', 'cache_nights', 'binary_out', 'sweep_reports',
+                  'event_index']
+
+def searchParameters(site, selection, start, end, options={}):
+    '''
+    Parameters
+    ----------
+    site : Site
+    selection : Selection
+    start, end : float
+        Julian dates bounding the search
+    options : dict
+        Values of the other optional .par file parameters, see `findEvents`
+    Returns
+    -------
+    parameters : dict
+        New parameter dictionary in the format of `calculateEphemerides.readParFile`
+    '''
+    unknown = [key for key in options if key not in ephemerides.defaultParameters or key in fileParameters]
+    if unknown:
+        raise TypeError('Unknown search options: %s' % ', '.join(sorted(unknown)))
+    parameters = dict(ephemerides.defaultParameters)
+    parameters.update(options)
+    parameters.update({'name': site.name, 'latitude': site.latitude, 'longitude': site.longitude,
+                       'elevation': site.elevation, 'temperature': site.temperature, 'min_horizon': site.minHorizon,
+                       'twilight': site.twilight, 'mag_limit': selection.magLimit, 'band': selection.band,
+                       'depth_limit': selection.depthLimit, 'calc_transits': selection.calcTransits,
+                       'calc_eclipses': selection.calcEclipses, 'start_date': start, 'end_date': end,
+                       'result_cache': False})
+    return parameters
+
+def findEvents(exoplanetDB, site, selection, start, end, nightTable=None, **options):
+    '''
+    Parameters
+    ----------
+    exoplanetDB : structured array
+        Compiled catalog from `calculateEphemerides.downloadAndCompile`;
+        only read, so it can be shared between threads
+    site : Site
+        Observatory
+    selection : Selection
+        Targets and event types to search
+    start, end : float
+        Julian dates bounding the search
+    nightTable : tuple
+        (dusk, dawn) table of the site and twilight altitude from
+        `twilight.twilightTable`, covering at least `start` to `end`;
+        computed if not given
+    options :
+        Any other .par file parameter that affects the events, by its .par
+        file name, e.g. ``altaz_backend='tiered'``, ``schedule_weight='magnitude'``,
+        ``sampling=True`` or ``moon_min_separation=30.0``. The defaults are
+        those of `calculateEphemerides.readParFile`; ``workers`` (default 1)
+        evaluates the candidates in a pool of processes.
+    Returns
+    -------
+    events : structured array
+        The observable events in order of ingress time, one field for each
+        field of eventStream.Event: planet, row (in the catalog), midEvent
+        (julian date), halfDuration (days), eventType, ingressAlt, ingressAz,
+        ingressDir, egressAlt, egressAz, egressDir (degrees and compass
+        points), conflicts, scheduled, fraction, minAltitude and maxAirmass
+        (NaN without sampling)
+    '''
+    parameters = searchParameters(site, selection, start, end, options)
+    if nightTable is None:
+        observatory = ephemerides.makeObserver(site.latitude, site.longitude, site.elevation, site.temperature, site.minHorizon)
+        nightTable = twilightTable(observatory, start, end, float(site.twilight))
+    return ephemerides.eventTable(parameters, exoplanetDB, nightTable=nightTable)
@@ -0,0 +1,271 @@
+'''
+Long-lived ephemeris query server.
+
+Running transitephem.py for every question pays for the interpreter start-up,
+the imports, loading the catalog and computing the night tables before any
+transit is predicted. This server does that work once: it keeps the compiled
+catalog in memory, along with the parameters and the twilight tables of each
+site (one .par file per site) for a year around the present, and answers
+queries over HTTP with the same calculation as calculateEphemerides. Each
+request is handled in its own thread.
+
+Usage:
+    $ python ephemerisServer.py mro.par apo.par --port 8080
+
+Queries:
+    GET /sites
+        The sites served and their default parameters, as JSON
+    GET /events?site=mro&start=2015-07-10&nights=1&mag_limit=11&format=json
+        Observable events. All parameters are optional:
+          site         name of the site's .par file without extension
+                       (default: the first site)
+          start        start of the window (UT): YYYY-MM-DD, YYYY-MM-DDTHH:MM
+                       or a julian date (default: now)
+          end          end of the window, same formats (default: start + nights)
+          nights       length of the window in days (default: 1)
+          mag_limit, band, depth_limit, calc_transits, calc_eclipses,
+          twilight, altaz_backend, schedule_weight, sampling,
+          sample_minutes, baseline_minutes, min_fraction, moon_min_separation,
+          moon_max_illumination, moon_max_altitude, tier_margin
+                       override the site's .par file values
+          format       json (default), csv or html
+'''
+import numpy as np
+import argparse
+import json
+import os
+import threading
+import urlparse
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+from cStringIO import StringIO
+
+import calculateEphemerides as ephemerides
+from twilight import twilightTable
+from timeConversion import julianDate, currentJulianDate
+from targetIndex import targetIndex
+from eventStream import arrayStream
+from schedule import weightSchemes
+from reportSinks import ReportFields, CSVSink, HTMLSink, JSONSink, writeReports
+
+class QueryError(ValueError):
+    '''A query with missing or invalid parameters'''
+    pass
+
+queryConverters = {'mag_limit': float, 'depth_limit': float, 'band': str, 'twilight': str, 'altaz_backend': str, 'schedule_weight': str,
+                   'calc_transits': ephemerides.returnBool, 'calc_eclipses': ephemerides.returnBool,
+                   'sampling': ephemerides.returnBool, 'sample_minutes': float, 'baseline_minutes': float, 'min_fraction': float,
+                   'moon_min_separation': float, 'moon_max_illumination': float, 'moon_max_altitude': float,
+                   'tier_margin': float}
+
+class EphemerisServer(ThreadingMixIn, HTTPServer):
+    '''
+    HTTP server that keeps the catalog, the site parameters and the night
+    tables warm in memory.
+
+    Parameters
+    ----------
+    address : tuple
+        (host, port) to listen on
+    parFiles : list of str
+        Paths to the .par files of the sites to serve
+    exoplanetDB : structured array
+        Compiled catalog; loaded (and refreshed when stale) if not given
+    tableDays : float
+        The night tables cover this many days either side of the present
+    tablePadding : float
+        A night table that has to be extended for a query is extended this
+        many days past the query's window, so later queries reuse it
+    '''
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, parFiles, exoplanetDB=None, tableDays=366.0, tablePadding=30.0):
+        self.sites = {}
+        self.siteNames = []
+        for parFile in parFiles:
+            name = os.path.splitext(os.path.basename(parFile))[0]
+            self.siteNames.append(name)
+            self.sites[name] = ephemerides.readParFile(parFile)
+        firstSite = self.sites[self.siteNames[0]]
+        if exoplanetDB is None:
+            exoplanetDB = ephemerides.downloadAndCompile(firstSite['catalog_url'], firstSite['catalog_max_age'])
+        self.exoplanetDB = np.array(exoplanetDB)     ## Read the memory-mapped catalog into memory once
+        targetIndex(self.exoplanetDB)                ## and build its target index
+        self.tableLock = threading.Lock()
+        self.tablePadding = tablePadding
+        self.nightTables = {}      ## (start, end, dusk, dawn) of one table per site and twilight altitude
+        now = currentJulianDate()
+        for name in self.siteNames:
+            parameters = self.sites[name]
+            start = min(now - tableDays, parameters['start_date'])
+            end = max(now + tableDays, parameters['end_date'])
+            self.nightTables[name, float(parameters['twilight'])] = (start, end) + self.computeNightTable(parameters, parameters['twilight'], start, end)
+        HTTPServer.__init__(self, address, QueryHandler)
+
+    def computeNightTable(self, parameters, twilight, start, end):
+        '''Dusk and dawn table of a site between julian dates `start` and `end`, computed in memory'''
+        observatory = ephemerides.makeObserver(parameters['latitude'], parameters['longitude'], parameters['elevation'],
+                                               parameters['temperature'], parameters['min_horizon'])
+        return twilightTable(observatory, start, end, float(twilight))
+
+    def nightTable(self, name, twilight, start, end):
+        '''
+        Night table of site `name` covering `start` to `end`. The server
+        keeps one table per site and twilight altitude; a query outside it
+        extends it, padded by `tablePadding` days, and later queries reuse
+        the extended table.
+        '''
+        key = (name, float(twilight))
+        with self.tableLock:
+            table = self.nightTables.get(key)
+            if table is None or start - 1.0 < table[0] or table[1] < end + 1.0:
+                '''Computed while holding the lock, so concurrent queries do not compute the same table'''
+                tableStart, tableEnd = start - 1.0 - self.tablePadding, end + 1.0 + self.tablePadding
+                if table is not None:
+                    tableStart, tableEnd = min(tableStart, table[0]), max(tableEnd, table[1])
+                table = (tableStart, tableEnd) + self.computeNightTable(self.sites[name], twilight, tableStart, tableEnd)
+                self.nightTables[key] = table
+        return table[2:]
+
+    def queryParameters(self, query):
+        '''
+        Parameters
+        ----------
+        query : dict
+            Query string parameters, each with a list of values
+        Returns
+        -------
+        name : str
+            Site name
+        parameters : dict
+            The site's .par file parameters, with the query's overrides
+        '''
+        name = query.get('site', [self.siteNames[0]])[0]
+        if name not in self.sites:
+            raise QueryError("Unknown site '%s', expected one of: %s" % (name, ', '.join(self.siteNames)))
+        parameters = dict(self.sites[name])
+        parameters['workers'] = 1            ## The server handles queries in threads, not processes
+        parameters['result_cache'] = False
+        try:
+            for key, converter in queryConverters.items():
+                if key in query:
+                    parameters[key] = converter(query[key][0])
+            start = julianDate(query['start'][0]) if 'start' in query else currentJulianDate()
+            if 'end' in query:
+                end = julianDate(query['end'][0])
+            else:
+                end = start + float(query.get('nights', ['1'])[0])
+        except ValueError, error:
+            raise QueryError(str(error))
+        if not end > start:
+            raise QueryError('The end of the window must be after its start')
+        if parameters['calc_transits'] is None or parameters['calc_eclipses'] is None or parameters['sampling'] is None:
+            raise QueryError('calc_transits, calc_eclipses and sampling must be True or False')
+        if parameters['sampling'] and not parameters['sample_minutes'] > 0:
+            raise QueryError('sample_minutes must be positive')
+        if parameters['altaz_backend'] not in ephemerides.altazBackends:
+            raise QueryError("Unknown altaz_backend '%s', expected one of: %s" % (parameters['altaz_backend'], ', '.join(ephemerides.altazBackends)))
+        if parameters['sampling'] and parameters['altaz_backend'] == 'tiered':
+            raise QueryError('altaz_backend=tiered cannot be used with sampling')
+        try:
+            float(parameters['twilight'])
+        except ValueError:
+            raise QueryError("twilight must be the altitude of the Sun in degrees, not '%s'" % parameters['twilight'])
+        bands = targetIndex(self.exoplanetDB).bands
+        if ephemerides.bandColumnName(parameters['band']) not in bands:
+            raise QueryError("No '%s' magnitudes in the catalog, expected one of: %s" % (parameters['band'], ', '.join(bands)))
+        if parameters['schedule_weight'] not in weightSchemes:
+            raise QueryError("Unknown schedule_weight '%s', expected one of: %s" % (parameters['schedule_weight'], ', '.join(weightSchemes)))
+        parameters['start_date'], parameters['end_date'] = start, end
+        return name, parameters
+
+    def events(self, query):
+        '''
+        Parameters
+        ----------
+        query : dict
+            Query string parameters, see the module docstring
+        Returns
+        -------
+        body : str
+            The observable events, formatted as requested
+        contentType : str
+            MIME type of `body`
+        '''
+        name, parameters = self.queryParameters(query)
+        outputFormat = query.get('format', ['json'])[0].lower()
+        if outputFormat not in ['json', 'csv', 'html']:
+            raise QueryError("Unknown format '%s', expected json, csv or html" % outputFormat)
+        nightTable = self.nightTable(name, parameters['twilight'], parameters['start_date'], parameters['end_date'])
+        events = ephemerides.eventTable(parameters, self.exoplanetDB, nightTable=nightTable)
+        fields = ReportFields(self.exoplanetDB, ephemerides.bandColumnName(parameters['band']))
+        output = StringIO()
+        if outputFormat == 'json':
+            sink, contentType = JSONSink(output, fields, parameters['sampling']), 'application/json'
+        elif outputFormat == 'csv':
+            sink, contentType = CSVSink(output, fields, parameters['sampling']), 'text/csv'
+        else:
+            sink, contentType = HTMLSink(output, fields, parameters['name'], parameters['band'], parameters['start_date'],
+                                         parameters['end_date'], parameters['show_lt'], parameters['timezone'],
+                                         parameters['sampling']), 'text/html'
+        writeReports(arrayStream(events), [sink])
+        return output.getvalue(), contentType
+
+    def siteDescriptions(self):
+        '''JSON description of the sites served'''
+        return json.dumps([dict((key, value) for key, value in self.sites[name].items()
+                                if isinstance(value, (str, int, float, bool, type(None))))
+                           for name in self.siteNames], indent=2, sort_keys=True)
+
+class QueryHandler(BaseHTTPRequestHandler):
+    '''Answers the queries described in the module docstring'''
+    staticFiles = {'/sorttable.js': 'application/javascript', '/stylesheetEphem.css': 'text/css',
+                   '/stylesheetEphemDark.css': 'text/css'}
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        query = urlparse.parse_qs(url.query)
+        try:
+            if url.path in ['/events', '/events/']:
+                body, contentType = self.server.events(query)
+            elif url.path in ['/sites', '/sites/']:
+                body, contentType = self.server.siteDescriptions(), 'application/json'
+            elif url.path in self.staticFiles:
+                staticFile = open(os.path.join(ephemerides.rootdir, url.path[1:]), 'rb')
+                body, contentType = staticFile.read(), self.staticFiles[url.path]
+                staticFile.close()
+            elif url.path == '/':
+                body, contentType = __doc__, 'text/plain'
+            else:
+                self.respond(404, json.dumps({'error': 'Not found: '+url.path}), 'application/json')
+                return
+        except QueryError, error:
+            self.respond(400, json.dumps({'error': str(error)}), 'application/json')
+            return
+        except Exception, error:
+            '''Answer the client even if the query fails unexpectedly'''
+            self.respond(500, json.dumps({'error': '%s: %s' % (type(error).__name__, error)}), 'application/json')
+            raise
+        self.respond(200, body, contentType)
+
+    def respond(self, status, body, contentType):
+        self.send_response(status)
+        self.send_header('Content-Type', contentType)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve ephemeris queries for one or more observatories')
+    parser.add_argument('parfiles', nargs='*', default=['mro.par'], help='.par files of the sites')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='port to listen on')
+    args = parser.parse_args()
+
+    server = EphemerisServer((args.host, args.port), args.parfiles)
+    print 'Serving ephemerides for %s at http://%s:%i/' % (', '.join(server.siteNames), args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,317 @@
+'''
+Persistent index of the computed events, for "what's next" and time-range
+queries that neither recompute the ephemerides nor read the reports.
+
+The index of a site is a directory of segments, each a column store (see
+columnStore.py) of events sorted by ingress time, with a secondary key by
+planet: `planet_key` holds the planet names of the segment in sorted order
+and `planet_order` the row of each of them in the time-sorted columns, so the
+events of one planet are found together and in order of ingress. Queries open
+the segments memory-mapped, find the events in each by binary search and
+merge them, reading O(log n) entries of each segment plus the events
+returned.
+
+Each run that writes to the index (`event_index` in the .par file) adds its
+events as new segments, written as the events arrive, and does not touch the
+segments already there, so a rolling window run every night writes only its
+own window. The events of the earlier runs with mid-event times in the window
+of a later run are superseded by it, and skipped by queries. Once there are
+more than `maxSegments` segments, the next run merges them into one and drops
+the superseded events, so the cost of merging is spread over many runs.
+index.json lists the segments and the windows of the runs, and the
+parameters the events were computed with; a run with other parameters starts
+a new index. It is rewritten (atomically) only when a run has written all of
+its segments, so a run that fails leaves the index as it was. A run holds an
+exclusive lock on the file `lock` of the directory from its start to its end,
+so runs of the same index by other processes wait for it to finish rather
+than remove its segments or take its run number; queries don't lock.
+'''
+import numpy as np
+import fcntl
+import json
+import os
+import shutil
+import sys
+
+from columnStore import ColumnWriter, loadColumns
+
+'''Parameters of a .par file that change the events'''
+settingKeys = ['latitude', 'longitude', 'elevation', 'temperature', 'min_horizon', 'twilight', 'mag_limit', 'band',
+               'depth_limit', 'calc_transits', 'calc_eclipses', 'altaz_backend', 'tier_margin', 'schedule_weight',
+               'sampling', 'sample_minutes', 'baseline_minutes', 'min_fraction', 'moon_min_separation',
+               'moon_max_illumination', 'moon_max_altitude']
+
+'''(name, dtype, unit) of the event columns; the planet names take the string length of the catalog'''
+eventColumns = [('ingress', np.float64, 'JD (UT)'), ('egress', np.float64, 'JD (UT)'), ('mid_event', np.float64, 'JD (UT)'),
+                ('planet', None, ''), ('event', 'S7', ''),
+                ('ingress_altitude', np.float64, 'deg'), ('ingress_azimuth', np.float64, 'deg'), ('ingress_direction', 'S2', ''),
+                ('egress_altitude', np.float64, 'deg'), ('egress_azimuth', np.float64, 'deg'), ('egress_direction', 'S2', ''),
+                ('conflicts', np.int32, ''), ('scheduled', bool, ''),
+                ('observable_fraction', np.float64, ''), ('min_altitude', np.float64, 'deg'), ('max_airmass', np.float64, '')]
+eventNames = [name for name, dtype, unit in eventColumns]
+
+def indexSettings(parameters):
+    '''The values of `settingKeys` in the parameters of a .par file'''
+    return dict((key, parameters[key]) for key in settingKeys)
+
+def mergeWindows(windows):
+    '''Union of a list of [start, end] julian date intervals, as sorted disjoint intervals'''
+    merged = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def emptyEvents(nameType='S1'):
+    '''A structured array of no events'''
+    return np.zeros(0, dtype=[(name, nameType if dtype is None else dtype) for name, dtype, unit in eventColumns])
+
+def concatenateEvents(eventArrays):
+    '''Concatenate structured arrays of events whose planet names may differ in length'''
+    if not eventArrays:
+        return emptyEvents()
+    nameType = 'S%i' % max(events.dtype['planet'].itemsize for events in eventArrays)
+    return np.concatenate([events.astype(emptyEvents(nameType).dtype) for events in eventArrays])
+
+def sortedEvents(events):
+    '''The events in order of ingress time; events with equal ingress times keep their order'''
+    return events[np.argsort(events['ingress'], kind='mergesort')]
+
+class Segment(object):
+    '''
+    One column store of the index, holding events of run `run` sorted by
+    ingress time; `supersededBy` are the windows of the later runs
+    '''
+    def __init__(self, directory, run, supersededBy):
+        self.columns, self.description = loadColumns(directory)
+        self.run = run
+        self.supersededBy = supersededBy
+
+    def __len__(self):
+        return self.description['rows']
+
+    def live(self, rows):
+        '''The `rows` whose events are not superseded by a later run'''
+        if not self.supersededBy or not len(rows):
+            return rows
+        mids = self.columns['mid_event'][rows]
+        superseded = np.zeros(len(rows), dtype=bool)
+        for start, end in self.supersededBy:
+            superseded |= (mids > start)*(mids < end)
+        return rows[~superseded]
+
+    def events(self, rows):
+        '''The events at `rows` as a structured array with the fields of `eventColumns`'''
+        events = np.zeros(len(rows), dtype=[(name, self.columns[name].dtype) for name in eventNames])
+        for name in eventNames:
+            events[name] = self.columns[name][rows]
+        return events
+
+    def planetRows(self, planet):
+        '''Rows of the events of `planet` (its name in the catalog), in order of ingress'''
+        keys = self.columns['planet_key']
+        first, last = np.searchsorted(keys, planet, side='left'), np.searchsorted(keys, planet, side='right')
+        return np.asarray(self.columns['planet_order'][first:last])
+
+    def after(self, jd, number, planet=None):
+        '''Rows of the next `number` live events with ingress at or after julian date `jd`'''
+        if planet is not None:
+            rows = self.planetRows(planet)
+            rows = self.live(rows[np.searchsorted(self.columns['ingress'][rows], jd, side='left'):])
+            return rows[:number]
+        first = np.searchsorted(self.columns['ingress'], jd, side='left')
+        found, step = [], max(number, 16)
+        while first < len(self) and sum(len(rows) for rows in found) < number:
+            '''Read ahead in growing steps until enough of the events are live'''
+            found.append(self.live(np.arange(first, min(first + step, len(self)))))
+            first, step = first + step, 2*step
+        return np.concatenate(found)[:number] if found else np.zeros(0, dtype=np.int64)
+
+    def between(self, start, end, planet=None):
+        '''Rows of the live events in progress at any time between julian dates `start` and `end`'''
+        if planet is None:
+            '''Only the events with ingress at most the longest duration before `start` can still be in progress'''
+            ingress = self.columns['ingress']
+            first = np.searchsorted(ingress, start - self.description['max_duration'], side='left')
+            rows = np.arange(first, np.searchsorted(ingress, end, side='left'))
+        else:
+            rows = self.planetRows(planet)
+            rows = rows[self.columns['ingress'][rows] < end]
+        return self.live(rows[self.columns['egress'][rows] > start])
+
+class EventIndex(object):
+    '''
+    Parameters
+    ----------
+    directory : str
+        Directory of the index; an empty index if it does not exist yet
+    maxSegments : int
+        Number of segments above which a run merges them into one
+    '''
+    def __init__(self, directory, maxSegments=16):
+        self.directory = directory
+        self.maxSegments = maxSegments
+        self.run = None
+        self.newSegments = []
+        self.lockFile = None
+        self.reload()
+
+    def reload(self):
+        '''Open the segments listed in index.json'''
+        descriptionPath = os.path.join(self.directory, 'index.json')
+        if os.path.exists(descriptionPath):
+            descriptionFile = open(descriptionPath)
+            self.description = json.load(descriptionFile)
+            descriptionFile.close()
+        else:
+            self.description = {'settings': None, 'windows': [], 'runs': [], 'segments': [], 'next_run': 0}
+        self.segments = []
+        for segment in self.description['segments']:
+            supersededBy = [run['window'] for run in self.description['runs'] if run['run'] > segment['run']]
+            self.segments.append(Segment(os.path.join(self.directory, segment['name']), segment['run'], supersededBy))
+
+    def __len__(self):
+        '''Number of live events, counted by reading the mid-event times of every segment'''
+        return sum(len(segment.live(np.arange(len(segment)))) for segment in self.segments)
+
+    def empty(self):
+        '''True if no run has written to the index'''
+        return not self.description['windows']
+
+    def lock(self):
+        '''Take the exclusive lock of the index, waiting for the run of another process to finish'''
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        self.lockFile = open(os.path.join(self.directory, 'lock'), 'a')
+        try:
+            fcntl.flock(self.lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+            print 'Waiting for another run to finish writing the event index in %s...' % self.directory
+            sys.stdout.flush()
+            fcntl.flock(self.lockFile, fcntl.LOCK_EX)
+
+    def unlock(self):
+        '''Release the lock taken by `lock`'''
+        if self.lockFile is not None:
+            fcntl.flock(self.lockFile, fcntl.LOCK_UN)
+            self.lockFile.close()
+            self.lockFile = None
+
+    def startRun(self):
+        '''Start adding the events of a run, see `addSegment` and `finishRun`'''
+        self.lock()
+        self.reload()   ## Another run may have finished while this one waited
+        self.run = self.description['next_run']
+        self.newSegments = []
+        '''Remove the segments left by runs that failed before finishing; with the lock 
+            held, no other run is writing any'''
+        self.removeUnlisted()
+
+    def addSegment(self, events):
+        '''
+        Write events of the current run as a new segment
+
+        Parameters
+        ----------
+        events : dict
+            Arrays of the `eventColumns` of the events, in order of ingress
+            time, following the events of the run's earlier segments
+        '''
+        name = 'segment_%06i_%04i' % (self.run, len(self.newSegments))
+        self.writeSegment(name, events)
+        self.newSegments.append({'name': name, 'run': self.run})
+
+    def writeSegment(self, name, events):
+        '''Write the column store of a segment, with its secondary key by planet'''
+        columns = dict((column, np.asarray(events[column], dtype=dtype)) for column, dtype, unit in eventColumns)
+        nameType = columns['planet'].dtype if len(columns['planet']) else np.dtype('S1')
+        planetOrder = np.argsort(columns['planet'], kind='mergesort')     ## Stable, so each planet's events stay in order of ingress
+        columns['planet_key'] = columns['planet'][planetOrder]
+        columns['planet_order'] = planetOrder
+        layout = [(column, nameType if dtype is None else dtype, unit) for column, dtype, unit in eventColumns]
+        layout += [('planet_key', nameType, ''), ('planet_order', np.int64, 'row')]
+        durations = columns['egress'] - columns['ingress']
+        writer = ColumnWriter(os.path.join(self.directory, name), layout,
+                              {'max_duration': float(durations.max()) if len(durations) else 0.0})
+        writer.append(columns)
+        writer.close()
+
+    def finishRun(self, start, end, settings):
+        '''
+        Add the segments of the current run to the index, superseding the
+        events of the earlier runs with mid-event times between `start` and
+        `end` (julian dates), and release the lock of the index. `settings`
+        are the parameters of the run, from `indexSettings`.
+        '''
+        settings = json.loads(json.dumps(settings))
+        description = dict(self.description)
+        if description['settings'] is not None and description['settings'] != settings:
+            print 'The event index in %s was computed with other parameters; starting a new index.' % self.directory
+            description.update({'windows': [], 'runs': [], 'segments': []})
+        description['settings'] = settings
+        description['windows'] = mergeWindows(description['windows'] + [[start, end]])
+        description['runs'] = description['runs'] + [{'run': self.run, 'window': [start, end]}]
+        description['segments'] = description['segments'] + self.newSegments
+        description['next_run'] = self.run + 1
+        self.saveDescription(description)
+        self.run = None
+        if len(self.description['segments']) > self.maxSegments:
+            self.compact()
+        self.removeUnlisted()
+        self.unlock()
+
+    def compact(self):
+        '''Merge the segments into one, without the superseded events'''
+        events = sortedEvents(concatenateEvents([segment.events(segment.live(np.arange(len(segment))))
+                                                 for segment in self.segments]))
+        lastRun = self.description['runs'][-1]['run']
+        name = 'segment_%06i_merged' % lastRun
+        self.writeSegment(name, dict((column, events[column]) for column in eventNames))
+        description = dict(self.description)
+        description['segments'] = [{'name': name, 'run': lastRun}]
+        description['runs'] = [run for run in description['runs'] if run['run'] > lastRun]
+        self.saveDescription(description)
+
+    def saveDescription(self, description):
+        '''Replace index.json atomically, then reopen the segments'''
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        path = os.path.join(self.directory, 'index.json')
+        descriptionFile = open(path+'.tmp', 'w')
+        json.dump(description, descriptionFile, indent=1, sort_keys=True)
+        descriptionFile.close()
+        os.rename(path+'.tmp', path)
+        self.reload()
+
+    def removeUnlisted(self):
+        '''Remove the segments that are no longer listed in index.json'''
+        listed = set(segment['name'] for segment in self.description['segments'])
+        for name in os.listdir(self.directory):
+            if name.startswith('segment_') and name not in listed:
+                shutil.rmtree(os.path.join(self.directory, name))
+
+    def covered(self, jd):
+        '''True if the index holds the events of julian date `jd`'''
+        return any(start <= jd < end for start, end in self.description['windows'])
+
+    def hasPlanet(self, planet):
+        '''True if the index has events of `planet`'''
+        return any(len(segment.live(segment.planetRows(planet))) for segment in self.segments)
+
+    def planets(self):
+        '''Names of the planets with events in the index, and their numbers of events'''
+        names = [np.asarray(segment.columns['planet'][segment.live(np.arange(len(segment)))]) for segment in self.segments]
+        if not names:
+            return np.zeros(0, dtype='S1'), np.zeros(0, dtype=int)
+        return np.unique(np.concatenate(names), return_counts=True)
+
+    def after(self, jd, number=1, planet=None):
+        '''The next `number` events with ingress at or after julian date `jd`, of `planet` if given'''
+        events = concatenateEvents([segment.events(segment.after(jd, number, planet)) for segment in self.segments])
+        return sortedEvents(events)[:number]
+
+    def between(self, start, end, planet=None):
+        '''The events in progress at any time between julian dates `start` and `end`, in order of ingress'''
+        return sortedEvents(concatenateEvents([segment.events(segment.between(start, end, planet)) for segment in self.segments]))
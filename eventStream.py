@@ -0,0 +1,112 @@
+'''
+Time-ordered stream of observable events.
+
+Rather than collecting the observable events into per-day dictionaries and
+sorting them for every report, `eventArray` sorts them once by ingress time
+into a structured array, which callers that want the events themselves
+rather than reports use directly. `arrayStream` turns such an array into a
+stream for the report sinks, which see one event at a time, in order of
+ingress, and write their rows as they go. The array holds every event of the
+window; `chunk_days` in the .par file bounds its size for long windows (see
+`calculateEphemerides.windowChunks`).
+'''
+import numpy as np
+from itertools import izip
+from collections import namedtuple
+
+from vectorEphem import azToDirection
+
+class Event(namedtuple('Event', ['planet','row','midEvent','halfDuration','eventType',
+                                 'ingressAlt','ingressAz','ingressDir','egressAlt','egressAz','egressDir','conflicts','scheduled',
+                                 'fraction','minAltitude','maxAirmass'])):
+    '''
+    One observable transit or eclipse: the planet's name and catalog row, the
+    mid-event julian date, half of the event's duration in days, the event type
+    ('transit' or 'eclipse'), the host star's altitude, azimuth (degrees) and
+    compass direction at ingress and egress, the number of other events it overlaps
+    and whether it is in the best observing schedule (see schedule.py), and,
+    if the event was sampled densely (see transitSampling.py), the fraction of
+    it that is observable, the star's lowest altitude (degrees) and highest
+    airmass while observable; NaN otherwise.
+    '''
+    __slots__ = ()
+
+    @property
+    def ingress(self):
+        '''Julian date of ingress'''
+        return self.midEvent - self.halfDuration
+
+    @property
+    def egress(self):
+        '''Julian date of egress'''
+        return self.midEvent + self.halfDuration
+
+def eventArray(names, rows, midEvents, eventTypes, halfDurations, altitudes, azimuths, conflicts=None, scheduled=None,
+               samples=None):
+    '''
+    Parameters
+    ----------
+    names : array
+        Planet names, indexed by catalog row
+    rows, midEvents, eventTypes, halfDurations : array
+        Catalog row, mid-event julian date, event type and half duration of
+        each observable event
+    altitudes, azimuths : array
+        Altitude and azimuth (degrees) of the host star at ingress and egress
+        of each event, shape (N, 2)
+    conflicts, scheduled : array
+        Number of overlapping events and whether each event is scheduled,
+        from `schedule.observingSchedule`; zero and False if not given
+    samples : array
+        Observable fraction, minimum altitude and maximum airmass of each
+        event, shape (N, 3), from `calculateEphemerides.sampledVisibleEvents`;
+        NaN if not given
+    Returns
+    -------
+    events : structured array
+        The events in order of ingress time, with one field for each field
+        of `Event`
+    '''
+    if conflicts is None: conflicts = np.zeros(len(midEvents), dtype=int)
+    if scheduled is None: scheduled = np.zeros(len(midEvents), dtype=bool)
+    if samples is None: samples = np.repeat(np.nan, 3*len(midEvents)).reshape(-1, 3)
+    directions = azToDirection(np.floor(azimuths))
+    rows = np.asarray(rows, dtype=int)
+    '''In order of ingress time, keeping the order of the input among events with the same ingress'''
+    order = np.lexsort((np.arange(len(midEvents)), midEvents - halfDurations))
+    events = np.zeros(len(midEvents), dtype=[('planet', np.asarray(names).dtype), ('row', int), ('midEvent', np.float64),
+                                             ('halfDuration', np.float64), ('eventType', 'S7'),
+                                             ('ingressAlt', np.float64), ('ingressAz', np.float64), ('ingressDir', 'S2'),
+                                             ('egressAlt', np.float64), ('egressAz', np.float64), ('egressDir', 'S2'),
+                                             ('conflicts', int), ('scheduled', bool),
+                                             ('fraction', np.float64), ('minAltitude', np.float64), ('maxAirmass', np.float64)])
+    columns = [names[rows], rows, midEvents, halfDurations, eventTypes, altitudes[:,0], azimuths[:,0], directions[:,0],
+               altitudes[:,1], azimuths[:,1], directions[:,1], conflicts, scheduled, samples[:,0], samples[:,1], samples[:,2]]
+    for field, column in zip(events.dtype.names, columns):
+        events[field] = np.asarray(column)[order]
+    return events
+
+def arrayStream(events):
+    '''
+    Parameters
+    ----------
+    events : structured array
+        Events from `eventArray`
+    Yields
+    ------
+    event : Event
+        Each of the events, in order
+    '''
+    for values in izip(*[events[field] for field in Event._fields]):
+        yield Event(*values)
+
+def batches(events, size=1000):
+    '''Group a stream of events into lists of at most `size` events'''
+    batch = []
+    for event in events:
+        batch.append(event)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if len(batch) != 0:
+        yield batch
@@ -0,0 +1,155 @@
+'''
+Lunar constraints on the candidate events.
+
+The Moon is the same for every target, so rather than computing ephem.Moon()
+at each candidate event, its topocentric position, altitude and illuminated
+fraction are computed once on an hourly grid spanning the observing window.
+The Moon at any time is interpolated from the table, and its separation from
+every host star (precessed to the equinox of date with vectorEphem.precess)
+is computed with NumPy for all events at once. The Moon moves about half a
+degree an hour, so the interpolation error is far below any useful
+separation limit.
+'''
+import ephem	 ## PyEphem module
+import numpy as np
+
+from vectorEphem import ephemDateOffset, precess, horizontal
+from profiling import count
+
+def moonTable(observatory, start, end, step=1.0/24):
+    '''
+    Parameters
+    ----------
+    observatory : ephem.Observer
+        Observer describing the site. Its date is left unchanged.
+    start, end : float
+        Julian dates bounding the observing window
+    step : float
+        Interval between the entries of the table in days
+    Returns
+    -------
+    table : tuple
+        Julian dates spanning the window (padded by one step on either side),
+        and at each of them the Moon's apparent topocentric right ascension
+        and declination of date (radians) and its illuminated fraction; then
+        the site's latitude, longitude, temperature and pressure
+    '''
+    site = ephem.Observer()
+    site.lat, site.long = observatory.lat, observatory.long
+    site.elevation, site.temp, site.pressure = observatory.elevation, observatory.temp, observatory.pressure
+    moon = ephem.Moon()
+
+    times = np.arange(start - step, end + 2*step, step)
+    ra, dec, illumination = np.empty(len(times)), np.empty(len(times)), np.empty(len(times))
+    for i, time in enumerate(times):
+        site.date = time - ephemDateOffset
+        moon.compute(site)
+        ra[i], dec[i], illumination[i] = moon.ra, moon.dec, moon.moon_phase
+    count('ephem moon computations', len(times))
+    return times, ra, dec, illumination, (float(site.lat), float(site.long), site.temp, site.pressure)
+
+def moonAt(table, times):
+    '''
+    Parameters
+    ----------
+    table : tuple of arrays
+        Moon table from `moonTable`
+    times : array
+        Julian dates within the table, of any shape; outside it the Moon
+        of the first or last entry is used
+    Returns
+    -------
+    direction : array
+        Unit vector towards the Moon in equatorial coordinates of date,
+        shape (3,) + times.shape
+    altitude, illumination : array
+        Altitude (degrees) and illuminated fraction of the Moon at `times`
+    '''
+    tableTimes, ra, dec, illumination, site = table
+    times = np.asarray(times, dtype=np.float64)
+    '''Interpolate the direction as a vector, so that right ascension wrapping at 2pi does no harm. 
+        The altitude changes too quickly to interpolate, so it is computed from the direction.'''
+    vectors = [np.cos(dec)*np.cos(ra), np.cos(dec)*np.sin(ra), np.sin(dec)]
+    direction = np.array([np.interp(times, tableTimes, component) for component in vectors])
+    direction /= np.sqrt(np.sum(direction**2, axis=0))
+    altitude, azimuth = horizontal(np.arctan2(direction[1], direction[0]), np.arcsin(direction[2]), times, *site)
+    return direction, np.degrees(altitude), np.interp(times, tableTimes, illumination)
+
+def moonSeparation(table, ras, decs, times):
+    '''
+    Parameters
+    ----------
+    table : tuple of arrays
+        Moon table from `moonTable`
+    ras, decs : array
+        J2000 coordinates of the targets in radians, broadcast against `times`
+    times : array
+        Julian dates within the table
+    Returns
+    -------
+    separation : array
+        Angle between each target and the Moon in degrees
+    altitude, illumination : array
+        Altitude (degrees) and illuminated fraction of the Moon at `times`
+    '''
+    moonDirection, altitude, illumination = moonAt(table, times)
+    raDate, decDate = precess(ras, decs, times)
+    cosSeparation = np.cos(decDate)*np.cos(raDate)*moonDirection[0] + np.cos(decDate)*np.sin(raDate)*moonDirection[1] + \
+                    np.sin(decDate)*moonDirection[2]
+    return np.degrees(np.arccos(np.clip(cosSeparation, -1.0, 1.0))), altitude, illumination
+
+def moonConstraint(table, ras, decs, times, minSeparation=0.0, maxIllumination=1.0, maxAltitude=0.0):
+    '''
+    Parameters
+    ----------
+    table : tuple of arrays
+        Moon table from `moonTable`
+    ras, decs : array
+        J2000 coordinates of the host star of each event in radians
+    times : array
+        Julian dates at which to test each event, shape (N, K)
+    minSeparation : float
+        Smallest acceptable separation between the Moon and the target (degrees)
+    maxIllumination : float
+        Largest acceptable illuminated fraction of the Moon
+    maxAltitude : float
+        Altitude (degrees) below which the Moon does not constrain the events
+    Returns
+    -------
+    allowed : array of bool
+        True for the events during which, at each of the `times`, the Moon
+        is below `maxAltitude`, or is no more than `maxIllumination`
+        illuminated and at least `minSeparation` from the target
+    '''
+    separation, altitude, illumination = moonSeparation(table, np.asarray(ras)[:, np.newaxis], np.asarray(decs)[:, np.newaxis], times)
+    harmless = (altitude <= maxAltitude) + ((illumination <= maxIllumination)*(separation >= minSeparation))
+    return np.all(harmless, axis=1)
+
+def eventMoonConstraint(observatory, ras, decs, midEvents, halfWindows, minSeparation=0.0, maxIllumination=1.0,
+                        maxAltitude=0.0, samples=5):
+    '''
+    Parameters
+    ----------
+    observatory : ephem.Observer
+        Observer describing the site
+    ras, decs : array
+        J2000 coordinates of the host star of each event in radians
+    midEvents, halfWindows : array
+        Julian date of the middle of each event, and half of the time to
+        keep free of the Moon around it (days)
+    minSeparation, maxIllumination, maxAltitude : float
+        Limits, see `moonConstraint`
+    samples : int
+        Number of times from the start to the end of each window to test
+    Returns
+    -------
+    allowed : array of bool
+        True for the events not spoiled by the Moon. The Moon table spans
+        every time tested, which for the events at the edges of the
+        observing window reaches past the window by up to a half window.
+    '''
+    times = np.asarray(midEvents)[:, np.newaxis] + np.asarray(halfWindows)[:, np.newaxis]*np.linspace(-1, 1, samples)
+    if not times.size:
+        return np.ones(len(times), dtype=bool)
+    table = moonTable(observatory, times.min(), times.max())
+    return moonConstraint(table, ras, decs, times, minSeparation, maxIllumination, maxAltitude)
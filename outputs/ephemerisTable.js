@@ -0,0 +1,209 @@
+/*
+  ephemerisTable.js
+
+  Renders the paged HTML reports written by reportSinks.PagedHTMLSink. The
+  events are not in the page itself: they are loaded from the report's
+  .data.js payloads (one for the whole window, or one per night or week),
+  each of which calls loadEphemerides() with its rows. Only one page of rows
+  is in the document at a time. Clicking a column header sorts all of the
+  events of the payload, and the filter box keeps the rows containing its
+  text, so tables with tens of thousands of events stay responsive.
+*/
+
+var ephemerisTable = {
+  settings: null,
+  rows: [],
+  shown: [],
+  index: {},
+  page: 0,
+  pageSize: 100,
+  sortKey: null,
+  sortDescending: false,
+  filter: '',
+
+  init: function(settings) {
+    this.settings = settings;
+    this.pageSize = settings.pageSize;
+    var html = '';
+    if (settings.parts.length > 1) {
+      html += 'Show: <select id="ephemerisPart" onchange="ephemerisTable.load(this.selectedIndex);">';
+      for (var i = 0; i < settings.parts.length; i++) {
+        html += '<option>' + this.escape(settings.parts[i].label) + ' (' + settings.parts[i].events + ' events)</option>';
+      }
+      html += '</select> &nbsp; ';
+    }
+    html += 'Filter: <input type="text" size="20" onkeyup="ephemerisTable.setFilter(this.value);" /> &nbsp; ';
+    html += 'Rows per page: <select onchange="ephemerisTable.setPageSize(parseInt(this.value, 10));">';
+    var sizes = [50, 100, 250, 1000];
+    for (var i = 0; i < sizes.length; i++) {
+      html += '<option' + (sizes[i] == this.pageSize ? ' selected="selected"' : '') + '>' + sizes[i] + '</option>';
+    }
+    html += '</select>';
+    document.getElementById('ephemerisControls').innerHTML = html;
+    if (settings.parts.length == 0) {
+      document.getElementById('ephemerisPages').innerHTML = 'No observable events.';
+      return;
+    }
+    this.load(0);
+  },
+
+  // Replace the loaded payload by part number `part`
+  load: function(part) {
+    var old = document.getElementById('ephemerisPayload');
+    if (old) old.parentNode.removeChild(old);
+    var script = document.createElement('script');
+    script.id = 'ephemerisPayload';
+    script.type = 'text/javascript';
+    script.src = this.settings.parts[part].file;
+    document.getElementsByTagName('head').item(0).appendChild(script);
+  },
+
+  receive: function(data) {
+    this.index = {};
+    for (var i = 0; i < data.columns.length; i++) this.index[data.columns[i]] = i;
+    this.rows = data.rows;
+    this.update();
+  },
+
+  value: function(row, key) {
+    return row[this.index[key]];
+  },
+
+  escape: function(text) {
+    return String(text).replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;').replace(/"/g, '&quot;');
+  },
+
+  pad: function(n) {
+    return (n < 10 ? '0' : '') + n;
+  },
+
+  // "07/<strong>10</strong>, 02:21" for a julian date, like timeConversion.datestringsHTML
+  date: function(jd) {
+    var d = new Date(Math.round((jd - 2440587.5)*86400000));
+    return this.pad(d.getUTCMonth() + 1) + '/<strong>' + this.pad(d.getUTCDate()) + '</strong>, ' +
+           this.pad(d.getUTCHours()) + ':' + this.pad(d.getUTCMinutes());
+  },
+
+  position: function(row, time) {
+    var jd = this.value(row, this.settings.localTime ? time + '_local' : time);
+    return this.date(jd) + '<br /> ' + this.value(row, time + '_altitude') + '&deg; ' + this.value(row, time + '_direction');
+  },
+
+  columns: function() {
+    var t = this, settings = this.settings, zone = settings.localTime ? 'LT' : 'UT';
+    var text = function(key) { return function(row) { return t.escape(t.value(row, key)); }; };
+    var columns = [
+      {key: 'planet', title: 'Planet<br /><span class="small">[Link: Orbit ref.]</span>',
+       render: function(row) { return '<a href="' + t.escape(t.value(row, 'orbit_reference')) + '">' + t.escape(t.value(row, 'planet')) + '</a>'; }},
+      {key: 'event', title: 'Event<br /><span class="small">[Transit/<br />Eclipse]</span>', render: text('event')},
+      {key: 'ingress', title: 'Ingress <br /><span class="small">(MM/DD<br />HH:MM (' + zone + '), Alt., Dir.)</span>',
+       render: function(row) { return t.position(row, 'ingress'); }},
+      {key: 'egress', title: 'Egress <br /><span class="small">(MM/DD<br />HH:MM (' + zone + '), Alt., Dir.)</span>',
+       render: function(row) { return t.position(row, 'egress'); }},
+      {key: 'magnitude', title: t.escape(settings.band), render: text('magnitude')},
+      {key: 'depth', title: 'Depth<br />(mag)', render: text('depth')},
+      {key: 'duration', title: 'Duration<br />(hrs)', render: text('duration')},
+      {key: 'ra', title: 'RA/Dec<br /><span class="small">[Link: Simbad ref.]</span>',
+       render: function(row) { return '<a href="' + t.escape(t.value(row, 'simbad')) + '">' + t.escape(t.value(row, 'ra')) + '<br />' + t.escape(t.value(row, 'dec')) + '</a>'; }},
+      {key: 'constellation', title: 'Const.', render: text('constellation')},
+      {key: 'mass', title: 'Mass<br />(M<sub>J</sub>)', render: text('mass')},
+      {key: 'radius', title: 'Radius<br />(R<sub>J</sub>)', render: text('radius')},
+      {key: 'reference_year', title: 'Ref. Year', render: text('reference_year')},
+      {key: 'conflicts', title: 'Overlaps', render: text('conflicts')},
+      {key: 'scheduled', title: 'Schedule', render: function(row) { return t.value(row, 'scheduled') ? 'yes' : '---'; }}
+    ];
+    if (settings.sampled) {
+      columns.push({key: 'observable_fraction', title: 'Observable<br />(%)',
+                    render: function(row) { return String(Math.round(100*t.value(row, 'observable_fraction'))); }});
+      columns.push({key: 'min_altitude', title: 'Min. Alt.<br />(deg)', render: text('min_altitude')});
+      columns.push({key: 'max_airmass', title: 'Max.<br />Airmass',
+                    render: function(row) { var airmass = t.value(row, 'max_airmass'); return airmass === null ? '---' : airmass.toFixed(2); }});
+    }
+    if (settings.localTime) {
+      columns.push({key: 'ingress', title: 'Ingress <br /><span class="small">(MM/DD<br />HH:MM (UT))</span>',
+                    render: function(row) { return t.date(t.value(row, 'ingress')); }});
+      columns.push({key: 'egress', title: 'Egress <br /><span class="small">(MM/DD<br />HH:MM, (UT))</span>',
+                    render: function(row) { return t.date(t.value(row, 'egress')); }});
+    }
+    return columns;
+  },
+
+  // Numbers sort before text, and numeric text such as "10.89" sorts as a number
+  sortValue: function(value) {
+    if (value === null || typeof value == 'number' || typeof value == 'boolean') return value === null ? -Infinity : Number(value);
+    var number = parseFloat(value);
+    return isNaN(number) ? value : number;
+  },
+
+  compare: function(a, b) {
+    if (typeof a == typeof b) return a < b ? -1 : (a > b ? 1 : 0);
+    return typeof a == 'number' ? -1 : 1;
+  },
+
+  update: function() {
+    var t = this, shown = [];
+    for (var i = 0; i < this.rows.length; i++) {
+      if (this.filter == '' || this.rows[i].join(' ').toLowerCase().indexOf(this.filter) >= 0) shown.push(i);
+    }
+    if (this.sortKey !== null) {
+      var column = this.index[this.sortKey], sign = this.sortDescending ? -1 : 1;
+      var keys = {};
+      for (var i = 0; i < shown.length; i++) keys[shown[i]] = this.sortValue(this.rows[shown[i]][column]);
+      shown.sort(function(a, b) { return sign*t.compare(keys[a], keys[b]) || a - b; });
+    }
+    this.shown = shown;
+    this.page = 0;
+    this.render();
+  },
+
+  render: function() {
+    var columns = this.columns();
+    var html = '<tr>';
+    for (var i = 0; i < columns.length; i++) {
+      var arrow = columns[i].key == this.sortKey ? (this.sortDescending ? ' &#x25B4;' : ' &#x25BE;') : '';
+      html += '<th style="cursor: pointer;" onclick="ephemerisTable.sortBy(\'' + columns[i].key + '\');">' + columns[i].title + arrow + '</th> ';
+    }
+    html += '</tr>';
+    var first = this.page*this.pageSize, last = Math.min(first + this.pageSize, this.shown.length);
+    for (var n = first; n < last; n++) {
+      var row = this.rows[this.shown[n]];
+      var cells = [];
+      for (var i = 0; i < columns.length; i++) cells.push(columns[i].render(row));
+      html += '<tr><td>' + cells.join('</td><td>') + '</td></tr>';
+    }
+    document.getElementById('eph').innerHTML = '<tbody>' + html + '</tbody>';
+
+    var pages = Math.max(Math.ceil(this.shown.length/this.pageSize), 1);
+    var pager = 'Events ' + (this.shown.length ? first + 1 : 0) + '-' + last + ' of ' + this.shown.length + ' &nbsp; ';
+    if (this.page > 0) pager += '<a href="#" onclick="ephemerisTable.goTo(' + (this.page - 1) + '); return false;">&laquo; Previous</a> ';
+    pager += 'Page ' + (this.page + 1) + ' of ' + pages;
+    if (this.page < pages - 1) pager += ' <a href="#" onclick="ephemerisTable.goTo(' + (this.page + 1) + '); return false;">Next &raquo;</a>';
+    document.getElementById('ephemerisPages').innerHTML = pager;
+  },
+
+  goTo: function(page) {
+    this.page = page;
+    this.render();
+  },
+
+  sortBy: function(key) {
+    this.sortDescending = (this.sortKey == key) ? !this.sortDescending : false;
+    this.sortKey = key;
+    this.update();
+  },
+
+  setFilter: function(text) {
+    this.filter = text.toLowerCase();
+    this.update();
+  },
+
+  setPageSize: function(size) {
+    this.pageSize = size;
+    this.page = 0;
+    this.render();
+  }
+};
+
+function loadEphemerides(data) {
+  ephemerisTable.receive(data);
+}
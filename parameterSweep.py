@@ -0,0 +1,108 @@
+'''
+Parameter sweeps: the observable events of a whole grid of selection and
+visibility limits from one computation.
+
+Exploring limits by editing mag_limit, depth_limit, band, min_horizon or
+twilight and rerunning repeats almost all of the work. A sweep evaluates the
+candidate events once, at the loosest limits of the grid, and keeps for each
+event that passes them the quantities that the limits test: its catalog row
+(for the host star magnitude and the transit depth, looked up with the
+catalog's targetIndex), the lower of the host star's altitudes at ingress and
+egress, and whether the Sun is below each twilight altitude of the grid at
+both ingress and egress (from the night table of that altitude). The events
+of each point of the grid are then a mask over those arrays, and are exactly
+the events of a run with its limits.
+'''
+import ephem	 ## PyEphem module
+import numpy as np
+import itertools
+
+from targetIndex import targetIndex
+
+sweepKeys = ['band', 'mag_limit', 'depth_limit', 'min_horizon', 'twilight']   ## Swept with sweep_<key> in the .par file
+sweepConverters = {'band': str, 'mag_limit': float, 'depth_limit': float, 'min_horizon': str, 'twilight': str}
+
+def sweepRequested(parameters):
+    '''True if the parameters of a .par file list values to sweep'''
+    return any('sweep_'+key in parameters for key in sweepKeys)
+
+def sweepGrid(parameters):
+    '''
+    Parameters
+    ----------
+    parameters : dict
+        Parameters of a .par file, as returned by `calculateEphemerides.readParFile`.
+        Each sweep_<key> is a comma-separated list of values of <key>, e.g.
+        ``sweep_mag_limit: 10, 11, 12``; the keys without a list keep their value.
+    Returns
+    -------
+    grid : list of dict
+        Values of `sweepKeys` at every point of the grid, varying the last
+        key fastest
+    '''
+    values = []
+    for key in sweepKeys:
+        if 'sweep_'+key in parameters:
+            values.append([sweepConverters[key](value.strip()) for value in parameters['sweep_'+key].split(',') if value.strip()])
+        else:
+            values.append([parameters[key]])
+    return [dict(zip(sweepKeys, point)) for point in itertools.product(*values)]
+
+def horizonDegrees(minHorizon):
+    '''Horizon limit (deg:min:sec string) in degrees'''
+    return np.degrees(float(ephem.degrees(minHorizon)))
+
+def loosestLimits(grid):
+    '''
+    The limits that pass every event that passes any point of `grid`: the
+    faintest magnitude, shallowest depth, lowest horizon and brightest twilight
+    '''
+    return {'mag_limit': max(point['mag_limit'] for point in grid),
+            'depth_limit': min(point['depth_limit'] for point in grid),
+            'min_horizon': min([point['min_horizon'] for point in grid], key=horizonDegrees),
+            'twilight': max([point['twilight'] for point in grid], key=float)}
+
+class SweepTable(object):
+    '''
+    Parameters
+    ----------
+    exoplanetDB : structured array
+        Compiled catalog
+    eventRows : array
+        Catalog row of each event observable at the loosest limits
+    altitudes : array
+        Altitude (degrees) of the host star at ingress and egress, shape (N, 2)
+    darkness : dict
+        For each twilight altitude of the grid (float, degrees), True for the
+        events with the Sun below it at both ingress and egress
+    '''
+    def __init__(self, exoplanetDB, eventRows, altitudes, darkness):
+        self.index = targetIndex(exoplanetDB)
+        self.eventRows = eventRows
+        self.minAltitudes = np.min(altitudes, axis=1) if len(altitudes) else np.zeros(0)
+        self.darkness = darkness
+
+    def mask(self, bandColumn, magLimit, depthLimit, minHorizon, twilight):
+        '''True for the events observable with the given limits, see `calculateEphemerides.observableEvents`'''
+        selected = self.index.select(bandColumn, magLimit, depthLimit)[self.eventRows]
+        return selected*(self.minAltitudes > horizonDegrees(minHorizon))*self.darkness[float(twilight)]
+
+def writeSummary(path, grid, counts):
+    '''
+    Save the number of events at each point of the grid as CSV
+
+    Parameters
+    ----------
+    path : str
+        Path of the CSV file
+    grid : list of dict
+        Points of the grid, from `sweepGrid`
+    counts : list of tuple
+        (events, transits, eclipses, planets) at each point
+    '''
+    summary = open(path, 'w')
+    summary.write('Sweep,Band,Mag limit,Depth limit,Min horizon,Twilight,Events,Transits,Eclipses,Planets\n')
+    for number, (point, pointCounts) in enumerate(zip(grid, counts)):
+        summary.write(','.join([str(number+1), point['band'], repr(point['mag_limit']), repr(point['depth_limit']),
+                                point['min_horizon'], point['twilight']] + map(str, pointCounts))+'\n')
+    summary.close()
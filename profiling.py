@@ -0,0 +1,123 @@
+'''
+Optional instrumentation of the stages of calculateEphemerides.
+
+A Profiler records the wall time of each stage (download, catalog, target
+selection, candidate events, twilight table, visibility tests, reports) and
+counters such as the number of planets kept, events generated, visibility
+checks, PyEphem calls and report rows. It can also run cProfile over the hot
+stages. The active profiler is thread-local, so concurrent calculations each
+keep their own numbers. When profiling is off, the module-level `stage` and
+`count` calls do nothing.
+
+Profiling is enabled by `profile: True` in the .par file, or by setting the
+environment variable TRANSITEPHEM_PROFILE=1; use the value `cprofile` in
+either place to also dump a cProfile of the hot stages.
+'''
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+environmentVariable = 'TRANSITEPHEM_PROFILE'
+
+_local = threading.local()
+
+class Profiler(object):
+    '''Timers and counters of one calculation'''
+    def __init__(self, enabled=True, cprofile=False):
+        self.enabled = enabled
+        self.stages = []
+        self.timers = {}
+        self.counters = {}
+        self.counterNames = []
+        self.cprofile = cProfile.Profile() if (enabled and cprofile) else None
+
+    @contextmanager
+    def stage(self, name, hot=False):
+        '''
+        Time the enclosed block as stage `name`, accumulating over repeated
+        entries. With cProfile on, `hot` stages are also profiled.
+        '''
+        if not self.enabled:
+            yield
+            return
+        if name not in self.timers:
+            self.stages.append(name)
+            self.timers[name] = 0.0
+        profileHot = hot and self.cprofile is not None
+        startTime = time.time()
+        if profileHot: self.cprofile.enable()
+        try:
+            yield
+        finally:
+            if profileHot: self.cprofile.disable()
+            self.timers[name] += time.time() - startTime
+
+    def count(self, name, n=1):
+        '''Add `n` to the counter `name`'''
+        if not self.enabled:
+            return
+        if name not in self.counters:
+            self.counterNames.append(name)
+            self.counters[name] = 0
+        self.counters[name] += int(n)
+
+    def summary(self):
+        '''Timers (s) and counters in the order they were first recorded'''
+        return {'stages': [{'name': name, 'seconds': self.timers[name]} for name in self.stages],
+                'total_seconds': sum(self.timers.values()),
+                'counters': [{'name': name, 'count': self.counters[name]} for name in self.counterNames]}
+
+    def save(self, path):
+        '''
+        Write the summary as JSON to `path` and, if cProfile is on, the
+        cProfile statistics (for pstats) to the same path with extension .prof
+        '''
+        output = open(path, 'w')
+        json.dump(self.summary(), output, indent=2)
+        output.close()
+        if self.cprofile is not None:
+            self.cprofile.dump_stats(os.path.splitext(path)[0]+'.prof')
+
+_disabled = Profiler(enabled=False)
+
+def profilerSettings(value=None):
+    '''
+    Parameters
+    ----------
+    value : str or None
+        Value of the `profile` parameter: True/False or cprofile
+    Returns
+    -------
+    enabled, cprofile : bool
+        Whether to profile, from the parameter or the TRANSITEPHEM_PROFILE
+        environment variable, and whether to run cProfile as well
+    '''
+    settings = [str(setting).strip().lower() for setting in [value, os.environ.get(environmentVariable)]]
+    cprofile = 'cprofile' in settings
+    enabled = cprofile or any(setting in ['true','1','yes','on'] for setting in settings)
+    return enabled, cprofile
+
+def activeProfiler():
+    '''The profiler of the calculation running in this thread, or a disabled one'''
+    return getattr(_local, 'profiler', _disabled)
+
+@contextmanager
+def profiling(profiler):
+    '''Make `profiler` the active profiler of this thread within the block'''
+    previous = activeProfiler()
+    _local.profiler = profiler
+    try:
+        yield profiler
+    finally:
+        _local.profiler = previous
+
+def stage(name, hot=False):
+    '''Time a stage with the active profiler, see `Profiler.stage`'''
+    return activeProfiler().stage(name, hot)
+
+def count(name, n=1):
+    '''Add to a counter of the active profiler'''
+    activeProfiler().count(name, n)
@@ -0,0 +1,93 @@
+'''
+Command-line queries of the persistent event index (see eventIndex.py), which
+runs with `event_index: True` in the .par file keep up to date. The answers
+come from binary searches of the memory-mapped index, without recomputing
+anything.
+
+Usage:
+    $ python queryEvents.py next
+        The next observable event
+    $ python queryEvents.py next --after 2015-07-12 --count 5 --planet "WASP-12 b"
+        The next five events of WASP-12 b after 2015-07-12 0h UT
+    $ python queryEvents.py between 2015-07-12T03:00 2015-07-12T06:00
+        The events in progress at any time between 3h and 6h UT on 2015-07-12
+    $ python queryEvents.py planets
+        The planets in the index and their numbers of events
+
+Times are UT, formatted as YYYY-MM-DD, YYYY-MM-DDTHH:MM or YYYY-MM-DDTHH:MM:SS,
+or julian dates. --index selects the index of another report, e.g.
+outputs/eventReport_apo_index for a batch run (default: outputs/eventReport_index).
+'''
+import argparse
+import os
+import sys
+
+from eventIndex import EventIndex
+from timeConversion import julianDate, currentJulianDate, datestrings
+
+def formatEvents(events, csv=False):
+    '''Lines of a table (or CSV rows) of the events from `EventIndex.after` or `EventIndex.between`'''
+    header = ['Planet', 'Event', 'Ingress (UT)', 'Alt', 'Dir', 'Egress (UT)', 'Alt', 'Dir', 'Scheduled']
+    ingress, egress = datestrings(events['ingress']), datestrings(events['egress'])
+    rows = [[event['planet'], event['event'], ingressTime, '%.0f' % event['ingress_altitude'], event['ingress_direction'],
+             egressTime, '%.0f' % event['egress_altitude'], event['egress_direction'], 'yes' if event['scheduled'] else 'no']
+            for event, ingressTime, egressTime in zip(events, ingress, egress)]
+    if csv:
+        return [','.join(row) for row in [header] + rows]
+    widths = [max(len(row[column]) for row in [header] + rows) for column in range(len(header))]
+    return ['  '.join(value.ljust(width) for value, width in zip(row, widths)).rstrip() for row in [header] + rows]
+
+def coverageNote(index, times):
+    '''A note if any of the julian dates `times` falls outside the windows held by the index'''
+    outside = [time for time in times if not index.covered(time)]
+    if not outside:
+        return None
+    windows = ', '.join('%s - %s' % tuple(datestrings(window)) for window in index.description['windows']) or 'none'
+    return 'Note: %s is outside the windows computed in the index (%s); events there are missing.' % \
+           (datestrings(outside[:1])[0], windows)
+
+if __name__ == '__main__':
+    options = argparse.ArgumentParser(add_help=False)
+    options.add_argument('--index', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'outputs', 'eventReport_index'),
+                         help='directory of the event index')
+    options.add_argument('--csv', action='store_true', help='print CSV rows instead of a table')
+    parser = argparse.ArgumentParser(description='Query the persistent event index')
+    commands = parser.add_subparsers(dest='command')
+    nextParser = commands.add_parser('next', parents=[options], help='the next events')
+    nextParser.add_argument('--after', default=None, help='start of the search (UT, default: now)')
+    nextParser.add_argument('--count', type=int, default=1, help='number of events')
+    nextParser.add_argument('--planet', default=None, help='only the events of this planet')
+    betweenParser = commands.add_parser('between', parents=[options], help='the events in progress between two times')
+    betweenParser.add_argument('start', help='start of the interval (UT)')
+    betweenParser.add_argument('end', help='end of the interval (UT)')
+    betweenParser.add_argument('--planet', default=None, help='only the events of this planet')
+    commands.add_parser('planets', parents=[options], help='the planets in the index')
+    args = parser.parse_args()
+
+    index = EventIndex(args.index)
+    if index.empty():
+        sys.exit('No event index in %s: run transitephem.py with event_index: True' % args.index)
+    try:
+        if args.command == 'next':
+            after = julianDate(args.after) if args.after is not None else currentJulianDate()
+            events, times = index.after(after, args.count, args.planet), [after]
+            if len(events) < args.count:
+                times.append(index.description['windows'][-1][1])   ## Ran out of events at the end of the index
+        elif args.command == 'between':
+            start, end = julianDate(args.start), julianDate(args.end)
+            events, times = index.between(start, end, args.planet), [start, end]
+    except ValueError, error:
+        sys.exit(str(error))
+
+    if args.command == 'planets':
+        names, counts = index.planets()
+        for name, number in zip(names, counts):
+            print '%s,%i' % (name, number) if args.csv else '%-30s %i' % (name, number)
+    else:
+        if args.planet is not None and not index.hasPlanet(args.planet):
+            sys.exit("No events of '%s' in the index; `python queryEvents.py planets` lists the planets" % args.planet)
+        for line in formatEvents(events, args.csv):
+            print line
+        note = coverageNote(index, times)
+        if note is not None:
+            print >> sys.stderr, note
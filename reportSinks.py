@@ -0,0 +1,562 @@
+'''
+Report writers ("sinks") that consume the time-ordered stream of events from
+eventStream in a single pass. Each sink receives the events in batches, so
+the ingress and egress times of a batch are converted to strings together,
+and writes its rows as it goes, so the sinks hold no more than a batch. The
+stream itself is read from the structured array of the events of the window
+(see eventStream.eventArray), so the memory of long windows is bounded by
+computing them in chunks, with `chunk_days` in the .par file.
+
+New output formats are added by subclassing ReportSink and passing an
+instance to writeReports along with the others.
+'''
+import numpy as np
+import gzip
+import json
+import os
+import shutil
+
+from columnStore import ColumnWriter
+from eventIndex import EventIndex
+from eventStream import Event, batches
+from profiling import count
+from timeConversion import jd2gdArray, utcOffsets, datestrings, datestringsCSV, datestringsHTML, datestringsHTML_LT
+
+splitOptions = ['none','night','week']
+
+def trunc(f, n):
+    '''Truncates a float f to n decimal places without rounding'''
+    slen = len('%.*f' % (n, f))
+    return str(f)[:slen]
+
+class ReportFields(object):
+    '''Report-formatted catalog fields of the planet in a given catalog row'''
+    def __init__(self, exoplanetDB, bandColumn):
+        self.exoplanetDB = exoplanetDB
+        self.bandColumn = bandColumn
+
+    def numericField(self, row, column):
+        '''Catalog value as a float, or 0.0 if the field is empty'''
+        value = self.exoplanetDB[column][row]
+        if np.isnan(value): return 0.0
+        else: return float(value)
+
+    def RA(self, row):
+        '''Type: str, Units:  hours:min:sec'''
+        return self.exoplanetDB['RA_STRING'][row]
+    def dec(self, row):
+        '''Type: str, Units:  deg:min:sec'''
+        return self.exoplanetDB['DEC_STRING'][row]
+    def duration(self, row):
+        '''Transit/eclipse duration. Units:  days'''
+        return self.numericField(row,'T14')
+    def bandMagnitude(self, row):
+        return self.numericField(row,self.bandColumn)
+    def depth(self, row):
+        '''Transit depth'''
+        return self.numericField(row,'DEPTH')
+
+    def simbadURL(self, row):
+        if self.exoplanetDB['SIMBADURL'][row] == '': return 'http://simbad.harvard.edu/simbad/'
+        else: return self.exoplanetDB['SIMBADURL'][row]
+
+    def RADecHTML(self, row):
+        return '<a href="'+self.simbadURL(row)+'">'+self.RA(row).split('.')[0]+'<br />'+self.dec(row).split('.')[0]+'</a>'
+
+    def constellation(self, row):
+        return self.exoplanetDB['CONSTELLATION'][row]
+
+    def orbitReference(self, row):
+        return self.exoplanetDB['TRANSITURL'][row]
+
+    def orbitReferenceYear(self, row):
+        '''ORBREF returns the citation in the format "<first author> <year>", so parse and return just the year'''
+        return self.exoplanetDB['ORBREF'][row].split()[1]
+
+    def nameWithLink(self, row):
+        return '<a href="'+self.orbitReference(row)+'">'+self.exoplanetDB['NAME'][row]+'</a>'
+
+    def mass(self, row):
+        if self.numericField(row,'MASS') == 0.0: return '---'
+        else: return trunc(self.numericField(row,'MASS'),2)
+
+    def semimajorAxis(self, row):
+        return trunc(self.numericField(row,'SEP'),3)
+
+    def radius(self, row):
+        if self.numericField(row,'R') == 0.0: return '---'
+        else: return trunc(self.numericField(row,'R'),2)
+
+class ReportSink(object):
+    '''Base class of the report writers'''
+    diagnostics = {}
+
+    def open(self, path):
+        '''Open the report file at `path`, or write to `path` itself if it is a file-like object'''
+        self.ownsReport = not hasattr(path, 'write')
+        if self.ownsReport: self.report = open(path,'w')
+        else: self.report = path
+
+    def write(self, events):
+        '''Write a batch (list) of events, which arrive in order of ingress time'''
+        raise NotImplementedError
+
+    def summarize(self, diagnostics):
+        '''
+        Note the diagnostics of the run (dict of name: number, e.g. the events 
+        decided by each tier of the visibility test) in the report metadata, 
+        before it is closed
+        '''
+        self.diagnostics = dict(diagnostics)
+
+    def close(self):
+        '''Finish the report once the stream is exhausted'''
+        if self.ownsReport: self.report.close()
+
+def writeReports(events, sinks, batchSize=1000, close=True):
+    '''
+    Feed a stream of events to every sink in batches of `batchSize`, in a
+    single pass, then close the sinks unless more streams are to follow
+    (`close` = False).
+    '''
+    for batch in batches(events, batchSize):
+        for sink in sinks:
+            sink.write(batch)
+    if close:
+        for sink in sinks:
+            sink.close()
+
+def htmlHeader(observatoryName, start, end, script):
+    '''Head of the HTML reports, up to the color scheme toggle, loading the JavaScript file `script`'''
+    return '\n'.join([
+                      '<!doctype html>',\
+                      '<html>',\
+                      '	<head>',\
+                      '		<meta http-equiv="content-type" content="text/html; charset=UTF-8" />',\
+                      '		<title>Ephemeris</title>',\
+                      '		<link rel="stylesheet" href="stylesheetEphem.css" type="text/css" />',\
+                      '		 <script type="text/javascript">',\
+                      '		  function changeCSS(cssFile, cssLinkIndex) {',\
+                      '			var oldlink = document.getElementsByTagName("link").item(cssLinkIndex);',\
+                      '			var newlink = document.createElement("link")',\
+                      '			newlink.setAttribute("rel", "stylesheet");',\
+                      '			newlink.setAttribute("type", "text/css");',\
+                      '			newlink.setAttribute("href", cssFile);',\
+
+                      '			document.getElementsByTagName("head").item(0).replaceChild(newlink, oldlink);',\
+                      '		  }',\
+                      '		</script>',\
+                      '	   <script src="'+script+'"></script>',\
+                      '	</head>',\
+                      '	<body>',\
+                      '		<div id="textDiv">',\
+                      '		<h1>Ephemerides for: '+observatoryName+'</h1>',\
+                      '		<h2>Observing dates (UT): '+datestrings([start])[0].split(' ')[0]+' - '+datestrings([end])[0].split(' ')[0]+'</h2>'
+                      '	   Click the column headers to sort. ',\
+                      '		<table class="daynight" id="eph">',\
+                      '		<tr><th colspan=2>Toggle Color Scheme</th></tr>',\
+                      '		<tr><td><a href="#" onclick="changeCSS(\'stylesheetEphem.css\', 0);">Day</a></td><td><a href="#" onclick="changeCSS(\'stylesheetEphemDark.css\', 0);">Night</a></td></tr>',\
+                      '		</table>'])
+
+def htmlFooter():
+    '''Credits and closing tags of the HTML reports'''
+    return '\n'.join([
+                      '\n		<p class="headinfo">',\
+                      '		Developed by Brett Morris with great gratitude for the help of <a href="http://rhodesmill.org/pyephem/">PyEphem</a>,<br/>',\
+                      '		and for up-to-date exoplanet parameters from <a href="http://www.exoplanets.org/">exoplanets.org</a> (<a href="http://adsabs.harvard.edu/abs/2011PASP..123..412W">Wright et al. 2011</a>).<br />',\
+                      '		</p>',\
+                      '		</div>',\
+                      '	</body>',\
+                      '</html>'])
+
+def diagnosticsNote(diagnostics):
+    '''Paragraph of the HTML reports listing the diagnostics of the run, or nothing if there are none'''
+    if not diagnostics: return ''
+    return '\n'.join([
+                      '\n		<p class="headinfo">',\
+                      '		'+', '.join('%s: %i' % (name[0].upper()+name[1:], diagnostics[name]) for name in sorted(diagnostics))+'.',\
+                      '		</p>'])
+
+def altitudeStrings(altitudes):
+    '''Whole degrees of altitude, truncated like the sexagesimal degrees PyEphem prints'''
+    return ['%d' % altitude for altitude in altitudes]
+
+def airmassString(airmass):
+    '''Airmass to two decimal places, or --- if the event is never observable'''
+    if np.isnan(airmass): return '---'
+    else: return '%.2f' % airmass
+
+def scheduleCell(event):
+    '''HTML table cell marking the events in the best observing schedule'''
+    if event.scheduled: return 'yes'
+    else: return '---'
+
+class CSVSink(ReportSink):
+    '''eventReport.csv: one row per event, with the sampling columns if `sampled`'''
+    def __init__(self, path, fields, sampled=False):
+        self.fields = fields
+        self.sampled = sampled
+        self.open(path)
+        firstLine = 'Planet,Event,Ingress Date, Ingress Time (UT) ,Altitude at Ingress,Azimuth at Ingress,Egress Date, Egress Time (UT) ,Altitude at Egress,Azimuth at Egress,'+fields.bandColumn+' mag,Depth,Duration,RA,Dec,Const.,Mass,Semimajor Axis (AU),Radius (R_J),Conflicts,Scheduled'
+        if sampled:
+            firstLine += ',Observable Fraction,Min Altitude,Max Airmass'
+        self.report.write(firstLine+'\n')
+
+    def write(self, events):
+        fields = self.fields
+        ingressCSV = datestringsCSV([event.ingress for event in events])
+        egressCSV = datestringsCSV([event.egress for event in events])
+        ingressAlts = altitudeStrings([event.ingressAlt for event in events])
+        egressAlts = altitudeStrings([event.egressAlt for event in events])
+        for i, event in enumerate(events):
+            row = event.row
+            middle = ','.join([event.planet,str(event.eventType),ingressCSV[i],ingressAlts[i],event.ingressDir,\
+                               egressCSV[i],egressAlts[i],event.egressDir,trunc(fields.bandMagnitude(row),2),\
+                               trunc(fields.depth(row),4),trunc(24.0*fields.duration(row),2),fields.RA(row),fields.dec(row),fields.constellation(row),\
+                               fields.mass(row),fields.semimajorAxis(row),fields.radius(row),str(event.conflicts),str(bool(event.scheduled))])
+            if self.sampled:
+                middle += ','+','.join(['%.2f' % event.fraction,'%d' % event.minAltitude,airmassString(event.maxAirmass)])
+            self.report.write(middle+'\n')
+        count('CSV rows written',len(events))
+
+class HTMLSink(ReportSink):
+    '''eventReport.html: a sortable table with one row per event, with the sampling columns if `sampled`'''
+    def __init__(self, path, fields, observatoryName, band, start, end, show_lt=0, timezone=None, sampled=False):
+        self.fields = fields
+        self.show_lt = show_lt
+        self.timezone = timezone
+        self.sampled = sampled
+        self.open(path)
+        ## http://www.kryogenix.org/code/browser/sorttable/
+        htmlheader = htmlHeader(observatoryName, start, end, './sorttable.js')
+
+        if sampled: sampleHeader = ' <th>Observable<br />(%)</th> <th>Min. Alt.<br />(deg)</th> <th>Max.<br />Airmass</th>'
+        else: sampleHeader = ''
+        if show_lt == 0:
+            tableheader = '\n'.join([
+                                     '\n		<table class="sortable" id="eph">',\
+                                     '		<tr> <th>Planet<br /><span class="small">[Link: Orbit ref.]</span></th>	  <th>Event<br /><span class="small">[Transit/<br />Eclipse]</span></th>	<th>Ingress <br /><span class="small">(MM/DD<br />HH:MM, UT)</span></th> <th>Egress <br /><span class="small">(MM/DD<br />HH:MM, (UT), Alt., Dir.)</span></th>'+\
+                                     '<th>'+band.upper()+'</th> <th>Depth<br />(mag)</th> <th>Duration<br />(hrs)</th> <th>RA/Dec<br /><span class="small">[Link: Simbad ref.]</span></th> <th>Const.</th> <th>Mass<br />(M<sub>J</sub>)</th>'+\
+                                     '<th>Radius<br />(R<sub>J</sub>)</th> <th>Ref. Year</th> <th>Overlaps</th> <th>Schedule</th>'+sampleHeader+'</tr>'])
+        else:
+            tableheader = '\n'.join([
+                                     '\n        <table class="sortable" id="eph">',\
+                                     '        <tr> <th>Planet<br /><span class="small">[Link: Orbit ref.]</span></th>      <th>Event<br /><span class="small">[Transit/<br />Eclipse]</span></th> <th>Ingress <br /><span class="small">(MM/DD<br />HH:MM (LT), Alt., Dir.)</span></th> <th>Egress <br /><span class="small">(MM/DD<br />HH:MM (LT), Alt., Dir.)</span></th>   '+\
+                                     '<th>'+band.upper()+'</th> <th>Depth<br />(mag)</th> <th>Duration<br />(hrs)</th> <th>RA/Dec<br /><span class="small">[Link: Simbad ref.]</span></th> <th>Const.</th> <th>Mass<br />(M<sub>J</sub>)</th>'+\
+                                     ' <th>Radius<br />(R<sub>J</sub>)</th> <th>Ref. Year</th> <th>Overlaps</th> <th>Schedule</th>'+sampleHeader+' <th>Ingress <br /><span class="small">(MM/DD<br />HH:MM (UT))</span></th> <th>Egress <br /><span class="small">(MM/DD<br />HH:MM, (UT))</span></th></tr>'])
+        self.report.write(htmlheader)
+        self.report.write(tableheader)
+
+    def write(self, events):
+        fields = self.fields
+        ingressTimes = np.array([event.ingress for event in events])
+        egressTimes = np.array([event.egress for event in events])
+        ingressAlts = altitudeStrings([event.ingressAlt for event in events])
+        egressAlts = altitudeStrings([event.egressAlt for event in events])
+        if self.show_lt != 0:
+            ingressCells = datestringsHTML_LT(ingressTimes,ingressAlts,[event.ingressDir for event in events],self.timezone)
+            egressCells = datestringsHTML_LT(egressTimes,egressAlts,[event.egressDir for event in events],self.timezone)
+            ingressUT, egressUT = datestringsHTML(ingressTimes), datestringsHTML(egressTimes)
+        else:
+            ingressCells = datestringsHTML(ingressTimes,ingressAlts,[event.ingressDir for event in events])
+            egressCells = datestringsHTML(egressTimes,egressAlts,[event.egressDir for event in events])
+
+        indentation = '		'
+        for i, event in enumerate(events):
+            row = event.row
+            if event.eventType == 'transit': depth = trunc(fields.depth(row),4)
+            else: depth = '---'
+            cells = [fields.nameWithLink(row),str(event.eventType),ingressCells[i],egressCells[i],trunc(fields.bandMagnitude(row),2),\
+                     depth,trunc(24.0*fields.duration(row),2),fields.RADecHTML(row),fields.constellation(row),\
+                     fields.mass(row),fields.radius(row),fields.orbitReferenceYear(row),str(event.conflicts),scheduleCell(event)]
+            if self.sampled:
+                cells += ['%d' % round(100*event.fraction),'%d' % event.minAltitude,airmassString(event.maxAirmass)]
+            if self.show_lt != 0:
+                cells += [ingressUT[i],egressUT[i]]
+            self.report.write(indentation+'<tr><td>'+'</td><td>'.join(cells)+'</td></tr>\n')
+        count('HTML rows written',len(events))
+
+    def close(self):
+        tablefooter = '\n'.join([
+                                 '\n		</table>',\
+                                 '		<br /><br />',])
+        self.report.write(tablefooter)
+        self.report.write(diagnosticsNote(self.diagnostics))
+        self.report.write(htmlFooter())
+        ReportSink.close(self)
+
+class JSONSink(ReportSink):
+    '''A JSON array with one object per event, for programs rather than people'''
+    def __init__(self, path, fields, sampled=False):
+        self.fields = fields
+        self.sampled = sampled
+        self.open(path)
+        self.report.write('[')
+        self.separator = '\n'
+
+    def write(self, events):
+        fields = self.fields
+        ingressStrings = datestrings([event.ingress for event in events])
+        egressStrings = datestrings([event.egress for event in events])
+        for i, event in enumerate(events):
+            row = event.row
+            record = {'planet': event.planet, 'event': str(event.eventType),
+                      'ingress': ingressStrings[i], 'egress': egressStrings[i],
+                      'ingress_jd': float(event.ingress), 'egress_jd': float(event.egress),
+                      'ingress_altitude': int(event.ingressAlt), 'ingress_direction': event.ingressDir,
+                      'egress_altitude': int(event.egressAlt), 'egress_direction': event.egressDir,
+                      'magnitude': fields.bandMagnitude(row), 'band': fields.bandColumn, 'depth': fields.depth(row),
+                      'duration_hours': 24.0*fields.duration(row), 'ra': fields.RA(row), 'dec': fields.dec(row),
+                      'constellation': fields.constellation(row), 'mass': fields.numericField(row,'MASS'),
+                      'semimajor_axis': fields.numericField(row,'SEP'), 'radius': fields.numericField(row,'R'),
+                      'reference': fields.orbitReference(row), 'simbad': fields.simbadURL(row),
+                      'conflicts': int(event.conflicts), 'scheduled': bool(event.scheduled)}
+            if self.sampled:
+                record.update({'observable_fraction': float(event.fraction), 'min_altitude': float(event.minAltitude),
+                               'max_airmass': None if np.isnan(event.maxAirmass) else float(event.maxAirmass)})
+            self.report.write(self.separator+json.dumps(record, sort_keys=True))
+            self.separator = ',\n'
+        count('JSON rows written',len(events))
+
+    def close(self):
+        self.report.write('\n]\n')
+        ReportSink.close(self)
+
+class ColumnSink(ReportSink):
+    '''
+    A columnar binary table of the events (see columnStore.py), for analysis
+    pipelines. The events table holds the julian dates, altitudes and azimuths
+    of each event at full precision; the catalog fields of the planets are
+    stored once per planet, in the planets/ table, which the `planet` column
+    of the events indexes. Missing catalog values are NaN. Later stages can
+    memory-map both tables.
+    '''
+    planetColumns = [('period', 'PER', 'days'), ('tt', 'TT', 'JD'), ('duration', 'T14', 'days'), ('depth', 'DEPTH', ''),
+                     ('ra', 'RA_RAD', 'rad (J2000)'), ('dec', 'DEC_RAD', 'rad (J2000)'), ('mass', 'MASS', 'M_J'),
+                     ('radius', 'R', 'R_J'), ('semimajor_axis', 'SEP', 'AU')]
+
+    def __init__(self, path, fields, observatoryName, band, start, end, sampled=False):
+        self.fields = fields
+        self.path = path
+        self.sampled = sampled
+        self.metadata = {'observatory': observatoryName, 'band': band, 'start': start, 'end': end}
+        columns = [('planet', np.int32, 'row of planets/'), ('event', 'S7', ''),
+                   ('ingress', np.float64, 'JD (UT)'), ('egress', np.float64, 'JD (UT)'),
+                   ('ingress_altitude', np.float64, 'deg'), ('ingress_azimuth', np.float64, 'deg'), ('ingress_direction', 'S2', ''),
+                   ('egress_altitude', np.float64, 'deg'), ('egress_azimuth', np.float64, 'deg'), ('egress_direction', 'S2', ''),
+                   ('conflicts', np.int32, ''), ('scheduled', bool, '')]
+        if sampled:
+            columns += [('observable_fraction', np.float64, ''), ('min_altitude', np.float64, 'deg'), ('max_airmass', np.float64, '')]
+        self.writer = ColumnWriter(path, columns, self.metadata)
+        self.planetRows = []      ## Catalog row of each planet, in order of first event
+        self.planetIndex = {}
+
+    def write(self, events):
+        values = dict(zip(Event._fields, [np.array(column) for column in zip(*events)]))
+        for row in values['row']:
+            if row not in self.planetIndex:
+                self.planetIndex[row] = len(self.planetRows)
+                self.planetRows.append(row)
+        columns = {'planet': [self.planetIndex[row] for row in values['row']], 'event': values['eventType'],
+                   'ingress': values['midEvent'] - values['halfDuration'], 'egress': values['midEvent'] + values['halfDuration'],
+                   'ingress_altitude': values['ingressAlt'], 'ingress_azimuth': values['ingressAz'], 'ingress_direction': values['ingressDir'],
+                   'egress_altitude': values['egressAlt'], 'egress_azimuth': values['egressAz'], 'egress_direction': values['egressDir'],
+                   'conflicts': values['conflicts'], 'scheduled': values['scheduled']}
+        if self.sampled:
+            columns.update({'observable_fraction': values['fraction'], 'min_altitude': values['minAltitude'],
+                            'max_airmass': values['maxAirmass']})
+        self.writer.append(columns)
+        count('binary rows written',len(events))
+
+    def close(self):
+        '''Finish the events table, with the diagnostics of the run in its metadata, then write the catalog fields of its planets'''
+        if self.diagnostics:
+            self.metadata['diagnostics'] = self.diagnostics
+        self.writer.close()
+        exoplanetDB = self.fields.exoplanetDB
+        rows = np.array(self.planetRows, dtype=np.int64)
+        columns = [('row', np.int64, 'catalog row'), ('name', exoplanetDB['NAME'].dtype, ''),
+                   ('magnitude', np.float64, self.fields.bandColumn+' mag')]
+        columns += [(name, np.float64, unit) for name, catalogColumn, unit in self.planetColumns]
+        columns += [('constellation', 'S3', '')]
+        values = {'row': rows, 'name': exoplanetDB['NAME'][rows], 'magnitude': exoplanetDB[self.fields.bandColumn][rows],
+                  'constellation': exoplanetDB['CONSTELLATION'][rows]}
+        for name, catalogColumn, unit in self.planetColumns:
+            values[name] = exoplanetDB[catalogColumn][rows]
+        planets = ColumnWriter(os.path.join(self.path, 'planets'), columns, self.metadata)
+        planets.append(values)
+        planets.close()
+
+class IndexSink(ReportSink):
+    '''
+    Adds the events to the persistent event index at `path` (see
+    eventIndex.py), as segments of up to `segmentRows` events written as the
+    events arrive, so the sink holds at most `segmentRows` events.
+    When the stream is closed, the events replace those the index held for
+    the window `start` to `end`. `settings` are the parameters of the run,
+    from `eventIndex.indexSettings`.
+    '''
+    def __init__(self, path, start, end, settings, segmentRows=100000):
+        self.index = EventIndex(path)
+        self.index.startRun()
+        self.window = (start, end)
+        self.settings = settings
+        self.segmentRows = segmentRows
+        self.batches = []
+        self.rows = 0
+
+    def write(self, events):
+        values = dict(zip(Event._fields, [np.array(column) for column in zip(*events)]))
+        self.batches.append({'ingress': values['midEvent'] - values['halfDuration'], 'egress': values['midEvent'] + values['halfDuration'],
+                             'mid_event': values['midEvent'], 'planet': values['planet'], 'event': values['eventType'],
+                             'ingress_altitude': values['ingressAlt'], 'ingress_azimuth': values['ingressAz'],
+                             'ingress_direction': values['ingressDir'], 'egress_altitude': values['egressAlt'],
+                             'egress_azimuth': values['egressAz'], 'egress_direction': values['egressDir'],
+                             'conflicts': values['conflicts'], 'scheduled': values['scheduled'],
+                             'observable_fraction': values['fraction'], 'min_altitude': values['minAltitude'],
+                             'max_airmass': values['maxAirmass']})
+        self.rows += len(events)
+        count('index rows written',len(events))
+        if self.rows >= self.segmentRows:
+            self.flush()
+
+    def flush(self):
+        '''Write the events received since the last segment as a new segment'''
+        if self.batches:
+            self.index.addSegment(dict((name, np.concatenate([batch[name] for batch in self.batches])) for name in self.batches[0]))
+        self.batches = []
+        self.rows = 0
+
+    def close(self):
+        self.flush()
+        self.index.finishRun(self.window[0], self.window[1], self.settings)
+
+class PagedHTMLSink(ReportSink):
+    '''
+    eventReport.html as a page that separates the events from their
+    presentation: the events are written as they arrive to JavaScript payloads
+    next to the page (<report>.data.js, or <report>_<YYYY-MM-DD>.data.js for
+    each night or week if `split` is 'night' or 'week'), and the page shows
+    them a page at a time, sorted and filtered in the browser, with
+    ephemerisTable.js. The payloads can also be saved gzip-compressed
+    (`gzipPayload`), for web servers that serve precompressed files.
+    `noonOffset` is the fraction of a day from UT noon to local mean noon at
+    the site, where one night ends and the next begins.
+    '''
+    columns = ['planet','orbit_reference','event','ingress','ingress_altitude','ingress_direction',
+               'egress','egress_altitude','egress_direction','magnitude','depth','duration','ra','dec','simbad',
+               'constellation','mass','radius','reference_year','conflicts','scheduled']
+    sampleColumns = ['observable_fraction','min_altitude','max_airmass']
+    localColumns = ['ingress_local','egress_local']
+
+    def __init__(self, path, fields, observatoryName, band, start, end, show_lt=0, timezone=None, sampled=False,
+                 split='none', noonOffset=0.0, gzipPayload=False, pageSize=100):
+        if split not in splitOptions:
+            raise ValueError("Unknown html_split '%s', expected one of: %s" % (split, ', '.join(splitOptions)))
+        self.fields = fields
+        self.path = path
+        self.title = (observatoryName, band, start, end)
+        self.show_lt = show_lt
+        self.timezone = timezone
+        self.sampled = sampled
+        self.split = split
+        self.noonOffset = noonOffset
+        self.firstNight = np.floor(start + noonOffset)
+        self.gzipPayload = gzipPayload
+        self.pageSize = pageSize
+        self.columnNames = self.columns + self.sampleColumns*bool(sampled) + self.localColumns*bool(show_lt)
+        self.parts = []        ## Label, file name and number of events of each payload
+        self.payload = None
+        self.partKey = None
+
+    def partKeys(self, ingressTimes):
+        '''Julian day number of the local noon before the night (or week) of each ingress time'''
+        if self.split == 'none':
+            return np.zeros(len(ingressTimes))
+        nights = np.floor(ingressTimes + self.noonOffset)
+        if self.split == 'week':
+            nights = self.firstNight + 7*np.floor((nights - self.firstNight)/7)
+        return nights
+
+    def startPart(self, key):
+        '''Finish the current payload and start the one of the night or week `key`'''
+        self.finishPart()
+        name = os.path.splitext(os.path.basename(self.path))[0]
+        if self.split == 'none':
+            label, fileName = 'all', name+'.data.js'
+        else:
+            year, month, day = [int(values[0]) for values in jd2gdArray([key])[:3]]
+            date = '%04i-%02i-%02i' % (year, month, day)
+            label = {'night': 'night of ', 'week': 'week of '}[self.split]+date
+            fileName = name+'_'+date+'.data.js'
+        self.payload = open(os.path.join(os.path.dirname(self.path), fileName), 'w')
+        self.payload.write('loadEphemerides({"part": %s, "columns": %s, "rows": [' % (json.dumps(label), json.dumps(self.columnNames)))
+        self.separator = '\n'
+        self.parts.append({'label': label, 'file': fileName, 'events': 0})
+        self.partKey = key
+
+    def finishPart(self):
+        '''Close the current payload, and save a gzip-compressed copy if requested'''
+        if self.payload is None:
+            return
+        self.payload.write('\n]});\n')
+        self.payload.close()
+        if self.gzipPayload:
+            payloadFile = open(self.payload.name, 'rb')
+            compressed = gzip.open(self.payload.name+'.gz', 'wb')
+            shutil.copyfileobj(payloadFile, compressed)
+            compressed.close()
+            payloadFile.close()
+        self.payload = None
+
+    def write(self, events):
+        fields = self.fields
+        ingressTimes = np.array([event.ingress for event in events])
+        egressTimes = np.array([event.egress for event in events])
+        keys = self.partKeys(ingressTimes)
+        if self.show_lt != 0:
+            ingressLocal = ingressTimes + utcOffsets(ingressTimes, self.timezone)
+            egressLocal = egressTimes + utcOffsets(egressTimes, self.timezone)
+        for i, event in enumerate(events):
+            if self.payload is None or keys[i] != self.partKey:
+                self.startPart(keys[i])
+            row = event.row
+            if event.eventType == 'transit': depth = trunc(fields.depth(row),4)
+            else: depth = '---'
+            record = [event.planet, fields.orbitReference(row), str(event.eventType),
+                      float(ingressTimes[i]), int(event.ingressAlt), event.ingressDir,
+                      float(egressTimes[i]), int(event.egressAlt), event.egressDir,
+                      trunc(fields.bandMagnitude(row),2), depth, trunc(24.0*fields.duration(row),2),
+                      fields.RA(row).split('.')[0], fields.dec(row).split('.')[0], fields.simbadURL(row), fields.constellation(row),
+                      fields.mass(row), fields.radius(row), fields.orbitReferenceYear(row), int(event.conflicts), int(bool(event.scheduled))]
+            if self.sampled:
+                record += [float(event.fraction), int(event.minAltitude),
+                           None if np.isnan(event.maxAirmass) else float(event.maxAirmass)]
+            if self.show_lt != 0:
+                record += [float(ingressLocal[i]), float(egressLocal[i])]
+            self.payload.write(self.separator+json.dumps(record, separators=(',',':')))
+            self.separator = ',\n'
+            self.parts[-1]['events'] += 1
+        count('HTML rows written',len(events))
+
+    def close(self):
+        '''Finish the last payload and write the page that loads the payloads'''
+        if self.split == 'none' and self.payload is None and self.parts == []:
+            self.startPart(0.0)     ## An empty payload, so the page shows an empty table
+        self.finishPart()
+        observatoryName, band, start, end = self.title
+        settings = {'parts': self.parts, 'band': band.upper(), 'sampled': bool(self.sampled),
+                    'localTime': self.show_lt != 0, 'pageSize': self.pageSize}
+        self.open(self.path)
+        self.report.write(htmlHeader(observatoryName, start, end, './ephemerisTable.js'))
+        self.report.write('\n'.join([
+                                     '\n		<div id="ephemerisControls"></div>',\
+                                     '		<table id="eph"></table>',\
+                                     '		<div id="ephemerisPages"></div>',\
+                                     '		<script type="text/javascript">',\
+                                     '		  ephemerisTable.init('+json.dumps(settings)+');',\
+                                     '		</script>',\
+                                     '		<br /><br />']))
+        self.report.write(diagnosticsNote(self.diagnostics))
+        self.report.write(htmlFooter())
+        ReportSink.close(self)
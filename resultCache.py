@@ -0,0 +1,109 @@
+'''
+Persistent, per-night cache of the visibility of candidate events.
+
+Rolling reports (for example, a seven day window regenerated every night)
+recompute mostly the same nights as the previous run. This cache stores the
+outcome of the horizon and twilight tests of every candidate transit and
+eclipse on disk, one pickle per night, in a directory for each combination of
+site parameters. Each entry is keyed on a hash of the planet's ephemeris
+parameters (PER, TT, T14, RA/Dec), the event type and the mid-event time, so a
+rerun only evaluates the nights and planets whose inputs changed. The number
+of nights kept per site is bounded by evicting the oldest nights.
+'''
+import numpy as np
+import cPickle
+import glob
+import hashlib
+import os
+
+cacheFormat = 2     ## Version of the cached results; 2 stores azimuths rather than compass directions
+
+def siteKey(site, twilight, altazBackend, tierMargin=None):
+    '''
+    Hex digest identifying the site parameters that the visibility tests
+    depend on, including the safety margin `tierMargin` (degrees) of the
+    'tiered' backend
+    '''
+    settings = (tuple(site), float(twilight), altazBackend, cacheFormat)
+    if altazBackend == 'tiered':
+        settings += (float(tierMargin),)
+    return hashlib.md5(repr(settings)).hexdigest()
+
+def planetKeys(exoplanetDB, rows):
+    '''Hex digests of the ephemeris parameters of the catalog `rows`'''
+    return np.array([hashlib.md5(repr((exoplanetDB['NAME'][row], float(exoplanetDB['PER'][row]), float(exoplanetDB['TT'][row]),
+                                       float(exoplanetDB['T14'][row]), float(exoplanetDB['RA_RAD'][row]),
+                                       float(exoplanetDB['DEC_RAD'][row])))).hexdigest() for row in rows])
+
+class ResultCache(object):
+    '''
+    Visibility results of one site, stored in `cacheDir`/<site key>/<night>.pkl
+    where <night> is the integer part of the julian date of the mid-event time.
+    '''
+    def __init__(self, cacheDir, key, maxNights=366):
+        self.directory = os.path.join(cacheDir, key)
+        self.maxNights = maxNights
+        self.nights = {}
+        self.changedNights = set()
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+    def night(self, night):
+        '''Cached results of one night, loaded from disk on first use'''
+        if night not in self.nights:
+            path = os.path.join(self.directory, '%d.pkl' % night)
+            if os.path.exists(path):
+                inputFile = open(path, 'rb')
+                self.nights[night] = cPickle.load(inputFile)
+                inputFile.close()
+            else:
+                self.nights[night] = {}
+        return self.nights[night]
+
+    def lookup(self, keys, eventTypes, midEvents):
+        '''
+        Parameters
+        ----------
+        keys, eventTypes, midEvents : array
+            Planet key, event type and mid-event time of each candidate
+        Returns
+        -------
+        found : array of bool
+            True for the candidates with a cached result
+        visible, altitudes, azimuths : array
+            Cached results, in the format returned by `visibleEvents`, for the
+            candidates that were found
+        '''
+        found = np.zeros(len(midEvents), dtype=bool)
+        visible = np.zeros(len(midEvents), dtype=bool)
+        altitudes = np.zeros((len(midEvents), 2))
+        azimuths = np.zeros((len(midEvents), 2))
+        for i in range(len(midEvents)):
+            result = self.night(int(midEvents[i])).get((str(keys[i]), str(eventTypes[i]), float(midEvents[i])))
+            if result is not None:
+                found[i] = True
+                visible[i], altitudes[i], azimuths[i] = result
+        return found, visible, altitudes, azimuths
+
+    def store(self, keys, eventTypes, midEvents, visible, altitudes, azimuths):
+        '''Add the results of freshly evaluated candidates to the cache'''
+        for i in range(len(midEvents)):
+            night = int(midEvents[i])
+            self.night(night)[(str(keys[i]), str(eventTypes[i]), float(midEvents[i]))] = \
+                (bool(visible[i]), tuple(map(float, altitudes[i])), tuple(map(float, azimuths[i])))
+            self.changedNights.add(night)
+
+    def save(self):
+        '''Write the changed nights to disk, then evict the oldest nights beyond `maxNights`'''
+        for night in self.changedNights:
+            path = os.path.join(self.directory, '%d.pkl' % night)
+            output = open(path+'.tmp', 'wb')
+            cPickle.dump(self.nights[night], output, cPickle.HIGHEST_PROTOCOL)
+            output.close()
+            os.rename(path+'.tmp', path)
+        self.changedNights = set()
+
+        nightPaths = glob.glob(os.path.join(self.directory, '*.pkl'))
+        nightPaths.sort(key=lambda path: int(os.path.splitext(os.path.basename(path))[0]))
+        for path in nightPaths[:max(len(nightPaths) - self.maxNights, 0)]:
+            os.remove(path)
@@ -0,0 +1,140 @@
+'''
+Overlaps between observable events and the best observing schedule.
+
+Every event occupies the telescope from ingress to egress. The events that
+overlap each other are counted with a sweep over the sorted ingress and
+egress times, and the set of non-overlapping events with the greatest total
+weight is found by weighted interval scheduling. Both are O(n log n) in the
+number of events, so they scale to dense nights and faint magnitude limits.
+Nights never overlap each other, so solving the whole window at once gives
+the best schedule of every night.
+'''
+import numpy as np
+
+weightSchemes = ['depth','magnitude','age']
+
+def overlapCounts(starts, ends):
+    '''
+    Parameters
+    ----------
+    starts, ends : array
+        Start and end times of the intervals
+    Returns
+    -------
+    counts : array of int
+        Number of other intervals that overlap each interval: two intervals
+        overlap if each starts before the other ends. Intervals that only
+        touch (one ends as the other starts) do not overlap, nor do intervals
+        of no length at the same instant.
+    '''
+    starts = np.asarray(starts, dtype=np.float64)
+    ends = np.asarray(ends, dtype=np.float64)
+    sortedStarts, sortedEnds = np.sort(starts), np.sort(ends)
+    '''Intervals starting before this one ends, less those that ended by the time it starts. 
+        Every interval that ended by then started before this one ends, except the intervals 
+        of no length at the instant of an interval of no length (itself among them), which 
+        are added back; an interval with length counts itself once, which is taken off.'''
+    noLength = ends <= starts
+    points = np.sort(starts[noLength])
+    samePoint = np.where(noLength, np.searchsorted(points, starts, side='right') - np.searchsorted(points, starts, side='left'), 0)
+    return np.searchsorted(sortedStarts, ends, side='left') - np.searchsorted(sortedEnds, starts, side='right') - \
+           (starts < ends) + samePoint
+
+def weightedSchedule(starts, ends, weights):
+    '''
+    Weighted interval scheduling.
+
+    Parameters
+    ----------
+    starts, ends : array
+        Start and end times of the intervals
+    weights : array
+        Value of each interval; intervals with weights <= 0 are never chosen
+    Returns
+    -------
+    chosen : array of bool
+        True for the intervals in the set of mutually non-overlapping
+        intervals with the greatest total weight
+    '''
+    starts = np.asarray(starts, dtype=np.float64)
+    ends = np.asarray(ends, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    '''Order by end time, with events of no length after the others that end at the same time, 
+        so that the intervals compatible with each one always precede those that conflict with it'''
+    order = np.lexsort((ends <= starts, ends))
+    sortedEnds = ends[order]
+    '''Last interval (in order of end time) that ends by the time each one starts'''
+    previous = np.minimum(np.searchsorted(sortedEnds, starts[order], side='right'), np.arange(len(order))) - 1
+
+    best = np.zeros(len(order)+1)      ## best[k]: greatest weight using the first k intervals
+    for k in range(len(order)):
+        best[k+1] = max(best[k], weights[order[k]] + best[previous[k]+1])
+
+    chosen = np.zeros(len(order), dtype=bool)
+    k = len(order)
+    while k > 0:
+        if weights[order[k-1]] + best[previous[k-1]+1] > best[k-1]:
+            chosen[order[k-1]] = True
+            k = previous[k-1] + 1
+        else:
+            k -= 1
+    return chosen
+
+def eventWeights(exoplanetDB, rows, eventTypes, bandColumn, scheme='depth', year=None):
+    '''
+    Parameters
+    ----------
+    exoplanetDB : structured array
+        Compiled catalog
+    rows, eventTypes : array
+        Catalog row and type of each event
+    bandColumn : str
+        Catalog column of the observing band's magnitudes
+    scheme : str
+        'depth': deeper events first (eclipses count one tenth of the transit
+        depth); 'magnitude': brighter hosts first (flux relative to magnitude
+        20); 'age': planets with the oldest orbit references first, as their
+        predicted times are the least certain
+    year : int
+        Current year for the 'age' scheme, this year if not given
+    Returns
+    -------
+    weights : array
+        Positive weight of each event
+    '''
+    if scheme == 'depth':
+        depths = np.nan_to_num(np.asarray(exoplanetDB['DEPTH'][rows], dtype=np.float64))
+        return np.maximum(depths*np.where(eventTypes == 'eclipse', 0.1, 1.0), 1e-9)
+    elif scheme == 'magnitude':
+        magnitudes = np.asarray(exoplanetDB[bandColumn][rows], dtype=np.float64)
+        return 10**(-0.4*(np.where(np.isnan(magnitudes), 20.0, magnitudes) - 20.0))
+    elif scheme == 'age':
+        if year is None:
+            import datetime
+            year = datetime.date.today().year
+        referenceYears = []
+        for reference in exoplanetDB['ORBREF'][rows]:
+            try:
+                referenceYears.append(int(reference.split()[-1]))
+            except (ValueError, IndexError):
+                referenceYears.append(year)
+        return np.maximum(year - np.array(referenceYears, dtype=np.float64), 0.0) + 1.0
+    else:
+        raise ValueError("Unknown schedule weighting '%s', expected one of: %s" % (scheme, ', '.join(weightSchemes)))
+
+def observingSchedule(ingress, egress, weights):
+    '''
+    Parameters
+    ----------
+    ingress, egress : array
+        Julian dates of ingress and egress of each event
+    weights : array
+        Weight of each event, from `eventWeights`
+    Returns
+    -------
+    conflicts : array of int
+        Number of other events that overlap each event
+    scheduled : array of bool
+        True for the events in the best schedule
+    '''
+    return overlapCounts(ingress, egress), weightedSchedule(ingress, egress, weights)
@@ -0,0 +1,91 @@
+'''
+Sorted index of the compiled catalog for target selection.
+
+Every selection asks the same kind of question: the planets with known
+ephemerides whose host star is brighter than a limit in one band and whose
+transit is deeper than a limit. The index keeps, for each photometric band in
+the catalog (B, V, I, J, H, KS) and for the transit depth, the catalog rows of
+the eligible planets sorted by that column. A query is then two binary
+searches, for the rows below the magnitude limit and above the depth limit,
+and the intersection of the two sets of rows. The index is built once per
+catalog and reused by every selection made with it.
+'''
+import numpy as np
+import threading
+import weakref
+
+from catalog import magnitudeColumns
+
+_indexCache = {}
+_indexLock = threading.Lock()
+
+class TargetIndex(object):
+    '''
+    Parameters
+    ----------
+    exoplanetDB : structured array
+        Compiled catalog, see catalog.compileCatalog
+    '''
+    def __init__(self, exoplanetDB):
+        self.size = len(exoplanetDB)
+        self.bands = [band for band in magnitudeColumns if band in exoplanetDB.dtype.names]
+
+        '''Planets that can be selected at all: transiting, with an ephemeris and a position'''
+        eligible = (np.asarray(exoplanetDB['TRANSIT']) == 1)*np.isfinite(exoplanetDB['RA_RAD'])
+        with np.errstate(invalid='ignore'):
+            eligible *= (exoplanetDB['TT'] > 0.0)*(exoplanetDB['PER'] > 0.0)
+        self.columns = {}
+        for column in self.bands+['DEPTH']:
+            values = np.asarray(exoplanetDB[column], dtype=np.float64)
+            rows = np.flatnonzero(eligible*np.isfinite(values)*(values != 0.0))    ## Empty fields are NaN or zero
+            order = np.argsort(values[rows], kind='mergesort')
+            self.columns[column] = (values[rows][order], rows[order])
+
+    def atMost(self, column, limit):
+        '''Catalog rows with `column` <= `limit`'''
+        values, rows = self.columns[column]
+        return rows[:np.searchsorted(values, limit, side='right')]
+
+    def atLeast(self, column, limit):
+        '''Catalog rows with `column` >= `limit`'''
+        values, rows = self.columns[column]
+        return rows[np.searchsorted(values, limit, side='left'):]
+
+    def select(self, band, magLimit, depthLimit):
+        '''
+        Parameters
+        ----------
+        band : str
+            Catalog column of the magnitudes to select on, e.g. V or KS
+        magLimit : float
+            Magnitude of the faintest host star to include
+        depthLimit : float
+            Shallowest transit depth to include
+        Returns
+        -------
+        selected : array of bool
+            True for the catalog rows of the eligible planets within the limits
+        '''
+        if band not in self.columns:
+            raise ValueError("No '%s' magnitudes in the catalog, expected one of: %s" % (band, ', '.join(self.bands)))
+        brightRows = self.atMost(band, magLimit)
+        deepRows = self.atLeast('DEPTH', depthLimit)
+        selected = np.zeros(self.size, dtype=bool)
+        selected[brightRows] = True
+        deepRows = deepRows[selected[deepRows]]
+        selected[brightRows] = False
+        selected[deepRows] = True
+        return selected
+
+def targetIndex(exoplanetDB):
+    '''The TargetIndex of `exoplanetDB`, built on first use and kept while the catalog is in use. Thread-safe.'''
+    key = id(exoplanetDB)
+    with _indexLock:
+        cached = _indexCache.get(key)
+        if cached is not None and cached[0]() is exoplanetDB:
+            return cached[1]
+        for oldKey in [oldKey for oldKey, (reference, index) in _indexCache.items() if reference() is None]:
+            del _indexCache[oldKey]
+        index = TargetIndex(exoplanetDB)
+        _indexCache[key] = (weakref.ref(exoplanetDB), index)
+        return index
@@ -0,0 +1,51 @@
+'''
+Shared fixtures: a working directory with an outputs/ directory holding a
+synthetic catalog (see benchmark.py), as calculateEphemerides.py expects,
+and the parameters of a site for any window and limits.
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import shutil
+import tempfile
+
+import pytest
+
+import calculateEphemerides as ephemerides
+from benchmark import syntheticCatalog, writeParFile
+from catalog import loadCatalog
+
+@pytest.fixture(scope='session')
+def workspace():
+    '''A temporary working directory with outputs/exoplanets.csv, 400 synthetic planets'''
+    directory = tempfile.mkdtemp()
+    workingDirectory = os.getcwd()
+    os.chdir(directory)
+    os.mkdir('outputs')
+    syntheticCatalog(os.path.join(directory, 'outputs', 'exoplanets.csv'), 400)
+    yield directory
+    os.chdir(workingDirectory)
+    shutil.rmtree(directory)
+
+@pytest.fixture(scope='session')
+def exoplanetDB(workspace):
+    '''The compiled synthetic catalog'''
+    return loadCatalog(os.path.join(workspace, 'outputs', 'exoplanets.csv'),
+                       os.path.join(workspace, 'outputs', 'exoplanetDB.npy'))
+
+@pytest.fixture(scope='session')
+def siteParameters(workspace):
+    '''
+    Function of (nights, **overrides) returning the parameters of the site
+    of mro.par for `nights` nights from 2015-07-10, with mag_limit 16 so the
+    synthetic catalog has plenty of events, and `overrides` in place of the
+    defaults
+    '''
+    def parameters(nights=7, **overrides):
+        parFile = writeParFile(os.path.join(workspace, 'site.par'), nights, calcEclipses=True)
+        values = ephemerides.readParFile(parFile)
+        values.update({'mag_limit': 16.0, 'catalog_max_age': 1e6})
+        values.update(overrides)
+        return values
+    return parameters
@@ -0,0 +1,35 @@
+'''
+Batch mode (calculateEphemerides.batchEphemerides): the reports of each site
+are identical to those of a single run of its .par file, though the sites
+share the candidate events of the union of their targets and windows.
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import calculateEphemerides as ephemerides
+from benchmark import writeParFile
+
+def writeSite(path, nights, start, extraLines):
+    '''A .par file of `nights` nights from `start`, with `extraLines` overriding the site and limits'''
+    writeParFile(path, nights, start, calcEclipses=True)
+    output = open(path, 'a')
+    output.write('\n'.join(extraLines + ['catalog_max_age: 1000000'])+'\n')
+    output.close()
+    return path
+
+def test_batch_matches_single_runs(workspace, exoplanetDB):
+    parFiles = [writeSite(os.path.join(workspace, 'north.par'), 10, (2015,7,10,0,0,0), ['mag_limit: 16']),
+                writeSite(os.path.join(workspace, 'south.par'), 6, (2015,7,14,0,0,0),
+                          ['latitude: -30:10:00', 'longitude: -70:48:00', 'mag_limit: 13', 'calc_eclipses: False']),
+                writeSite(os.path.join(workspace, 'later.par'), 5, (2015,8,1,0,0,0), ['band: J', 'mag_limit: 14'])]
+    ephemerides.batchEphemerides(parFiles)
+    outputs = os.path.join(workspace, 'outputs')
+    for parFile in parFiles:
+        name = os.path.splitext(os.path.basename(parFile))[0]
+        ephemerides.calculateEphemerides(parFile, exoplanetDB, reportName='single_'+name)
+        for extension in ['.csv', '.html']:
+            batch = open(os.path.join(outputs, 'eventReport_'+name+extension)).read()
+            single = open(os.path.join(outputs, 'single_'+name+extension)).read()
+            assert batch == single
+        assert len(open(os.path.join(outputs, 'single_'+name+'.csv')).read().splitlines()) > 5
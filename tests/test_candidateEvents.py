@@ -0,0 +1,64 @@
+'''
+Enumeration of the transits and eclipses in a window (midEventsInWindow and
+candidateEvents of calculateEphemerides.py) against a loop over every epoch,
+at the window edges and for periods shorter than a day.
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+import pytest
+
+from calculateEphemerides import midEventsInWindow, candidateEvents
+
+def bruteForce(Tc, P, start, end, phase):
+    '''The events of each planet in (start, end), one epoch at a time'''
+    planets, mids = [], []
+    for planet in range(len(Tc)):
+        first = int(np.floor((start - Tc[planet])/P[planet])) - 3
+        last = int(np.ceil((end - Tc[planet])/P[planet])) + 3
+        for epoch in range(first, last + 1):
+            mid = Tc[planet] + P[planet]*(float(epoch) + phase)
+            if start < mid < end:
+                planets.append(planet)
+                mids.append(mid)
+    return np.array(planets, dtype=int), np.array(mids)
+
+@pytest.mark.parametrize('phase', [0.0, 0.5])
+def test_against_brute_force(phase):
+    rng = np.random.RandomState(int(10*phase))
+    P = np.r_[10**rng.uniform(np.log10(0.2), np.log10(400.0), 300), 0.25, 0.5, 0.9999]
+    Tc = rng.uniform(2440000.0, 2457000.0, len(P))
+    for trial in range(20):
+        start = rng.uniform(2457000.0, 2458000.0)
+        end = start + rng.choice([0.3, 1.0, 7.0, 400.0])
+        planets, mids = midEventsInWindow(Tc, P, start, end, phase)
+        expectedPlanets, expectedMids = bruteForce(Tc, P, start, end, phase)
+        assert np.array_equal(planets, expectedPlanets)
+        assert np.array_equal(mids, expectedMids)
+
+def test_window_edges():
+    '''Events exactly at the start or end are outside the window; the events just inside are kept'''
+    rng = np.random.RandomState(3)
+    P = 10**rng.uniform(np.log10(0.2), np.log10(50.0), 200)
+    Tc = rng.uniform(2450000.0, 2457000.0, len(P))
+    for planet in range(len(P)):
+        onePlanet = slice(planet, planet + 1)
+        epoch = np.floor((2457213.5 - Tc[planet])/P[planet])
+        mid = Tc[planet] + P[planet]*epoch
+        after = Tc[planet] + P[planet]*(epoch + 3)
+        for start, end in [(mid, after), (np.nextafter(mid, 0), np.nextafter(after, np.inf)),
+                           (np.nextafter(mid, np.inf), np.nextafter(after, 0))]:
+            planets, mids = midEventsInWindow(Tc[onePlanet], P[onePlanet], start, end)
+            assert np.array_equal(mids, bruteForce(Tc[onePlanet], P[onePlanet], start, end, 0.0)[1])
+
+def test_candidate_order():
+    '''Sorted by planet, then time, with transits and eclipses interleaved'''
+    Tc, P = np.array([2457000.3, 2457000.0]), np.array([0.6, 3.0])
+    planets, mids, types = candidateEvents(Tc, P, 2457010.0, 2457013.0, True, True)
+    assert list(planets) == [0]*10 + [1]*2
+    assert np.all(np.diff(mids[:10]) > 0)
+    assert list(types[:4]) == ['eclipse', 'transit', 'eclipse', 'transit']
+    assert list(types[10:]) == ['eclipse', 'transit']
+    assert len(candidateEvents(Tc, P, 2457010.0, 2457013.0, False, False)[0]) == 0
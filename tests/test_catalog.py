@@ -0,0 +1,86 @@
+'''
+The compiled catalog (catalog.py): recompiled when the content of the CSV
+changes but not when only its modification time does, written atomically
+so memory-mapped readers keep an intact copy, with a warning for the rows
+whose coordinates can't be read.
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import shutil
+import tempfile
+
+import numpy as np
+import pytest
+
+import catalog
+from benchmark import syntheticCatalog
+
+@pytest.fixture
+def directory():
+    directory = tempfile.mkdtemp()
+    yield directory
+    shutil.rmtree(directory)
+
+def countCompiles(monkeypatch):
+    '''Count the calls of `catalog.compileCatalog` made by `catalog.loadCatalog`'''
+    calls = []
+    compileCatalog = catalog.compileCatalog
+    def counted(csvPath, catalogPath):
+        calls.append(csvPath)
+        return compileCatalog(csvPath, catalogPath)
+    monkeypatch.setattr(catalog, 'compileCatalog', counted)
+    return calls
+
+def rewrite(path, old, new):
+    '''Replace `old` by `new` in the file at `path`'''
+    text = open(path, 'rb').read()
+    assert old in text
+    output = open(path, 'wb')
+    output.write(text.replace(old, new))
+    output.close()
+
+def test_invalidation(directory, monkeypatch):
+    csvPath = syntheticCatalog(os.path.join(directory, 'exoplanets.csv'), 50)
+    catalogPath = os.path.join(directory, 'exoplanetDB.npy')
+    calls = countCompiles(monkeypatch)
+    first = np.array(catalog.loadCatalog(csvPath, catalogPath))
+    assert len(calls) == 1
+
+    '''Same content, new modification time: re-hashed, not recompiled'''
+    os.utime(csvPath, (os.stat(csvPath).st_atime, os.stat(csvPath).st_mtime + 100))
+    assert np.array(catalog.loadCatalog(csvPath, catalogPath)).tostring() == first.tostring()
+    assert len(calls) == 1
+    catalog.loadCatalog(csvPath, catalogPath)
+    assert len(calls) == 1
+
+    '''New content: recompiled'''
+    rewrite(csvPath, 'SYN-7 b,', 'SYN-7 c,')
+    changed = catalog.loadCatalog(csvPath, catalogPath)
+    assert len(calls) == 2
+    assert 'SYN-7 c' in changed['NAME'] and 'SYN-7 b' not in changed['NAME']
+
+def test_atomic_rewrite(directory):
+    '''A reader of the old memory-mapped catalog still sees it whole after a recompile'''
+    csvPath = syntheticCatalog(os.path.join(directory, 'exoplanets.csv'), 50)
+    catalogPath = os.path.join(directory, 'exoplanetDB.npy')
+    old = catalog.loadCatalog(csvPath, catalogPath)
+    names = np.array(old['NAME'])
+    syntheticCatalog(csvPath, 20, seed=1)
+    new = catalog.loadCatalog(csvPath, catalogPath)
+    assert len(new) == 20
+    assert len(old) == 50 and np.all(old['NAME'] == names)
+    assert sorted(os.listdir(directory)) == ['exoplanetDB.json', 'exoplanetDB.npy', 'exoplanets.csv']
+
+def test_unreadable_coordinates(directory, capsys):
+    csvPath = syntheticCatalog(os.path.join(directory, 'exoplanets.csv'), 50)
+    names = np.array(catalog.compileCatalog(csvPath, os.path.join(directory, 'first.npy'))['NAME'])
+    text = open(csvPath, 'rb').read().splitlines()
+    text[1] = text[1].split(',')[0] + ',not an angle,' + ','.join(text[1].split(',')[2:])
+    open(csvPath, 'wb').write('\r\n'.join(text) + '\r\n')
+    capsys.readouterr()
+    compiled = catalog.compileCatalog(csvPath, os.path.join(directory, 'second.npy'))
+    assert 'Warning: 1 of 50 planets have no readable RA/Dec' in capsys.readouterr()[0]
+    assert np.isnan(compiled['RA_RAD']).sum() == 1
+    assert np.all(compiled['NAME'] == names)
@@ -0,0 +1,116 @@
+'''
+Refreshes of the CSV database (catalogRefresh.py) against a local HTTP
+server: the first download, "304 Not Modified", an unchanged copy and a new
+copy, and a failed request.
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import BaseHTTPServer
+import hashlib
+import shutil
+import tempfile
+import threading
+import time
+import urllib2
+
+import pytest
+
+from catalogRefresh import refreshCatalog, backgroundRefresh, isStale, readMetadata
+
+class CatalogServer(BaseHTTPServer.HTTPServer):
+    '''Serves `content` with an ETag of its hash, honoring If-None-Match unless `conditional` is False'''
+    content = 'NAME,PER\nWASP-12 b,1.09\n'
+    conditional = True
+    status = 200
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), CatalogHandler)
+        self.requests = []
+
+    def url(self):
+        return 'http://127.0.0.1:%i/exoplanets.csv' % self.server_address[1]
+
+class CatalogHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        etag = '"%s"' % hashlib.sha1(server.content).hexdigest()
+        server.requests.append(dict(self.headers))
+        if server.status != 200:
+            self.send_error(server.status)
+        elif server.conditional and self.headers.getheader('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+        else:
+            self.send_response(200)
+            self.send_header('ETag', etag if server.conditional else '"%f"' % time.time())
+            self.send_header('Last-Modified', 'Fri, 10 Jul 2015 00:00:00 GMT')
+            self.send_header('Content-Length', str(len(server.content)))
+            self.end_headers()
+            self.wfile.write(server.content)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    catalogServer = CatalogServer()
+    thread = threading.Thread(target=catalogServer.serve_forever)
+    thread.daemon = True
+    thread.start()
+    directory = tempfile.mkdtemp()
+    catalogServer.csvPath = os.path.join(directory, 'exoplanets.csv')
+    yield catalogServer
+    catalogServer.shutdown()
+    catalogServer.server_close()
+    shutil.rmtree(directory)
+
+def test_refresh_paths(server):
+    csvPath = server.csvPath
+    assert refreshCatalog(server.url(), csvPath, blockSize=7)
+    assert open(csvPath).read() == server.content
+    assert readMetadata(csvPath)['etag'] == '"%s"' % hashlib.sha1(server.content).hexdigest()
+    assert 'if-none-match' not in server.requests[-1]
+    inode = os.stat(csvPath).st_ino
+
+    '''Not modified: a conditional request answered with 304, the copy untouched'''
+    checked = readMetadata(csvPath)['checked']
+    time.sleep(0.01)
+    assert not refreshCatalog(server.url(), csvPath)
+    assert server.requests[-1]['if-none-match'] == readMetadata(csvPath)['etag']
+    assert server.requests[-1]['if-modified-since'] == 'Fri, 10 Jul 2015 00:00:00 GMT'
+    assert readMetadata(csvPath)['checked'] > checked
+    assert os.stat(csvPath).st_ino == inode
+
+    '''The same content without a 304: downloaded, but the copy is not replaced'''
+    server.conditional = False
+    assert not refreshCatalog(server.url(), csvPath)
+    assert os.stat(csvPath).st_ino == inode
+
+    '''New content: the copy is replaced'''
+    server.conditional = True
+    server.content += 'WASP-18 b,0.94\n'
+    assert refreshCatalog(server.url(), csvPath)
+    assert open(csvPath).read() == server.content
+    assert sorted(os.listdir(os.path.dirname(csvPath))) == ['exoplanets.csv', 'exoplanets_download.json']
+    assert not isStale(csvPath, 1.0)
+
+def test_failed_refresh_keeps_the_copy(server):
+    csvPath = server.csvPath
+    refreshCatalog(server.url(), csvPath)
+    server.status = 500
+    with pytest.raises(urllib2.HTTPError):
+        refreshCatalog(server.url(), csvPath)
+    assert open(csvPath).read() == server.content
+    assert sorted(os.listdir(os.path.dirname(csvPath))) == ['exoplanets.csv', 'exoplanets_download.json']
+
+    '''In the background, the failure is reported and the run goes on'''
+    backgroundRefresh(server.url(), csvPath).join(30)
+    assert open(csvPath).read() == server.content
+
+def test_background_refresh(server):
+    open(server.csvPath, 'w').write('NAME,PER\n')
+    assert isStale(server.csvPath, -1.0)
+    backgroundRefresh(server.url(), server.csvPath).join(30)
+    assert open(server.csvPath).read() == server.content
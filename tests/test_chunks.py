@@ -0,0 +1,39 @@
+'''
+Long windows computed in chunks of `chunk_days` (windowChunks and
+writeEphemerides of calculateEphemerides.py) give the same reports, byte for
+byte, as the window computed at once.
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+import pytest
+
+import calculateEphemerides as ephemerides
+
+def reports(workspace, reportName):
+    '''Contents of the CSV and HTML reports of a run'''
+    return [open(os.path.join(workspace, 'outputs', reportName+extension)).read() for extension in ['.csv', '.html']]
+
+def test_chunks_split_at_noon(siteParameters):
+    parameters = siteParameters(30, chunk_days=7.0)
+    chunks = ephemerides.windowChunks(parameters)
+    assert len(chunks) == 5
+    assert chunks[0]['start_date'] == parameters['start_date']
+    assert chunks[-1]['end_date'] == parameters['end_date']
+    noonOffset = ephemerides.localNoonOffset(parameters['longitude'])
+    for before, after in zip(chunks[:-1], chunks[1:]):
+        assert before['end_date'] == after['start_date']
+        assert abs(after['start_date'] + noonOffset - np.round(after['start_date'] + noonOffset)) < 1e-9
+    assert ephemerides.windowChunks(siteParameters(30)) == [siteParameters(30)]
+
+@pytest.mark.parametrize('options', [{}, {'sampling': True, 'baseline_minutes': 30.0, 'min_fraction': 0.5},
+                                     {'show_lt': -7.0, 'moon_min_separation': 30.0}])
+def test_chunked_reports_match(workspace, exoplanetDB, siteParameters, options):
+    ephemerides.writeEphemerides(siteParameters(40, **options), exoplanetDB, reportName='whole')
+    whole = reports(workspace, 'whole')
+    assert len(whole[0].splitlines()) > 100
+    for chunkDays in [1.0, 2.5, 7.0, 100.0]:
+        ephemerides.writeEphemerides(siteParameters(40, chunk_days=chunkDays, **options), exoplanetDB, reportName='chunked')
+        assert reports(workspace, 'chunked') == whole
@@ -0,0 +1,101 @@
+'''
+Round trips through the columnar binary tables: columnStore.ColumnWriter and
+loadColumns, and the binary report of a run (reportSinks.ColumnSink) against
+the events of the run.
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import shutil
+import tempfile
+
+import numpy as np
+import pytest
+
+import calculateEphemerides as ephemerides
+from columnStore import ColumnWriter, loadColumns
+
+columns = [('index', np.int32, ''), ('time', np.float64, 'JD (UT)'), ('name', 'S7', ''), ('flag', bool, '')]
+
+@pytest.fixture
+def directory():
+    directory = tempfile.mkdtemp()
+    yield os.path.join(directory, 'table')
+    shutil.rmtree(directory)
+
+def randomRows(rng, length):
+    values = {'index': rng.randint(-2**31, 2**31 - 1, length), 'time': rng.uniform(2440000.0, 2460000.0, length),
+              'name': np.array(['row%i' % k for k in rng.randint(0, 10000, length)]), 'flag': rng.uniform(size=length) > 0.5}
+    if length >= 3:
+        values['time'][:3] = [np.nan, np.inf, -0.0]
+    return values
+
+def test_round_trip(directory):
+    rng = np.random.RandomState(23)
+    writer = ColumnWriter(directory, columns, {'observatory': 'Test', 'start': 2457213.5})
+    batches = [randomRows(rng, length) for length in [1000, 0, 1, 4321, 7]]
+    for batch in batches:
+        writer.append(batch)
+    writer.close()
+    loaded, description = loadColumns(directory)
+    assert description['rows'] == 5329
+    assert description['observatory'] == 'Test' and description['start'] == 2457213.5
+    assert [(column['name'], column['unit']) for column in description['columns']] == [(name, unit) for name, dtype, unit in columns]
+    for name, dtype, unit in columns:
+        expected = np.concatenate([np.asarray(batch[name], dtype=dtype) for batch in batches])
+        assert isinstance(loaded[name], np.memmap)
+        assert loaded[name].dtype == np.dtype(dtype)
+        assert loaded[name].tostring() == expected.tostring()
+        assert np.load(os.path.join(directory, name+'.npy')).tostring() == expected.tostring()
+        with pytest.raises(ValueError):
+            loaded[name][0] = loaded[name][1]
+
+    '''A subset of the columns'''
+    subset, description = loadColumns(directory, ['time'])
+    assert list(subset) == ['time']
+
+def test_rewrite_and_empty_table(directory):
+    writer = ColumnWriter(directory, columns + [('extra', np.float64, '')])
+    writer.append(dict(randomRows(np.random.RandomState(0), 10), extra=np.zeros(10)))
+    writer.close()
+    writer = ColumnWriter(directory, columns)
+    writer.close()
+    assert sorted(os.listdir(directory)) == sorted(['columns.json'] + [name+'.npy' for name, dtype, unit in columns])
+    loaded, description = loadColumns(directory)
+    assert description['rows'] == 0
+    for name, dtype, unit in columns:
+        assert len(loaded[name]) == 0 and loaded[name].dtype == np.dtype(dtype)
+
+def test_unequal_columns(directory):
+    writer = ColumnWriter(directory, columns)
+    values = randomRows(np.random.RandomState(1), 10)
+    values['flag'] = values['flag'][:9]
+    with pytest.raises(ValueError):
+        writer.append(values)
+
+@pytest.mark.parametrize('sampling', [False, True])
+def test_report_matches_events(workspace, exoplanetDB, siteParameters, sampling):
+    parameters = siteParameters(20, binary_out=True, sampling=sampling)
+    ephemerides.writeEphemerides(parameters, exoplanetDB, reportName='binary')
+    events = ephemerides.eventTable(parameters, exoplanetDB)
+    assert len(events) > 100
+    table, description = loadColumns(os.path.join(workspace, 'outputs', 'binary_columns'))
+    planets = loadColumns(os.path.join(workspace, 'outputs', 'binary_columns', 'planets'))[0]
+    assert description['rows'] == len(events)
+    assert np.array_equal(planets['row'][table['planet']], events['row'])
+    assert np.array_equal(planets['name'][table['planet']], events['planet'])
+    assert len(np.unique(planets['row'])) == len(planets['row'])
+    assert np.array_equal(planets['period'], exoplanetDB['PER'][planets['row']])
+    assert np.array_equal(table['ingress'], events['midEvent'] - events['halfDuration'])
+    assert np.array_equal(table['egress'], events['midEvent'] + events['halfDuration'])
+    for column, field in [('event', 'eventType'), ('ingress_altitude', 'ingressAlt'), ('ingress_azimuth', 'ingressAz'),
+                          ('ingress_direction', 'ingressDir'), ('egress_altitude', 'egressAlt'), ('egress_azimuth', 'egressAz'),
+                          ('egress_direction', 'egressDir'), ('conflicts', 'conflicts'), ('scheduled', 'scheduled')]:
+        assert np.array_equal(table[column], events[field])
+    if sampling:
+        assert np.array_equal(table['observable_fraction'], events['fraction'])
+        assert np.array_equal(table['min_altitude'], events['minAltitude'])
+        assert table['max_airmass'].tostring() == events['maxAirmass'].tostring()
+    else:
+        assert 'observable_fraction' not in table
@@ -0,0 +1,60 @@
+'''
+The library interface (ephemerisLibrary.findEvents): the events of a .par
+file's site and selection, and the same events when many threads search
+different sites with one shared catalog.
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import threading
+
+import numpy as np
+import pytest
+
+import calculateEphemerides as ephemerides
+from ephemerisLibrary import Site, Selection, findEvents
+
+start, end = 2457213.5, 2457227.5
+searches = [(Site('46:57:03.9', '-120:43:28.4', 1198.0, 10.0, '30:00:00'), Selection(14.0, calcEclipses=True), {}),
+            (Site('-30:10:00', '-70:48:00', 2200.0, 5.0, '20:00:00', -12.0), Selection(13.0, 'J'), {'sampling': True}),
+            (Site('28:45:00', '-17:53:00', 2400.0, 10.0, '25:00:00'), Selection(15.0, depthLimit=0.005),
+             {'altaz_backend': 'tiered', 'schedule_weight': 'magnitude'}),
+            (Site('19:49:00', '-155:28:00', 4200.0, 0.0, '15:00:00', -18.0), Selection(16.0, 'K'),
+             {'moon_min_separation': 30.0, 'altaz_backend': 'ephem'})]
+
+def test_matches_par_file(exoplanetDB, siteParameters):
+    parameters = siteParameters(14, schedule_weight='magnitude')
+    events = findEvents(exoplanetDB, Site.fromParameters(parameters), Selection.fromParameters(parameters),
+                        parameters['start_date'], parameters['end_date'], schedule_weight='magnitude')
+    assert len(events) > 100
+    assert events.tostring() == ephemerides.eventTable(parameters, exoplanetDB).tostring()
+
+def test_file_options_rejected(exoplanetDB):
+    site, selection, options = searches[0]
+    with pytest.raises(TypeError):
+        findEvents(exoplanetDB, site, selection, start, end, result_cache=True)
+
+def test_concurrent_searches(exoplanetDB):
+    '''Eight threads, each running every search in its own order, give the events of one search at a time'''
+    catalog = exoplanetDB.copy()
+    serial = [findEvents(catalog, site, selection, start, end, **options).tostring() for site, selection, options in searches]
+    assert all(len(events) > 0 for events in serial)
+    assert len(set(serial)) == len(searches)
+    results, errors = {}, []
+    def search(thread):
+        try:
+            order = np.random.RandomState(thread).permutation(2*len(searches)) % len(searches)
+            for k in order:
+                site, selection, options = searches[k]
+                results[thread, k] = findEvents(catalog, site, selection, start, end, **options).tostring()
+        except Exception as error:
+            errors.append(error)
+    threads = [threading.Thread(target=search, args=(thread,)) for thread in range(8)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert errors == []
+    assert len(results) == 8*len(searches)
+    for (thread, k), events in results.items():
+        assert events == serial[k]
+    assert catalog.tostring() == exoplanetDB.tostring()
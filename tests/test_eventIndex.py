@@ -0,0 +1,129 @@
+'''
+The persistent event index (eventIndex.py) against brute-force searches of
+the events it should hold.
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import multiprocessing
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pytest
+
+from eventIndex import EventIndex, eventColumns
+
+settings = {'latitude': '46:57:03.9', 'mag_limit': 12.1}
+
+def randomEvents(rng, start, end, number, version):
+    '''Events with mid-event times between `start` and `end`, in order of ingress; `version` tags the run'''
+    mids = rng.uniform(start, end, number)
+    halfDurations = rng.choice([0.0, 0.02, 0.05, 0.1], number)
+    order = np.argsort(mids - halfDurations, kind='mergesort')
+    mids, halfDurations = mids[order], halfDurations[order]
+    events = dict((name, np.zeros(number, dtype=dtype or 'S9')) for name, dtype, unit in eventColumns)
+    events.update({'ingress': mids - halfDurations, 'egress': mids + halfDurations, 'mid_event': mids,
+                   'planet': np.array(['Syn-%i b' % i for i in rng.randint(0, 30, number)]),
+                   'conflicts': np.zeros(number, dtype=np.int32) + version})
+    return events
+
+def expectedEvents(runs):
+    '''The events of the latest run covering each mid-event time, in order of ingress'''
+    kept = []
+    for number, (start, end, events) in enumerate(runs):
+        later = runs[number+1:]
+        alive = np.ones(len(events['mid_event']), dtype=bool)
+        for laterStart, laterEnd, laterEvents in later:
+            alive &= ~((events['mid_event'] > laterStart)*(events['mid_event'] < laterEnd))
+        kept.append(dict((name, events[name][alive]) for name in events))
+    merged = dict((name, np.concatenate([events[name] for events in kept])) for name in kept[0])
+    order = np.argsort(merged['ingress'], kind='mergesort')
+    return dict((name, merged[name][order]) for name in merged)
+
+@pytest.mark.parametrize('maxSegments', [2, 16])
+def test_rolling_runs(maxSegments):
+    directory = tempfile.mkdtemp()
+    try:
+        rng = np.random.RandomState(maxSegments)
+        runs = []
+        for run in range(6):
+            start = 2457213.5 + 3*run
+            end = start + 7
+            events = randomEvents(rng, start, end, 200, run)
+            runs.append((start, end, events))
+            index = EventIndex(os.path.join(directory, 'index'), maxSegments)
+            index.startRun()
+            for first in range(0, 200, 70):     ## Several segments per run
+                index.addSegment(dict((name, values[first:first+70]) for name, values in events.items()))
+            index.finishRun(start, end, settings)
+
+        index = EventIndex(os.path.join(directory, 'index'), maxSegments)
+        expected = expectedEvents(runs)
+        assert len(index) == len(expected['ingress'])
+        assert len(index.segments) <= maxSegments + 3
+        names = expected['planet']
+        for trial in range(300):
+            start = rng.uniform(2457212.0, 2457236.0)
+            end = start + rng.uniform(0.0, 0.5)
+            planet = names[rng.randint(len(names))] if trial % 2 else None
+            ofPlanet = (names == planet) if planet else np.ones(len(names), dtype=bool)
+            inProgress = ofPlanet*(expected['ingress'] < end)*(expected['egress'] > start)
+            found = index.between(start, end, planet)
+            assert np.array_equal(found['mid_event'], expected['mid_event'][inProgress])
+            assert np.array_equal(found['conflicts'], expected['conflicts'][inProgress])
+            count = rng.randint(1, 6)
+            nextEvents = np.flatnonzero(ofPlanet*(expected['ingress'] >= start))[:count]
+            found = index.after(start, count, planet)
+            assert np.array_equal(found['mid_event'], expected['mid_event'][nextEvents])
+        assert index.covered(2457214.0) and not index.covered(2457240.0)
+    finally:
+        shutil.rmtree(directory)
+
+def test_new_settings_start_a_new_index():
+    directory = tempfile.mkdtemp()
+    try:
+        rng = np.random.RandomState(0)
+        for runSettings, number in [(settings, 50), (dict(settings, mag_limit=11.0), 20)]:
+            index = EventIndex(directory)
+            index.startRun()
+            index.addSegment(randomEvents(rng, 2457213.5, 2457215.5, number, 0))
+            index.finishRun(2457213.5, 2457215.5, runSettings)
+        assert len(EventIndex(directory)) == 20
+    finally:
+        shutil.rmtree(directory)
+
+def laterRun(directory, events, start, end):
+    '''A run in another process, which starts while the first run is writing'''
+    index = EventIndex(directory)
+    index.startRun()
+    index.addSegment(events)
+    index.finishRun(start, end, settings)
+
+def test_concurrent_runs():
+    '''A second run waits for the first to finish, then supersedes it, without removing its segments'''
+    directory = tempfile.mkdtemp()
+    try:
+        rng = np.random.RandomState(1)
+        first, second = randomEvents(rng, 2457213.5, 2457220.5, 100, 0), randomEvents(rng, 2457216.5, 2457223.5, 100, 1)
+        index = EventIndex(directory)
+        index.startRun()
+        index.addSegment(dict((name, values[:50]) for name, values in first.items()))
+        process = multiprocessing.Process(target=laterRun, args=(directory, second, 2457216.5, 2457223.5))
+        process.start()
+        time.sleep(2.0)
+        assert process.is_alive()
+        index.addSegment(dict((name, values[50:]) for name, values in first.items()))
+        index.finishRun(2457213.5, 2457220.5, settings)
+        process.join(60)
+        assert process.exitcode == 0
+
+        index = EventIndex(directory)
+        expected = expectedEvents([(2457213.5, 2457220.5, first), (2457216.5, 2457223.5, second)])
+        found = index.between(2457213.0, 2457224.0)
+        assert np.array_equal(found['mid_event'], expected['mid_event'])
+        assert [run['run'] for run in index.description['runs']] == [0, 1]
+    finally:
+        shutil.rmtree(directory)
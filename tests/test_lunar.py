@@ -0,0 +1,50 @@
+'''
+The Moon constraint of events at the edges of the observing window, against
+ephem.Moon computed directly.
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ephem
+import numpy as np
+
+from calculateEphemerides import makeObserver
+from lunar import eventMoonConstraint
+from vectorEphem import ephemDateOffset
+
+windowEnd = 2457220.5       ## End of a notional observing window (2015-07-17 0h UT)
+
+def directMoon(observatory, ra, dec, times):
+    '''Separation between the star and the Moon, and the Moon's altitude (degrees), from PyEphem at each of `times`'''
+    star = ephem.FixedBody()
+    star._ra, star._dec, star._epoch = ra, dec, ephem.J2000
+    moon = ephem.Moon()
+    separations, altitudes = [], []
+    for time in times:
+        observatory.date = time - ephemDateOffset
+        star.compute(observatory)
+        moon.compute(observatory)
+        separations.append(np.degrees(float(ephem.separation((star.ra, star.dec), (moon.ra, moon.dec)))))
+        altitudes.append(np.degrees(float(moon.alt)))
+    return np.array(separations), np.array(altitudes)
+
+def test_moon_at_window_edge():
+    observatory = makeObserver('46:57:03.9', '-120:43:28.4', 1198.0, 10.0, '0')
+    halfWindow = 0.3    ## The last times tested are 7.2 hours past the end of the window
+    for ra, dec in [(0.5, 0.2), (2.0, -0.4), (4.5, 0.9)]:
+        times = windowEnd + halfWindow*np.linspace(-1, 1, 5)
+        separations, altitudes = directMoon(observatory, ra, dec, times)
+        def allowed(**limits):
+            return eventMoonConstraint(observatory, np.array([ra]), np.array([dec]), np.array([windowEnd]),
+                                       np.array([halfWindow]), **limits)[0]
+        '''With the Moon counted as always up, the event is allowed iff the separation is always large enough'''
+        assert allowed(minSeparation=separations.min() - 0.2, maxAltitude=-90.0)
+        assert not allowed(minSeparation=separations.min() + 0.2, maxAltitude=-90.0)
+        '''With any Moon that is up spoiling the event, it is allowed iff the Moon stays low enough'''
+        assert allowed(maxIllumination=-1.0, maxAltitude=altitudes.max() + 0.2)
+        assert not allowed(maxIllumination=-1.0, maxAltitude=altitudes.max() - 0.2)
+
+def test_no_events():
+    observatory = makeObserver('46:57:03.9', '-120:43:28.4', 1198.0, 10.0, '0')
+    assert len(eventMoonConstraint(observatory, np.zeros(0), np.zeros(0), np.zeros(0), np.zeros(0), 30.0)) == 0
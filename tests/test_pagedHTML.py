@@ -0,0 +1,81 @@
+'''
+The paged HTML report (reportSinks.PagedHTMLSink): its JavaScript payloads,
+whole or split by night or week, and gzip-compressed, hold the events of the
+CSV report of the same run, in order.
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+import calculateEphemerides as ephemerides
+from timeConversion import datestringsCSV
+
+def readPayload(path):
+    '''Label, column names and rows of a <report>.data.js payload'''
+    text = open(path).read()
+    assert text.startswith('loadEphemerides(') and text.endswith(');\n')
+    payload = json.loads(text[len('loadEphemerides('):-len(');\n')])
+    return payload['part'], payload['columns'], payload['rows']
+
+def pageSettings(path):
+    '''The settings the page passes to ephemerisTable.init'''
+    text = open(path).read()
+    start = text.index('ephemerisTable.init(') + len('ephemerisTable.init(')
+    return json.loads(text[start:text.index(');', start)])
+
+@pytest.mark.parametrize('split', ['none', 'night', 'week'])
+@pytest.mark.parametrize('options', [{}, {'sampling': True, 'show_lt': 1.0, 'timezone': '-7', 'html_gzip': True}])
+def test_payloads_match_csv(workspace, exoplanetDB, siteParameters, split, options):
+    parameters = siteParameters(20, html_format='paged', html_split=split, **options)
+    reportName = 'paged_'+split
+    ephemerides.writeEphemerides(parameters, exoplanetDB, reportName=reportName)
+    outputs = os.path.join(workspace, 'outputs')
+    csvRows = [line.split(',') for line in open(os.path.join(outputs, reportName+'.csv')).read().splitlines()[1:]]
+    assert len(csvRows) > 100
+
+    settings = pageSettings(os.path.join(outputs, reportName+'.html'))
+    assert settings['sampled'] == parameters['sampling']
+    assert settings['localTime'] == (parameters['show_lt'] != 0)
+    assert len(settings['parts']) == {'none': 1, 'night': 20, 'week': 3}[split]
+    noonOffset = ephemerides.localNoonOffset(parameters['longitude'])
+    rows = []
+    for part in settings['parts']:
+        payloadPath = os.path.join(outputs, part['file'])
+        label, columns, partRows = readPayload(payloadPath)
+        assert label == part['label']
+        assert len(partRows) == part['events']
+        if parameters['html_gzip']:
+            assert gzip.open(payloadPath+'.gz').read() == open(payloadPath).read()
+        if split != 'none':
+            ingress = np.array([row[columns.index('ingress')] for row in partRows])
+            nights = np.floor(ingress + noonOffset)
+            assert nights.max() - nights.min() < {'night': 1, 'week': 7}[split]
+        rows += partRows
+
+    '''The same events in the same order as the CSV report'''
+    assert len(rows) == len(csvRows)
+    column = dict((name, columns.index(name)) for name in columns)
+    ingressCSV = datestringsCSV([row[column['ingress']] for row in rows])
+    for row, csvRow, ingress in zip(rows, csvRows, ingressCSV):
+        assert [row[column['planet']], row[column['event']], row[column['ingress_direction']], row[column['egress_direction']],
+                row[column['magnitude']], str(row[column['conflicts']]), str(bool(row[column['scheduled']]))] == \
+               [csvRow[0], csvRow[1], csvRow[5], csvRow[9], csvRow[10], csvRow[-2 - 3*parameters['sampling']],
+                csvRow[-1 - 3*parameters['sampling']]]
+        assert ingress == ','.join(csvRow[2:4])
+        if parameters['sampling']:
+            assert '%.2f' % row[column['observable_fraction']] == csvRow[-3]
+        if parameters['show_lt']:
+            assert abs(row[column['ingress_local']] - row[column['ingress']] + 7/24.0) < 1e-9
+
+def test_empty_report(workspace, exoplanetDB, siteParameters):
+    '''A run without events still has a payload for the page to load'''
+    ephemerides.writeEphemerides(siteParameters(3, html_format='paged', mag_limit=-5.0), exoplanetDB, reportName='paged_empty')
+    settings = pageSettings(os.path.join(workspace, 'outputs', 'paged_empty.html'))
+    assert settings['parts'] == [{'label': 'all', 'file': 'paged_empty.data.js', 'events': 0}]
+    assert readPayload(os.path.join(workspace, 'outputs', 'paged_empty.data.js'))[2] == []
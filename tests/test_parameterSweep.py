@@ -0,0 +1,34 @@
+'''
+Parameter sweeps (parameterSweep.py): the counts and reports of every point
+of the grid are those of a single run with its limits.
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import csv
+
+import calculateEphemerides as ephemerides
+from parameterSweep import sweepGrid
+
+def test_sweep_matches_single_runs(workspace, exoplanetDB, siteParameters):
+    parameters = siteParameters(10, sweep_mag_limit='11, 16', sweep_depth_limit='0.001, 0.01', sweep_band='V, J',
+                                sweep_min_horizon='20:00:00, 35:00:00', sweep_twilight='-6, -12', sweep_reports=True)
+    ephemerides.sweepEphemerides(parameters, exoplanetDB, 'sweepTest')
+    outputs = os.path.join(workspace, 'outputs')
+    rows = list(csv.DictReader(open(os.path.join(outputs, 'sweepTest_sweep.csv'))))
+    grid = sweepGrid(parameters)
+    assert len(rows) == len(grid) == 32
+    assert max(int(row['Events']) for row in rows) > 50
+    for number, (point, row) in enumerate(zip(grid, rows)):
+        single = dict((key, value) for key, value in parameters.items() if not key.startswith('sweep_'))
+        single.update(point)
+        events = ephemerides.eventTable(single, exoplanetDB)
+        assert [int(row[column]) for column in ['Events', 'Transits', 'Eclipses', 'Planets']] == \
+               [len(events), (events['eventType'] == 'transit').sum(), (events['eventType'] == 'eclipse').sum(),
+                len(set(events['row']))], point
+        if number % 5 == 0:
+            ephemerides.writeEphemerides(single, exoplanetDB, reportName='sweepSingle')
+            for extension in ['.csv', '.html']:
+                assert open(os.path.join(outputs, 'sweepTest_sweep%i%s' % (number+1, extension))).read() == \
+                       open(os.path.join(outputs, 'sweepSingle'+extension)).read()
@@ -0,0 +1,43 @@
+'''
+The analytic prefilters of calculateEphemerides.py (risesAboveHorizon and
+prefilterEvents) never reject an event that the full visibility test keeps.
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+import pytest
+
+import calculateEphemerides as ephemerides
+from twilight import twilightTable
+
+sites = [('46:57:03.9', '-120:43:28.4', 1198.0, 10.0, '30:00:00'), ('-30:10:00', '70:48:00', 2200.0, 0.0, '10:00:00'),
+         ('68:00:00', '20:00:00', 300.0, -5.0, '45:00:00'), ('19:49:00', '-155:28:00', 4200.0, 0.0, '60:00:00')]
+
+@pytest.mark.parametrize('site', sites)
+@pytest.mark.parametrize('start', [2448000.5, 2457213.5, 2465000.5])
+def test_prefilter_keeps_visible_events(site, start):
+    rng = np.random.RandomState(int(start) % 1000)
+    number, end = 10000, start + 60.0
+    ras = rng.uniform(0.0, 2*np.pi, number)
+    decs = np.arcsin(rng.uniform(-1.0, 1.0, number))
+    midEvents = rng.uniform(start, end, number)
+    halfDurations = rng.uniform(0.0, 0.15, number)
+    dusk, dawn = twilightTable(ephemerides.makeObserver(*site), start, end, -6.0)
+    visible = ephemerides.visibleEvents(midEvents, halfDurations, ras, decs, site, dusk, dawn, 'ephem')[0]
+    assert visible.sum() > 10
+    possible = ephemerides.prefilterEvents(midEvents, halfDurations, ras, decs, site, dusk, dawn)
+    assert not np.any(visible*~possible)
+    assert possible.sum() < number/2
+    rises = ephemerides.risesAboveHorizon(decs, site, start, end)
+    assert not np.any(visible*~rises)
+
+@pytest.mark.parametrize('options', [{}, {'sampling': True, 'baseline_minutes': 30.0}])
+def test_same_events_without_prefilter(exoplanetDB, siteParameters, monkeypatch, options):
+    parameters = siteParameters(30, min_horizon='15:00:00', **options)
+    prefiltered = ephemerides.eventTable(parameters, exoplanetDB)
+    monkeypatch.setattr(ephemerides, 'prefilterEvents', lambda midEvents, *args: np.ones(len(midEvents), dtype=bool))
+    monkeypatch.setattr(ephemerides, 'risesAboveHorizon', lambda decs, *args: np.ones(len(decs), dtype=bool))
+    assert len(prefiltered) > 100
+    assert ephemerides.eventTable(parameters, exoplanetDB).tostring() == prefiltered.tostring()
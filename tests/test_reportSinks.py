@@ -0,0 +1,47 @@
+'''
+The diagnostics of a run (e.g. the events decided by each tier of the
+'tiered' visibility test) in the metadata of the HTML and columnar reports.
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import json
+import shutil
+import tempfile
+from StringIO import StringIO
+
+import numpy as np
+
+from reportSinks import ReportFields, HTMLSink, ColumnSink
+
+catalog = np.zeros(0, dtype=[('NAME', 'S20'), ('V', float), ('CONSTELLATION', 'S3')] +
+                             [(column, float) for name, column, unit in ColumnSink.planetColumns])
+diagnostics = {'events decided by the coarse screen': 483, 'events refined with PyEphem': 131}
+
+def test_html_note():
+    report = StringIO()
+    sink = HTMLSink(report, ReportFields(catalog, 'V'), 'Test', 'V', 2457213.5, 2457254.5)
+    sink.summarize(diagnostics)
+    sink.close()
+    text = report.getvalue()
+    assert 'Events decided by the coarse screen: 483, Events refined with PyEphem: 131.' in text
+
+def test_html_without_diagnostics():
+    report = StringIO()
+    sink = HTMLSink(report, ReportFields(catalog, 'V'), 'Test', 'V', 2457213.5, 2457254.5)
+    sink.close()
+    assert 'coarse screen' not in report.getvalue()
+
+def test_column_metadata():
+    directory = tempfile.mkdtemp()
+    try:
+        sink = ColumnSink(os.path.join(directory, 'columns'), ReportFields(catalog, 'V'), 'Test', 'V',
+                          2457213.5, 2457254.5)
+        sink.summarize(diagnostics)
+        sink.close()
+        for table in ['columns', os.path.join('columns', 'planets')]:
+            description = json.load(open(os.path.join(directory, table, 'columns.json')))
+            assert description['diagnostics'] == diagnostics
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,61 @@
+'''
+The per-night result cache (resultCache.py): cached runs reproduce a fresh
+run, settings that change the results use other cache directories, and the
+oldest nights are evicted.
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import shutil
+import tempfile
+
+import numpy as np
+
+import calculateEphemerides as ephemerides
+from resultCache import ResultCache, siteKey
+
+site = ('46:57:03.9', '-120:43:28.4', 1198.0, 10.0, '30:00:00')
+
+def clearCache(workspace):
+    shutil.rmtree(os.path.join(workspace, 'outputs', 'cache'), ignore_errors=True)
+
+def test_cache_hits_reproduce_a_fresh_run(workspace, exoplanetDB, siteParameters, capsys):
+    clearCache(workspace)
+    for backend in ['numpy', 'tiered']:
+        fresh = ephemerides.eventTable(siteParameters(altaz_backend=backend), exoplanetDB)
+        assert len(fresh) > 0
+        for run in range(2):
+            cached = ephemerides.eventTable(siteParameters(altaz_backend=backend, result_cache=True), exoplanetDB)
+            assert cached.tostring() == fresh.tostring()
+        assert 'Result cache: reused' in capsys.readouterr()[0]
+
+    '''A shorter window reuses the results of the longer one'''
+    shorter = ephemerides.eventTable(siteParameters(3, result_cache=True), exoplanetDB)
+    output = capsys.readouterr()[0]
+    reused, candidates = [int(word) for word in output.split('Result cache: reused ')[1].split()[:3:2]]
+    assert reused == candidates > 0
+    assert shorter.tostring() == ephemerides.eventTable(siteParameters(3), exoplanetDB).tostring()
+
+def test_tier_margin_in_key(workspace, exoplanetDB, siteParameters):
+    assert siteKey(site, -6, 'tiered', 0.05) != siteKey(site, -6, 'tiered', 0.5)
+    assert siteKey(site, -6, 'numpy', 0.05) == siteKey(site, -6, 'numpy', 0.5)
+    assert siteKey(site, -6, 'numpy', 0.05) != siteKey(site, -6, 'tiered', 0.05)
+    clearCache(workspace)
+    for margin in [0.05, 0.5]:
+        ephemerides.eventTable(siteParameters(2, altaz_backend='tiered', tier_margin=margin, result_cache=True), exoplanetDB)
+    assert len(os.listdir(os.path.join(workspace, 'outputs', 'cache'))) == 2
+
+def test_eviction():
+    directory = tempfile.mkdtemp()
+    try:
+        cache = ResultCache(directory, 'site', maxNights=3)
+        midEvents = 2457213.7 + np.arange(5)
+        keys, eventTypes = np.array(['a']*5), np.array(['transit']*5)
+        cache.store(keys, eventTypes, midEvents, np.ones(5, dtype=bool), np.zeros((5, 2)), np.zeros((5, 2)))
+        cache.save()
+        assert sorted(os.listdir(os.path.join(directory, 'site'))) == ['2457215.pkl', '2457216.pkl', '2457217.pkl']
+        found = ResultCache(directory, 'site', maxNights=3).lookup(keys, eventTypes, midEvents)[0]
+        assert list(found) == [False, False, True, True, True]
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,48 @@
+'''
+Overlap counts and weighted interval scheduling (schedule.py) against brute
+force, on random intervals that include intervals of no length (events with
+no known duration) at shared instants.
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import itertools
+
+import numpy as np
+
+from schedule import overlapCounts, weightedSchedule
+
+def overlaps(starts, ends):
+    '''Matrix of the pairs of distinct intervals that overlap: each starts before the other ends'''
+    matrix = (starts[:, np.newaxis] < ends[np.newaxis, :])*(starts[np.newaxis, :] < ends[:, np.newaxis])
+    np.fill_diagonal(matrix, False)
+    return matrix
+
+def randomIntervals(rng, number):
+    '''Intervals on a coarse grid of times, so that many share ends, with about a third of no length'''
+    starts = rng.randint(0, 10, number).astype(float)
+    lengths = rng.randint(0, 4, number)*(rng.uniform(size=number) > 0.3)
+    return starts, starts + lengths
+
+def test_overlap_counts():
+    rng = np.random.RandomState(0)
+    for trial in range(3000):
+        starts, ends = randomIntervals(rng, rng.randint(1, 12))
+        assert np.array_equal(overlapCounts(starts, ends), overlaps(starts, ends).sum(axis=1))
+
+def test_example_with_shared_instant():
+    assert list(overlapCounts([2, 4, 4], [5, 4, 4])) == [2, 1, 1]
+
+def test_weighted_schedule():
+    rng = np.random.RandomState(1)
+    for trial in range(500):
+        number = rng.randint(1, 9)
+        starts, ends = randomIntervals(rng, number)
+        weights = rng.uniform(0.1, 1.0, number)
+        conflicts = overlaps(starts, ends)
+        chosen = weightedSchedule(starts, ends, weights)
+        assert not conflicts[chosen][:, chosen].any()
+        best = max(weights[list(subset)].sum() for size in range(number + 1) for subset in itertools.combinations(range(number), size)
+                   if not conflicts[list(subset)][:, list(subset)].any())
+        assert np.isclose(weights[chosen].sum(), best)
@@ -0,0 +1,69 @@
+'''
+Queries of ephemerisServer.py over HTTP, on a small synthetic catalog.
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import json
+import shutil
+import tempfile
+import threading
+import urllib2
+
+import pytest
+
+from benchmark import syntheticCatalog, writeParFile
+from catalog import loadCatalog
+from ephemerisServer import EphemerisServer
+
+@pytest.fixture(scope='module')
+def server():
+    directory = tempfile.mkdtemp()
+    workingDirectory = os.getcwd()
+    os.chdir(directory)
+    os.mkdir('outputs')
+    csvPath = syntheticCatalog(os.path.join(directory, 'exoplanets.csv'), 300)
+    exoplanetDB = loadCatalog(csvPath, os.path.join(directory, 'exoplanetDB.npy'))
+    parPath = writeParFile(os.path.join(directory, 'site.par'), 7)
+    ephemerisServer = EphemerisServer(('127.0.0.1', 0), [parPath], exoplanetDB, tableDays=2.0)
+    thread = threading.Thread(target=ephemerisServer.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield ephemerisServer
+    ephemerisServer.shutdown()
+    ephemerisServer.server_close()
+    os.chdir(workingDirectory)
+    shutil.rmtree(directory)
+
+def get(server, query):
+    '''HTTP status and decoded JSON body of a GET request to `server`'''
+    try:
+        response = urllib2.urlopen('http://127.0.0.1:%i%s' % (server.server_address[1], query), timeout=60)
+    except urllib2.HTTPError, error:
+        return error.code, json.loads(error.read())
+    return response.getcode(), json.loads(response.read())
+
+def test_events(server):
+    status, events = get(server, '/events?start=2015-07-10&nights=7&mag_limit=16')
+    assert status == 200
+    assert len(events) > 0
+
+@pytest.mark.parametrize('query', ['twilight=dusk', 'altaz_backend=fast', 'sampling=True&altaz_backend=tiered',
+                                   'mag_limit=bright', 'band=Q', 'schedule_weight=luck'])
+def test_bad_queries(server, query):
+    status, body = get(server, '/events?start=2015-07-10&nights=1&'+query)
+    assert status == 400
+    assert 'error' in body
+
+def test_night_tables_are_reused(server):
+    '''Queries with a new twilight altitude compute its table once, without writing files'''
+    files = set(os.listdir('outputs'))
+    assert get(server, '/events?start=2015-07-10&nights=1&twilight=-12')[0] == 200
+    table = server.nightTables[server.siteNames[0], -12.0]
+    for day in range(11, 15):
+        assert get(server, '/events?start=2015-07-%i&nights=1&twilight=-12' % day)[0] == 200
+    assert get(server, '/events?start=2015-07-10&nights=1&twilight=-12.0')[0] == 200
+    assert server.nightTables[server.siteNames[0], -12.0] is table
+    assert len(server.nightTables) == 2
+    assert set(os.listdir('outputs')) == files
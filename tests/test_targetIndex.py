@@ -0,0 +1,57 @@
+'''
+Target selection from the sorted catalog index (targetIndex.py) against the
+boolean mask over the whole catalog that it replaced.
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+import pytest
+
+from targetIndex import TargetIndex, targetIndex
+
+def maskSelection(exoplanetDB, band, mag_limit, depth_limit):
+    '''The selection of calculateEphemerides.selectTargets before the index'''
+    magnitudes = exoplanetDB[band]
+    depths = exoplanetDB['DEPTH']
+    with np.errstate(invalid='ignore'):
+        return (magnitudes != 0.0)*(depths != 0.0)*(magnitudes <= mag_limit)*(depths >= depth_limit)*\
+               (exoplanetDB['TRANSIT'] == 1)*(exoplanetDB['TT'] > 0.0)*(exoplanetDB['PER'] > 0.0)*np.isfinite(exoplanetDB['RA_RAD'])
+
+@pytest.fixture
+def catalog(exoplanetDB):
+    '''The synthetic catalog with empty, zero and ineligible entries, and ties at the limits'''
+    rng = np.random.RandomState(18)
+    catalog = exoplanetDB.copy()
+    index = TargetIndex(catalog)
+    for column in index.bands+['DEPTH', 'TT', 'PER', 'RA_RAD']:
+        catalog[column][rng.randint(0, len(catalog), 20)] = np.nan
+        catalog[column][rng.randint(0, len(catalog), 10)] = 0.0
+    catalog['TRANSIT'][rng.randint(0, len(catalog), 20)] = 0
+    catalog['V'][:30] = 12.0
+    catalog['DEPTH'][:30:2] = 0.005
+    return catalog
+
+def test_matches_mask(catalog):
+    index = TargetIndex(catalog)
+    assert sorted(index.bands) == sorted(['B', 'V', 'I', 'J', 'H', 'KS'])
+    rng = np.random.RandomState(0)
+    limits = [(12.0, 0.005), (np.inf, 0.0), (-np.inf, 0.0), (16.0, np.inf), (20.0, -1.0)]
+    limits += zip(rng.uniform(5.0, 17.0, 200), 10**rng.uniform(-4.0, -1.0, 200))
+    for band in index.bands:
+        for magLimit, depthLimit in limits:
+            selected = index.select(band, magLimit, depthLimit)
+            assert selected.dtype == bool
+            assert np.array_equal(selected, maskSelection(catalog, band, magLimit, depthLimit))
+    assert index.select('V', 12.0, 0.005).sum() >= 10
+
+def test_unknown_band(catalog):
+    with pytest.raises(ValueError):
+        TargetIndex(catalog).select('U', 12.0, 0.0)
+
+def test_index_per_catalog(catalog, exoplanetDB):
+    '''Built once for each catalog object, and never shared between two catalogs'''
+    assert targetIndex(catalog) is targetIndex(catalog)
+    assert targetIndex(catalog) is not targetIndex(exoplanetDB)
+    assert np.array_equal(targetIndex(exoplanetDB).select('V', 13.0, 0.001), maskSelection(exoplanetDB, 'V', 13.0, 0.001))
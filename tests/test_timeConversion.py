@@ -0,0 +1,50 @@
+'''
+Batch conversions of julian dates (timeConversion.py) against the scalar
+astropy `jd2gd` of calculateEphemerides.py, and local time offsets across
+daylight saving changes against pytz applied to each instant directly.
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import datetime
+
+import numpy as np
+import pytest
+
+from calculateEphemerides import jd2gd
+from timeConversion import jd2gdArray, utcOffsets, datestrings, julianDate
+
+def test_gregorian_dates():
+    random = np.random.RandomState(5)
+    jd = np.r_[2457213.5 + random.uniform(0, 3650, 200), 2457213.5, 2457213.5 + np.arange(1, 48)/24.0]
+    dates = zip(*jd2gdArray(jd))
+    for time, date in zip(jd, dates):
+        assert date == jd2gd(time)
+    assert datestrings([2457213.5])[0] == '2015/7/10 00:00:00'
+
+def test_fixed_offsets():
+    jd = 2457213.5 + np.arange(10)/7.0
+    assert np.all(utcOffsets(jd, '-8') == -8.0/24.0)
+    assert np.all(utcOffsets(jd, '5.5') == 5.5/24.0)
+
+@pytest.mark.parametrize('zone, change', [('America/Los_Angeles', '2015-03-08T10:00'),
+                                          ('America/Los_Angeles', '2015-11-01T09:00'),
+                                          ('Australia/Lord_Howe', '2015-10-03T15:30'),
+                                          ('Australia/Lord_Howe', '2015-04-04T14:30')])
+def test_offsets_across_change(zone, change):
+    '''Every 7 minutes through the day around each change, including the UT hours of the local gap or overlap'''
+    pytz = pytest.importorskip('pytz')
+    timezone = pytz.timezone(zone)
+    jd = julianDate(change) + np.arange(-12*60, 12*60, 7)/1440.0
+    offsets = utcOffsets(jd, zone)
+    for time, offset in zip(jd, offsets):
+        utc = datetime.datetime(*jd2gd(time))
+        expected = pytz.utc.localize(utc).astimezone(timezone).utcoffset().total_seconds()/86400.0
+        assert offset == expected
+    assert len(np.unique(offsets)) == 2
+
+def test_spring_forward_evening():
+    '''02:00 UT on the US spring-forward Sunday is Saturday evening in Los Angeles, still on standard time'''
+    pytest.importorskip('pytz')
+    assert utcOffsets([julianDate('2015-03-08T02:00')], 'America/Los_Angeles')[0]*24.0 == -8.0
@@ -0,0 +1,108 @@
+'''
+Dense sampling of the events (transitSampling.sampleEvents) on synthetic
+tracks: a star near the zenith under a night that starts or ends during the
+event, a star setting below the horizon limit, one that never rises, and
+random events checked against a loop over their samples.
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ephem
+import numpy as np
+
+from calculateEphemerides import makeObserver
+from transitSampling import sampleEvents, airmass
+from vectorEphem import observerAltAz
+
+site = ('46:57:03.9', '-120:43:28.4', 1198.0, 10.0, '30:00:00')
+midEvent = 2457215.25
+
+def zenithStar(observatory, jd):
+    '''J2000 coordinates of a star at the zenith of `observatory` at `jd`'''
+    observatory.date = jd - 2415020.0
+    observatory.epoch = ephem.J2000
+    return observatory.radec_of(0.0, np.pi/2)
+
+def sampleTimes(midEvent, halfDuration, baseline, step):
+    '''The samples of one event, as sampleEvents spaces them'''
+    window = 2*(halfDuration + baseline)
+    samples = int(np.ceil(window/step)) + 1
+    return midEvent - halfDuration - baseline + window*np.arange(samples)/float(samples - 1)
+
+def test_night_edges_during_the_event():
+    '''Window of 0.1 days in 14 intervals: the night starts after sample 7 and ends after sample 11'''
+    observatory = makeObserver(*site)
+    ra, dec = zenithStar(observatory, midEvent)
+    ingress, window = midEvent - 0.04, 0.1
+    dusk = np.array([midEvent - 3.0, ingress + 0.51*window])
+    dawn = np.array([midEvent - 2.6, ingress + 0.8*window])
+    fractions, minAltitudes, maxAirmasses, altitudes, azimuths = sampleEvents(
+        [midEvent], [0.04], np.array([ra]), np.array([dec]), observatory, dusk, dawn, baseline=0.01, step=0.0075)
+    assert len(sampleTimes(midEvent, 0.04, 0.01, 0.0075)) == 15
+    assert fractions[0] == 4/15.0
+    assert minAltitudes[0] > 70.0
+    assert 1.0 < maxAirmasses[0] < 1.05
+    assert np.all(altitudes > 70.0)
+
+    '''Without the night, nothing is observable'''
+    fractions, minAltitudes, maxAirmasses = sampleEvents(
+        [midEvent], [0.04], np.array([ra]), np.array([dec]), observatory, dusk[:1], dawn[:1], baseline=0.01, step=0.0075)[:3]
+    assert fractions[0] == 0.0
+    assert np.isnan(maxAirmasses[0])
+
+def test_star_setting_during_the_event():
+    '''A star at the zenith at ingress, followed for eight hours under a night that covers it all'''
+    observatory = makeObserver(*site)
+    ra, dec = zenithStar(observatory, midEvent - 1/6.0)
+    dusk, dawn = np.array([midEvent - 1.0]), np.array([midEvent + 1.0])
+    fractions, minAltitudes, maxAirmasses = sampleEvents(
+        [midEvent], [1/6.0], np.array([ra]), np.array([dec]), observatory, dusk, dawn, step=1/1440.0)[:3]
+    times = sampleTimes(midEvent, 1/6.0, 0.0, 1/1440.0)
+    alt = np.degrees(observerAltAz(ra, dec, times, observatory)[0])
+    assert np.all(np.diff(alt) < 0)
+    above = alt > 30.0
+    assert 0.2 < above.mean() < 0.8
+    assert fractions[0] == above.mean()
+    assert minAltitudes[0] == alt.min()
+    assert maxAirmasses[0] == airmass(alt[above].min())
+
+    '''A star that never rises at this latitude'''
+    fractions, minAltitudes, maxAirmasses = sampleEvents(
+        [midEvent], [1/6.0], np.array([ra]), np.array([-np.radians(80.0)]), observatory, dusk, dawn)[:3]
+    assert fractions[0] == 0.0
+    assert minAltitudes[0] < 0.0
+    assert np.isnan(maxAirmasses[0])
+
+def test_against_sample_loop():
+    '''Events of many lengths in small blocks, against one event and one sample at a time'''
+    rng = np.random.RandomState(16)
+    number = 300
+    observatory = makeObserver(*site)
+    midEvents = rng.uniform(2457213.5, 2457223.5, number)
+    halfDurations = rng.uniform(0.01, 0.12, number)
+    ras = rng.uniform(0.0, 2*np.pi, number)
+    decs = np.arcsin(rng.uniform(-0.5, 1.0, number))
+    '''Synthetic nights of varying length, one per day'''
+    dusk = 2457212.5 + np.arange(13) + rng.uniform(0.05, 0.25, 13)
+    dawn = dusk + rng.uniform(0.2, 0.5, 13)
+    baseline, step = 20/1440.0, 4/1440.0
+    fractions, minAltitudes, maxAirmasses, altitudes = sampleEvents(
+        midEvents, halfDurations, ras, decs, observatory, dusk, dawn, baseline=baseline, step=step, blockSize=500)[:4]
+    assert 0 < np.sum(fractions == 0) < number
+    assert 0 < np.sum((fractions > 0)*(fractions < 1))
+    for event in range(number):
+        times = sampleTimes(midEvents[event], halfDurations[event], baseline, step)
+        assert np.max(np.diff(times)) <= step
+        alt = np.degrees(observerAltAz(ras[event], decs[event], times, observatory)[0])
+        dark = np.array([np.any((dusk <= time)*(time < dawn)) for time in times])
+        observable = (alt > 30.0)*dark
+        assert abs(fractions[event] - observable.mean()) < 1e-12
+        assert np.allclose(minAltitudes[event], alt.min(), rtol=0, atol=1e-9)
+        if observable.any():
+            assert np.allclose(maxAirmasses[event], airmass(alt[observable].min()), rtol=1e-9, atol=0)
+        else:
+            assert np.isnan(maxAirmasses[event])
+        edges = [midEvents[event] - halfDurations[event], midEvents[event] + halfDurations[event]]
+        assert np.allclose(altitudes[event], np.degrees(observerAltAz(ras[event], decs[event], np.array(edges), observatory)[0]),
+                           rtol=0, atol=1e-9)
@@ -0,0 +1,30 @@
+'''
+The night table cache of twilight.py against tables computed directly.
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import shutil
+import tempfile
+
+import numpy as np
+
+import twilight
+from calculateEphemerides import makeObserver
+
+def test_rolling_windows():
+    directory = tempfile.mkdtemp()
+    try:
+        observatory = makeObserver('46:57:03.9', '-120:43:28.4', 1198.0, 10.0, '30:00:00')
+        for start in [2457213.5, 2457214.5, 2457216.2, 2457205.0, 2457600.5]:
+            twilight._tableCache.clear()        ## As in a new run, which reads the pickle
+            dusk, dawn = twilight.cachedTwilightTable(observatory, start, start + 7, -12.0, directory)
+            expectedDusk, expectedDawn = twilight.twilightTable(observatory, start, start + 7, -12.0)
+            nearest = np.argmin(np.abs(dusk[:, np.newaxis] - expectedDusk), axis=0)
+            assert np.abs(dusk[nearest] - expectedDusk).max() < 1e-5    ## Within a second
+            assert np.abs(dawn[nearest] - expectedDawn).max() < 1e-5
+            assert np.all(dusk[1:] > dawn[:-1])
+        assert len(os.listdir(directory)) == 1
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,70 @@
+'''
+The NumPy alt/az engine (vectorEphem.py) against ephem.FixedBody, and the
+two-tier backend against the whole-degree altitudes, compass directions and
+horizon tests that the reports take from PyEphem.
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ephem
+import numpy as np
+import pytest
+
+from calculateEphemerides import makeObserver
+from vectorEphem import observerAltAz, tieredAltAz, azToDirection, ephemDateOffset
+
+sites = [('46:57:03.9', '-120:43:28.4', 1198.0, 10.0, '30:00:00'), ('-30:10:00', '70:48:00', 2200.0, 0.0, '20:00:00'),
+         ('0:00:00', '0:00:00', 0.0, 25.0, '15:00:00')]
+
+def randomPositions(rng, number):
+    '''Stars spread uniformly over the sky, at times spread over 1990-2040'''
+    ra = rng.uniform(0.0, 2*np.pi, number)
+    dec = np.arcsin(rng.uniform(-1.0, 1.0, number))
+    jd = rng.uniform(2447892.5, 2466154.5, number)
+    return ra, dec, jd
+
+def fixedBodies(ra, dec, jd, observatory):
+    '''Altitude and azimuth (radians) of each star at each time, one ephem.FixedBody at a time'''
+    alt, az = np.empty(len(ra)), np.empty(len(ra))
+    for i in range(len(ra)):
+        observatory.date = ephem.Date(jd[i] - ephemDateOffset)
+        star = ephem.FixedBody()
+        star._ra, star._dec = ra[i], dec[i]
+        star.compute(observatory)
+        alt[i], az[i] = float(star.alt), float(star.az)
+    return alt, az
+
+@pytest.mark.parametrize('site', sites)
+def test_numpy_engine(site):
+    rng = np.random.RandomState(len(site[0]))
+    ra, dec, jd = randomPositions(rng, 3000)
+    observatory = makeObserver(*site)
+    alt, az = observerAltAz(ra, dec, jd, observatory)
+    expectedAlt, expectedAz = fixedBodies(ra, dec, jd, observatory)
+    above = np.degrees(expectedAlt) > 5.0
+    assert above.sum() > 500
+    assert np.abs(np.degrees(alt - expectedAlt)[above]).max() < 0.02
+    azError = np.degrees(np.angle(np.exp(1j*(az - expectedAz))))*np.cos(expectedAlt)
+    assert np.abs(azError[above]).max() < 0.02
+
+    '''Every star at every time, by broadcasting'''
+    gridAlt, gridAz = observerAltAz(ra[:20, np.newaxis], dec[:20, np.newaxis], jd[np.newaxis, :30], observatory)
+    assert gridAlt.shape == (20, 30)
+    assert np.allclose(gridAlt[5, 7], observerAltAz(ra[5], dec[5], jd[7], observatory)[0])
+
+@pytest.mark.parametrize('site', sites)
+def test_tiered_backend(site):
+    '''The quantities in the reports are those of PyEphem'''
+    rng = np.random.RandomState(7)
+    ra, dec, jd = randomPositions(rng, 3000)
+    observatory = makeObserver(*site)
+    alt, az, refined = tieredAltAz(ra, dec, jd, observatory)
+    expectedAlt, expectedAz = fixedBodies(ra, dec, jd, observatory)
+    horizon = float(observatory.horizon)
+    assert np.array_equal(alt > horizon, expectedAlt > horizon)
+    above = expectedAlt > horizon
+    assert np.array_equal(np.floor(np.degrees(alt[above])), np.floor(np.degrees(expectedAlt[above])))
+    assert np.array_equal(azToDirection(np.floor(np.degrees(az[above]))),
+                          azToDirection(np.floor(np.degrees(expectedAz[above]))))
+    assert 0 < refined.sum() < len(refined)/2
@@ -0,0 +1,18 @@
+'''
+Visibility tests in a pool of worker processes (`workers` in the .par file)
+give the same events as a serial run.
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pytest
+
+import calculateEphemerides as ephemerides
+
+@pytest.mark.parametrize('options', [{}, {'altaz_backend': 'tiered'}, {'sampling': True}])
+def test_workers_match_serial(exoplanetDB, siteParameters, options):
+    serial = ephemerides.eventTable(siteParameters(20, workers=1, **options), exoplanetDB)
+    parallel = ephemerides.eventTable(siteParameters(20, workers=4, **options), exoplanetDB)
+    assert len(serial) > 100
+    assert parallel.tostring() == serial.tostring()
@@ -0,0 +1,158 @@
+'''
+Batch conversions from julian dates to PyEphem dates, Gregorian dates and the
+formatted UT and local time strings used in the ephemeris reports.
+
+Every function takes an array of julian dates and converts them all in one
+vectorized pass, so no astropy Time objects, ISO strings or per-event calls
+to ephem.localtime are needed in the computation or reporting paths.
+`julianDate` reads the dates given on command lines and in queries.
+'''
+import numpy as np
+import calendar
+import datetime
+import time
+
+from vectorEphem import ephemDateOffset
+
+try:
+    import pytz
+except ImportError:
+    pytz = None
+
+def jd2ephemDate(jd):
+    '''
+    Parameters
+    ----------
+    jd : float or array
+        Time in julian date
+    Returns
+    -------
+    dates : float or array
+        PyEphem dates (days since 1899/12/31 12:00 UT), accepted anywhere
+        PyEphem expects an ephem.Date
+    '''
+    return np.asarray(jd, dtype=np.float64) - ephemDateOffset
+
+def jd2gdArray(jd):
+    '''
+    Parameters
+    ----------
+    jd : float or array
+        Time in julian date
+    Returns
+    -------
+    year, month, day, hour, minute, second : array of int
+        Gregorian date of each julian date. Like `jd2gd`, the time is
+        rounded to the millisecond and the seconds are then truncated.
+    '''
+    milliseconds = np.round((np.asarray(jd, dtype=np.float64) + 0.5)*86400000.0).astype(np.int64)
+    dayNumber = milliseconds//86400000
+    millisecondOfDay = milliseconds % 86400000
+
+    '''Fliegel & Van Flandern (1968) conversion from julian day number to Gregorian date'''
+    l = dayNumber + 68569
+    n = 4*l//146097
+    l = l - (146097*n + 3)//4
+    i = 4000*(l + 1)//1461001
+    l = l - 1461*i//4 + 31
+    j = 80*l//2447
+    day = l - 2447*j//80
+    l = j//11
+    month = j + 2 - 12*l
+    year = 100*(n - 49) + i + l
+
+    hour = millisecondOfDay//3600000
+    minute = (millisecondOfDay//60000) % 60
+    second = (millisecondOfDay//1000) % 60
+    return year, month, day, hour, minute, second
+
+def utcOffsets(jd, timezone=None):
+    '''
+    Parameters
+    ----------
+    jd : array
+        Time in julian date (UT)
+    timezone : str or None
+        Site timezone: either a fixed offset from UT in hours (e.g. '-8'), an
+        IANA timezone name (e.g. 'America/Los_Angeles', requires pytz), or
+        None for the local timezone of this computer, as ephem.localtime uses
+    Returns
+    -------
+    offsets : array
+        Local time minus UT, in days, at each julian date
+    '''
+    jd = np.asarray(jd, dtype=np.float64)
+    if timezone is not None:
+        try:
+            return np.zeros_like(jd) + float(timezone)/24.0
+        except ValueError:
+            if pytz is None:
+                raise ImportError("The timezone '%s' requires pytz; give an offset in hours instead" % timezone)
+            timezone = pytz.timezone(timezone)
+
+    '''Offsets change on the minute at most (some zones, e.g. Australia/Lord_Howe, 
+        change at half past the hour), so evaluate them once per distinct minute, 
+        rounding to the millisecond first like `jd2gdArray`'''
+    minutes, inverse = np.unique(np.round(jd*86400000.0).astype(np.int64)//60000, return_inverse=True)
+    offsets = np.empty(len(minutes))
+    for k, minute in enumerate(minutes):
+        utc = datetime.datetime(1858, 11, 17) + datetime.timedelta(minutes=int(minute) - 2400000.5*1440)
+        if timezone is None:
+            timestamp = calendar.timegm(utc.timetuple())
+            offset = datetime.datetime.fromtimestamp(timestamp) - datetime.datetime.utcfromtimestamp(timestamp)
+        else:
+            offset = pytz.utc.localize(utc).astimezone(timezone).utcoffset()   ## utc is UT, not local wall-clock time
+        offsets[k] = offset.total_seconds()/86400.0
+    return offsets[inverse].reshape(jd.shape)
+
+def datestrings(jd):
+    '''"2013/1/18 20:08:18"-style strings (as used by PyEphem) for each julian date'''
+    return ['%i/%i/%i %02i:%02i:%02i' % date for date in zip(*jd2gdArray(jd))]
+
+def datestringsCSV(jd):
+    '''"2013/1/18,20:08:18"-style date and time columns for each julian date'''
+    return ['%i/%i/%i,%02i:%02i:%02i' % date for date in zip(*jd2gdArray(jd))]
+
+def datestringsHTML(jd, altitudes=None, directions=None):
+    '''
+    "01/<strong>18</strong>, 20:08"-style table cells for each julian date,
+    followed by the altitude and compass direction when they are given
+    '''
+    year, month, day, hour, minute, second = jd2gdArray(jd)
+    cells = ['%02i/<strong>%02i</strong>, %02i:%02i' % date for date in zip(month, day, hour, minute)]
+    if altitudes is not None:
+        cells = [cell+'<br /> '+alt+'&deg; '+direction for cell, alt, direction in zip(cells, altitudes, directions)]
+    return cells
+
+def datestringsHTML_LT(jd, altitudes=None, directions=None, timezone=None):
+    '''Same as `datestringsHTML`, in the local time of the site's `timezone`'''
+    jd = np.asarray(jd, dtype=np.float64)
+    return datestringsHTML(jd + utcOffsets(jd, timezone), altitudes, directions)
+
+def julianDate(value):
+    '''
+    Parameters
+    ----------
+    value : str
+        A julian date, or a UT date formatted as YYYY-MM-DD, YYYY-MM-DDTHH:MM
+        or YYYY-MM-DDTHH:MM:SS
+    Returns
+    -------
+    jd : float
+        Julian date
+    '''
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for dateFormat in ['%Y-%m-%d', '%Y-%m-%dT%H:%M', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S']:
+        try:
+            date = datetime.datetime.strptime(value, dateFormat)
+        except ValueError:
+            continue
+        return calendar.timegm(date.timetuple())/86400.0 + 2440587.5
+    raise ValueError("Can't read the date '%s', expected YYYY-MM-DD[THH:MM[:SS]] or a julian date" % value)
+
+def currentJulianDate():
+    '''Julian date now'''
+    return time.time()/86400.0 + 2440587.5
@@ -0,0 +1,110 @@
+'''
+Dense sampling of the host star's altitude and the darkness of the sky across
+each candidate event.
+
+The two-point test of calculateEphemerides.visibleEvents only looks at the
+instants of ingress and egress, so it accepts events during which the star
+dips below the horizon limit or the sky brightens, and it cannot tell a
+partly observable event, or one without out-of-transit baseline, from one
+that is fully observable. Here every event is sampled on a time grid spanning
+the transit and a baseline before and after it, no coarser than the requested
+step. The altitude and airmass of the star are computed for all samples of a
+block of events in one call to vectorEphem.observerAltAz, and the Sun is
+below the twilight altitude at a sample if it falls between dusk and dawn in
+the site's night table. Events are grouped by their number of samples, so the
+blocks are rectangular arrays with no padding.
+'''
+import numpy as np
+
+from vectorEphem import observerAltAz
+from twilight import duringNight
+from profiling import count
+
+def airmass(altitude):
+    '''
+    Parameters
+    ----------
+    altitude : float or array
+        Apparent altitude in degrees
+    Returns
+    -------
+    airmass : float or array
+        Relative airmass (Kasten & Young 1989), infinite below the horizon
+    '''
+    altitude = np.asarray(altitude, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mass = 1.0/(np.sin(np.radians(altitude)) + 0.50572*(altitude + 6.07995)**-1.6364)
+    return np.where(altitude > 0, mass, np.inf)
+
+def sampleEvents(midEvents, halfDurations, ras, decs, observatory, dusk, dawn, baseline=0.0, step=5.0/1440,
+                 altazBackend='numpy', blockSize=2**18):
+    '''
+    Parameters
+    ----------
+    midEvents, halfDurations : array
+        Julian date of the middle of each event and half of its duration (days)
+    ras, decs : array
+        J2000 coordinates of the host star of each event in radians
+    observatory : ephem.Observer
+        Observer describing the site; its horizon is the altitude limit
+    dusk, dawn : array
+        Night table for the site, from `twilight.twilightTable`
+    baseline : float
+        Out-of-event time (days) sampled before ingress and after egress
+    step : float
+        Largest interval (days) between samples
+    altazBackend : str
+        'numpy' or 'ephem', see `vectorEphem.observerAltAz`
+    blockSize : int
+        Largest number of samples computed at once, which bounds the memory use
+    Returns
+    -------
+    fractions : array
+        Fraction of the samples of each event, from ingress - baseline to
+        egress + baseline, with the star above the horizon limit and the Sun
+        below the twilight altitude
+    minAltitudes : array
+        Lowest altitude of the star in degrees over the samples
+    maxAirmasses : array
+        Highest airmass over the observable samples, NaN if there are none
+    altitudes : array
+        Altitudes in degrees at ingress and egress, shape (N, 2)
+    azimuths : array
+        Azimuths in degrees at ingress and egress, shape (N, 2)
+    '''
+    midEvents = np.asarray(midEvents, dtype=np.float64)
+    halfDurations = np.asarray(halfDurations, dtype=np.float64)
+    fractions = np.zeros(len(midEvents))
+    minAltitudes = np.zeros(len(midEvents))
+    maxAirmasses = np.zeros(len(midEvents))
+    altitudes = np.zeros((len(midEvents), 2))
+    azimuths = np.zeros((len(midEvents), 2))
+    horizon = np.degrees(float(observatory.horizon))
+
+    windows = 2*(halfDurations + baseline)
+    sampleCounts = np.ceil(windows/step).astype(int) + 1
+    order = np.argsort(sampleCounts, kind='mergesort')
+    groupStarts = np.flatnonzero(np.r_[True, np.diff(sampleCounts[order]) != 0]) if len(order) else np.zeros(0, dtype=int)
+    groupEnds = np.r_[groupStarts[1:], len(order)]
+    for groupStart, groupEnd in zip(groupStarts, groupEnds):
+        samples = sampleCounts[order[groupStart]]
+        grid = np.arange(samples)/float(max(samples - 1, 1))
+        eventsPerBlock = max(blockSize//(samples + 2), 1)
+        for first in range(groupStart, groupEnd, eventsPerBlock):
+            block = order[first:min(first + eventsPerBlock, groupEnd)]
+            ingress, egress = midEvents[block] - halfDurations[block], midEvents[block] + halfDurations[block]
+            '''Ingress and egress first, for the reports, then the evenly spaced samples'''
+            times = np.column_stack([ingress, egress, (ingress - baseline)[:, np.newaxis] + windows[block][:, np.newaxis]*grid])
+            alt, az = observerAltAz(ras[block][:, np.newaxis], decs[block][:, np.newaxis], times, observatory, altazBackend)
+            alt = np.degrees(alt)
+            altitudes[block] = alt[:, :2]
+            azimuths[block] = np.degrees(az[:, :2])
+
+            sampleAlts = alt[:, 2:]
+            observable = (sampleAlts > horizon)*duringNight(dusk, dawn, times[:, 2:])
+            fractions[block] = observable.mean(axis=1)
+            minAltitudes[block] = sampleAlts.min(axis=1)
+            maxAirmasses[block] = np.where(observable, airmass(sampleAlts), -np.inf).max(axis=1)
+            count('altitude samples', times.size)
+    maxAirmasses[fractions == 0] = np.nan
+    return fractions, minAltitudes, maxAirmasses, altitudes, azimuths
@@ -6,18 +6,33 @@ Created on Wed May 14 13:51:43 2014
 """
 
 import os
+import sys
 import webbrowser
 from calculateEphemerides import *
 
-# Path to ".par" file, with the observatory parameters
-parfile = 'mro.par'
+# Path to ".par" file, with the observatory parameters. Several ".par" files
+# may be given on the command line to calculate the ephemerides of several
+# observatories in one batch
+parfiles = sys.argv[1:] if len(sys.argv) > 1 else ['mro.par']
 
-# Path to the output HTML file -- this script will assume that the
+# Path to the output HTML file(s) -- this script will assume that the
 # "html_out" parameter in the .par file is set to True
-outputPath = os.path.join(os.path.dirname(os.path.abspath(__file__)),'outputs','eventReport.html')
+outputDir = os.path.join(os.path.dirname(os.path.abspath(__file__)),'outputs')
 
-# Calculate the ephemeris for all visible planets within stated limits
-calculateEphemerides(parfile)
+# Guard the driver so that worker processes (see the "workers" parameter)
+# can import this module without re-running it
+if __name__ == '__main__':
+    # Calculate the ephemeris for all visible planets within stated limits
+    if len(parfiles) == 1:
+        calculateEphemerides(parfiles[0])
+        outputPaths = [os.path.join(outputDir,'eventReport.html')]
+    else:
+        batchEphemerides(parfiles)
+        outputPaths = [os.path.join(outputDir,'eventReport_'+os.path.splitext(os.path.basename(parfile))[0]+'.html')
+                       for parfile in parfiles]
 
-# Open the HTML output in a new tab of the default browser
-webbrowser.open_new_tab("file:"+2*os.sep+outputPath)
\ No newline at end of file
+    # Open the HTML output in a new tab of the default browser (a parameter
+    # sweep writes a summary instead of eventReport.html)
+    for outputPath in outputPaths:
+        if os.path.exists(outputPath):
+            webbrowser.open_new_tab("file:"+2*os.sep+outputPath)
@@ -0,0 +1,142 @@
+'''
+Per-night table of dusk and dawn times at the observatory's twilight altitude.
+
+The Sun is the same for every target, so rather than computing ephem.Sun() at
+the ingress and egress of every candidate event, the twilight crossings are
+found once per night for the whole observing window. Whether an event happens
+in darkness is then an interval lookup with np.searchsorted. The nights are
+kept in memory and pickled to disk, one table per site and twilight altitude,
+so they are shared by every planet in a run and reused by later runs.
+'''
+import ephem	 ## PyEphem module
+import numpy as np
+import cPickle
+import hashlib
+import os.path
+
+from vectorEphem import ephemDateOffset
+from profiling import count
+
+_tableCache = {}      ## Nights computed for each site and twilight altitude, see `cachedTwilightTable`
+
+def twilightTable(observatory, start, end, twilight):
+    '''
+    Parameters
+    ----------
+    observatory : ephem.Observer
+        Observer describing the site. Its date and horizon are left unchanged.
+    start, end : float
+        Julian dates bounding the observing window
+    twilight : float
+        Altitude of the Sun in degrees that defines dusk and dawn
+    Returns
+    -------
+    dusk, dawn : array
+        Sorted julian dates of the beginning and end of each night that
+        overlaps the window (padded by one day on either side)
+    '''
+    site = ephem.Observer()
+    site.lat, site.long = observatory.lat, observatory.long
+    site.elevation, site.temp, site.pressure = observatory.elevation, observatory.temp, observatory.pressure
+    site.horizon = ephem.degrees(str(twilight))
+    sun = ephem.Sun()
+
+    dusk, dawn = [], []
+    time = start - 1.0
+    while time < end + 1.0:
+        try:
+            setting = site.next_setting(sun, start=time - ephemDateOffset, use_center=True) + ephemDateOffset
+            rising = site.next_rising(sun, start=setting - ephemDateOffset, use_center=True) + ephemDateOffset
+        except ephem.AlwaysUpError:
+            '''The Sun never dips below the twilight altitude: no night'''
+            time += 1.0
+            continue
+        except ephem.NeverUpError:
+            '''The Sun never climbs above the twilight altitude: night all day'''
+            setting, rising = time, time + 1.0
+        count('ephem twilight searches',2)
+        dusk.append(setting)
+        dawn.append(rising)
+        time = rising
+    return np.array(dusk), np.array(dawn)
+
+def siteKey(observatory, twilight):
+    '''Key of the night tables of a site and twilight altitude'''
+    return repr((float(observatory.lat), float(observatory.long), float(observatory.elevation),
+                 float(observatory.temp), float(observatory.pressure), float(twilight)))
+
+def mergeNights(table, newTable):
+    '''Add the nights of `newTable` that `table` does not have (dusk more than half a day from all of its dusks)'''
+    dusk, dawn = table
+    newDusk, newDawn = newTable
+    if len(dusk) and len(newDusk):
+        after = np.minimum(np.searchsorted(dusk, newDusk), len(dusk) - 1)
+        before = np.maximum(after - 1, 0)
+        distance = np.minimum(np.abs(newDusk - dusk[after]), np.abs(newDusk - dusk[before]))
+        newDusk, newDawn = newDusk[distance > 0.5], newDawn[distance > 0.5]
+    dusk, dawn = np.concatenate([dusk, newDusk]), np.concatenate([dawn, newDawn])
+    order = np.argsort(dusk)
+    return dusk[order], dawn[order]
+
+def cachedTwilightTable(observatory, start, end, twilight, cacheDir=None, maxGap=366.0):
+    '''
+    Same as `twilightTable`, but the nights are kept, in memory and pickled
+    in `cacheDir`, in one table per site and twilight altitude. A window
+    within the nights already computed is answered from the table; otherwise
+    only the missing nights are computed and added to it, so a rolling
+    window adds one night per run. A window more than `maxGap` days from
+    the nights computed so far starts a new table instead. The table
+    returned may extend a few nights past the window either side.
+    '''
+    key = siteKey(observatory, twilight)
+    entry = _tableCache.get(key)
+    cachePath = os.path.join(cacheDir, 'nights_'+hashlib.md5(key).hexdigest()+'.pkl') if cacheDir is not None else None
+    if entry is None and cachePath is not None and os.path.exists(cachePath):
+        inputFile = open(cachePath, 'rb')
+        entry = cPickle.load(inputFile)
+        inputFile.close()
+
+    changed = True
+    if entry is None or start > entry['end'] + maxGap or end < entry['start'] - maxGap:
+        entry = {'start': start, 'end': end, 'table': twilightTable(observatory, start, end, twilight)}
+    elif start < entry['start'] or end > entry['end']:
+        table = entry['table']
+        if start < entry['start']:
+            table = mergeNights(table, twilightTable(observatory, start, entry['start'], twilight))
+        if end > entry['end']:
+            table = mergeNights(table, twilightTable(observatory, entry['end'], end, twilight))
+        entry = {'start': min(start, entry['start']), 'end': max(end, entry['end']), 'table': table}
+    else:
+        changed = False
+    _tableCache[key] = entry
+    if changed and cachePath is not None:
+        '''Write to a temporary file and rename it into place, so readers never see a partial pickle'''
+        temporaryPath = '%s.%i.tmp' % (cachePath, os.getpid())
+        output = open(temporaryPath, 'wb')
+        cPickle.dump(entry, output, cPickle.HIGHEST_PROTOCOL)
+        output.close()
+        os.rename(temporaryPath, cachePath)
+
+    '''The nights of the window, as `twilightTable` would compute them, with a margin'''
+    dusk, dawn = entry['table']
+    nights = (dawn > start - 2.0)*(dusk < end + 2.0)
+    return dusk[nights], dawn[nights]
+
+def duringNight(dusk, dawn, times):
+    '''
+    Parameters
+    ----------
+    dusk, dawn : array
+        Night table from `twilightTable`
+    times : array
+        Julian dates to test, of any shape
+    Returns
+    -------
+    dark : array of bool
+        True where the Sun is below the twilight altitude at `times`
+    '''
+    times = np.asarray(times, dtype=np.float64)
+    night = np.searchsorted(dusk, times, side='right') - 1
+    dark = night >= 0
+    dark[dark] = times[dark] < dawn[night[dark]]
+    return dark
@@ -0,0 +1,321 @@
+'''
+Vectorized NumPy counterparts to the PyEphem calculations made by
+calculateEphemerides, so that the positions of many host stars at many
+times can be computed in one call rather than one ephem.FixedBody at a time.
+
+The NumPy engine precesses J2000 catalog coordinates to the equinox of date,
+converts them to horizontal coordinates with the local mean sidereal time and
+applies a standard atmospheric refraction correction. It omits nutation and
+aberration, so it agrees with PyEphem to a few tens of arcseconds, which is
+far below the whole-degree precision of the ephemeris reports. PyEphem is kept
+available as the reference backend, and as the second tier of `tieredAltAz`,
+which only recomputes the positions close enough to a threshold for the
+difference to matter.
+'''
+import ephem	 ## PyEphem module
+import numpy as np
+
+ephemDateOffset = 2415020.0    ## Julian date of PyEphem's date zero-point (1899/12/31 12:00 UT)
+
+def gmst(jd):
+    '''
+    Parameters
+    ----------
+    jd : float or array
+        Time in julian date (UT)
+    Returns
+    -------
+    theta : float or array
+        Greenwich mean sidereal time in radians, in the range [0, 2pi)
+    '''
+    jd = np.asarray(jd, dtype=np.float64)
+    d = jd - 2451545.0
+    T = d/36525.0
+    thetaDeg = 280.46061837 + 360.98564736629*d + 0.000387933*T**2 - T**3/38710000.0
+    return np.radians(np.mod(thetaDeg, 360.0))
+
+def precess(ra, dec, jd):
+    '''
+    Precess J2000 equatorial coordinates to the mean equinox of date with the
+    IAU 1976 (Lieske) precession angles.
+
+    Parameters
+    ----------
+    ra, dec : float or array
+        J2000 right ascension and declination in radians
+    jd : float or array
+        Time in julian date, broadcast against `ra` and `dec`
+    Returns
+    -------
+    raDate, decDate : float or array
+        Right ascension and declination of date in radians
+    '''
+    T = (np.asarray(jd, dtype=np.float64) - 2451545.0)/36525.0
+    arcsec = np.pi/(180.0*3600.0)
+    zeta = (2306.2181*T + 0.30188*T**2 + 0.017998*T**3)*arcsec
+    z = (2306.2181*T + 1.09468*T**2 + 0.018203*T**3)*arcsec
+    theta = (2004.3109*T - 0.42665*T**2 - 0.041833*T**3)*arcsec
+
+    cosDec = np.cos(dec)
+    A = cosDec*np.sin(ra + zeta)
+    B = np.cos(theta)*cosDec*np.cos(ra + zeta) - np.sin(theta)*np.sin(dec)
+    C = np.sin(theta)*cosDec*np.cos(ra + zeta) + np.cos(theta)*np.sin(dec)
+    raDate = np.mod(np.arctan2(A, B) + z, 2*np.pi)
+    decDate = np.arcsin(np.clip(C, -1.0, 1.0))
+    return raDate, decDate
+
+def refraction(alt, temperature=15.0, pressure=1010.0):
+    '''
+    Parameters
+    ----------
+    alt : float or array
+        Geometric altitude in radians
+    temperature : float
+        Air temperature in degrees C
+    pressure : float
+        Air pressure in millibar. Zero disables refraction, like PyEphem.
+    Returns
+    -------
+    correction : float or array
+        Refraction correction in radians to add to `alt` (Saemundsson 1986)
+    '''
+    h = np.maximum(np.degrees(alt), -1.0)
+    arcmin = 1.02/np.tan(np.radians(h + 10.3/(h + 5.11)))
+    arcmin *= (pressure/1010.0)*(283.0/(273.0 + temperature))
+    return np.radians(arcmin/60.0)
+
+def altAz(ra, dec, jd, latitude, longitude, temperature=15.0, pressure=1010.0):
+    '''
+    Horizontal coordinates of stars with the NumPy engine. The `ra`, `dec` and
+    `jd` arrays are broadcast against each other, so equal-length arrays give
+    paired (star, time) positions while ``ra[:,None]``, ``dec[:,None]`` and
+    ``jd[None,:]`` give every star at every time.
+
+    Parameters
+    ----------
+    ra, dec : float or array
+        J2000 right ascension and declination in radians
+    jd : float or array
+        Time in julian date (UT)
+    latitude, longitude : float
+        Observatory latitude and longitude (east positive) in radians
+    temperature : float
+        Air temperature in degrees C
+    pressure : float
+        Air pressure in millibar
+    Returns
+    -------
+    alt, az : array
+        Apparent altitude and azimuth (measured east of north) in radians
+    '''
+    jd = np.asarray(jd, dtype=np.float64)
+    raDate, decDate = precess(np.asarray(ra, dtype=np.float64), np.asarray(dec, dtype=np.float64), jd)
+    return horizontal(raDate, decDate, jd, latitude, longitude, temperature, pressure)
+
+def horizontal(raDate, decDate, jd, latitude, longitude, temperature=15.0, pressure=1010.0):
+    '''
+    Same as `altAz`, for coordinates `raDate`, `decDate` (radians) that are 
+    already referred to the equinox of date
+    '''
+    hourAngle = gmst(jd) + longitude - raDate
+
+    sinLat, cosLat = np.sin(latitude), np.cos(latitude)
+    sinDec, cosDec = np.sin(decDate), np.cos(decDate)
+    cosHA = np.cos(hourAngle)
+    alt = np.arcsin(np.clip(sinLat*sinDec + cosLat*cosDec*cosHA, -1.0, 1.0))
+    az = np.mod(np.arctan2(-cosDec*np.sin(hourAngle), sinDec*cosLat - cosDec*sinLat*cosHA), 2*np.pi)
+    if pressure > 0:
+        alt = alt + refraction(alt, temperature, pressure)
+    return alt, az
+
+def maxAltitude(dec, latitude):
+    '''
+    Parameters
+    ----------
+    dec : float or array
+        Declination in radians
+    latitude : float
+        Observatory latitude in radians
+    Returns
+    -------
+    alt : float or array
+        Geometric altitude in radians of a star at declination `dec` when it
+        transits the meridian
+    '''
+    return np.pi/2 - np.abs(latitude - np.asarray(dec, dtype=np.float64))
+
+def hourAngleLimit(dec, latitude, alt):
+    '''
+    Parameters
+    ----------
+    dec : float or array
+        Declination in radians
+    latitude : float
+        Observatory latitude in radians
+    alt : float
+        Geometric altitude in radians
+    Returns
+    -------
+    halfWidth : float or array
+        Half-width in radians of the range of hour angles over which a star at
+        declination `dec` is above `alt`: pi for stars that never go below it
+        and -1 for stars that never rise above it
+    '''
+    dec = np.asarray(dec, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cosHalfWidth = (np.sin(alt) - np.sin(latitude)*np.sin(dec))/(np.cos(latitude)*np.cos(dec))
+    halfWidth = np.arccos(np.clip(np.nan_to_num(cosHalfWidth), -1.0, 1.0))
+    return np.where(maxAltitude(dec, latitude) < alt, -1.0, halfWidth)
+
+def hourAngle(ra, jd, longitude):
+    '''
+    Parameters
+    ----------
+    ra : float or array
+        Right ascension in radians
+    jd : float or array
+        Time in julian date (UT), broadcast against `ra`
+    longitude : float
+        Observatory longitude (east positive) in radians
+    Returns
+    -------
+    hourAngle : float or array
+        Local mean hour angle in radians, in the range [-pi, pi)
+    '''
+    return np.mod(gmst(jd) + longitude - ra + np.pi, 2*np.pi) - np.pi
+
+def prefilterMargin(jd):
+    '''
+    Parameters
+    ----------
+    jd : float
+        Latest julian date of the observing window
+    Returns
+    -------
+    margin : float
+        Safety margin in radians for altitude limits tested with J2000
+        coordinates and no refraction: one degree for refraction, nutation and
+        aberration, plus the general precession (50.3"/yr) since J2000
+    '''
+    years = abs(jd - 2451545.0)/365.25
+    return np.radians(1.0 + 50.3*years/3600.0)
+
+def ephemAltAz(ra, dec, jd, observatory):
+    '''
+    Reference backend with the same call signature as `observerAltAz`: compute
+    every (star, time) pair with an ephem.FixedBody. Slow, but exactly what
+    PyEphem reports.
+
+    Parameters
+    ----------
+    ra, dec : float or array
+        J2000 right ascension and declination in radians
+    jd : float or array
+        Time in julian date (UT), broadcast against `ra` and `dec`
+    observatory : ephem.Observer
+        Observer describing the site. Its date is left unchanged.
+    Returns
+    -------
+    alt, az : array
+        Apparent altitude and azimuth in radians
+    '''
+    ra, dec, jd = np.broadcast_arrays(np.asarray(ra, dtype=np.float64),
+                                      np.asarray(dec, dtype=np.float64),
+                                      np.asarray(jd, dtype=np.float64))
+    alt = np.empty(ra.shape)
+    az = np.empty(ra.shape)
+    site = ephem.Observer()
+    site.lat, site.long = observatory.lat, observatory.long
+    site.elevation, site.temp, site.pressure = observatory.elevation, observatory.temp, observatory.pressure
+    star = ephem.FixedBody()
+    for i in np.ndindex(ra.shape):
+        site.date = jd[i] - ephemDateOffset
+        star._ra = ra[i]
+        star._dec = dec[i]
+        star.compute(site)
+        alt[i] = float(star.alt)
+        az[i] = float(star.az)
+    return alt, az
+
+def tieredAltAz(ra, dec, jd, observatory, margin=0.05):
+    '''
+    Two-tier backend: compute every (star, time) pair with the NumPy engine,
+    then recompute with PyEphem the positions where its small error could
+    change the outcome. Those are the positions within `margin` degrees of the
+    observatory's horizon limit, of a whole degree of altitude (the reports
+    truncate altitudes to whole degrees) or of the azimuth at which the compass
+    direction changes. Below the horizon the two refraction models differ by
+    up to a degree, so the altitude margin is a degree wider there. With a
+    margin larger than the error of the NumPy engine (about 0.01 degree above
+    the horizon), the reports are the same as with the PyEphem backend.
+
+    Parameters
+    ----------
+    ra, dec, jd, observatory :
+        As for `observerAltAz`
+    margin : float
+        Safety margin in degrees
+    Returns
+    -------
+    alt, az : array
+        Apparent altitude and azimuth in radians
+    refined : array of bool
+        True for the positions recomputed with PyEphem
+    '''
+    ra, dec, jd = np.broadcast_arrays(np.asarray(ra, dtype=np.float64),
+                                      np.asarray(dec, dtype=np.float64),
+                                      np.asarray(jd, dtype=np.float64))
+    alt, az = observerAltAz(ra, dec, jd, observatory, 'numpy')
+    altDeg, azDeg = np.degrees(alt), np.degrees(az)
+    altMargin = margin + (altDeg < 0)*1.0
+    horizon = np.degrees(float(observatory.horizon))
+    nearHorizon = np.abs(altDeg - horizon) < altMargin
+    '''Whole degrees and directions only matter for positions that may be above the horizon limit'''
+    possiblyAbove = altDeg > horizon - altMargin
+    nearWholeDegree = np.abs(altDeg - np.round(altDeg)) < altMargin
+    '''The direction of the floored azimuth changes at 23, 68, ... 338 degrees'''
+    nearDirectionChange = np.abs(np.mod(azDeg - 0.5, 45.0) - 22.5)*np.cos(alt) < margin
+    refined = nearHorizon + possiblyAbove*(nearWholeDegree + nearDirectionChange)
+    alt[refined], az[refined] = ephemAltAz(ra[refined], dec[refined], jd[refined], observatory)
+    return alt, az, refined
+
+def observerAltAz(ra, dec, jd, observatory, backend='numpy'):
+    '''
+    Horizontal coordinates of stars as seen from an ephem.Observer.
+
+    Parameters
+    ----------
+    ra, dec : float or array
+        J2000 right ascension and declination in radians
+    jd : float or array
+        Time in julian date (UT), broadcast against `ra` and `dec`
+    observatory : ephem.Observer
+        Observer describing the site
+    backend : str
+        'numpy' for the vectorized engine, 'ephem' for the PyEphem reference
+    Returns
+    -------
+    alt, az : array
+        Apparent altitude and azimuth in radians
+    '''
+    if backend == 'ephem':
+        return ephemAltAz(ra, dec, jd, observatory)
+    elif backend == 'numpy':
+        return altAz(ra, dec, jd, float(observatory.lat), float(observatory.long),
+                     observatory.temp, observatory.pressure)
+    else:
+        raise ValueError("Unknown alt/az backend '%s', expected 'numpy' or 'ephem'" % backend)
+
+def azToDirection(az):
+    '''
+    Parameters
+    ----------
+    az : array
+        Azimuth in degrees
+    Returns
+    -------
+    directions : array
+        Eight-point compass direction of each azimuth, i.e. 'N', 'NE', ...
+    '''
+    compass = np.array(['N','NE','E','SE','S','SW','W','NW'])
+    return compass[np.floor(np.mod(np.asarray(az, dtype=np.float64) + 22.5, 360.0)/45.0).astype(int) % 8]